@@ -0,0 +1,153 @@
+"""
+Annotation Renderer
+Draws detection boxes and labels onto frames without full-frame copies
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+from detections import Detections
+
+
+class AnnotationRenderer:
+    """
+    Draw detections with semi-transparent label backgrounds
+
+    Label backgrounds are alpha-blended only inside each label's rectangle,
+    so cost scales with label area instead of detections x frame pixels.
+    Output is pixel-identical to blending a full-frame overlay per label.
+    Scratch memory is kept per thread and reused across frames.
+    """
+
+    def __init__(self, colors, default_color=(128, 128, 128)):
+        """
+        Args:
+            colors: Mapping of class name -> BGR color
+            default_color: Color for classes missing from colors
+        """
+        self.colors = colors
+        self.default_color = default_color
+
+        # Box and label styling
+        self.thickness = 3
+        self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self.font_scale = 0.6
+        self.font_thickness = 2
+        self.alpha = 0.8  # Label background opacity
+
+        self._text_sizes = {}  # label -> ((width, height), baseline)
+        self._local = threading.local()
+
+    def _text_size(self, label):
+        size = self._text_sizes.get(label)
+        if size is None:
+            size = cv2.getTextSize(label, self.font, self.font_scale, self.font_thickness)
+            self._text_sizes[label] = size
+        return size
+
+    def _scratch(self, height, width, color):
+        """Per-thread buffer holding a solid color patch of at least height x width"""
+        buffer = getattr(self._local, 'scratch', None)
+        if buffer is None or buffer.shape[0] < height or buffer.shape[1] < width:
+            buffer = np.empty((max(height, 64), max(width, 256), 3), dtype=np.uint8)
+            self._local.scratch = buffer
+        patch = buffer[:height, :width]
+        patch[:] = color
+        return patch
+
+    def output_buffer(self, frame):
+        """Per-thread output buffer matching frame, reused across frames"""
+        buffer = getattr(self._local, 'output', None)
+        if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+            buffer = np.empty_like(frame)
+            self._local.output = buffer
+        return buffer
+
+    def _blend_rect(self, canvas, pt1, pt2, color):
+        """Alpha-blend a filled rectangle (inclusive corners) into canvas in place"""
+        height, width = canvas.shape[:2]
+        left, right = sorted((pt1[0], pt2[0]))
+        top, bottom = sorted((pt1[1], pt2[1]))
+
+        # Clip to the frame, as cv2.rectangle would
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, width - 1), min(bottom, height - 1)
+        if left > right or top > bottom:
+            return
+
+        roi = canvas[top:bottom + 1, left:right + 1]
+        patch = self._scratch(roi.shape[0], roi.shape[1], color)
+        cv2.addWeighted(patch, self.alpha, roi, 1 - self.alpha, 0, dst=roi)
+
+    def render(self, frame, detections, out=None):
+        """
+        Draw bounding boxes and labels
+
+        Args:
+            frame: Input frame (BGR)
+            detections: Detections (or the equivalent list of dicts)
+            out: Destination array. None returns a fresh copy; passing frame
+                 itself draws in place (e.g. straight into the writer's frame);
+                 any other array of the same shape (see output_buffer) is
+                 overwritten with the annotated frame
+
+        Returns:
+            Annotated frame
+        """
+        if not isinstance(detections, Detections):
+            detections = Detections.from_list(detections)
+
+        if out is None:
+            canvas = frame.copy()
+        elif out is frame:
+            canvas = frame
+        else:
+            np.copyto(out, frame)
+            canvas = out
+
+        track_ids = detections.track_id.tolist() if detections.track_id is not None else [None] * len(detections)
+
+        for (x1, y1, x2, y2), class_id, track_id in zip(detections.xyxy.astype(int).tolist(),
+                                                         detections.class_id.tolist(), track_ids):
+            class_name = detections.names.get(class_id, 'unknown')
+
+            # Get color based on class name
+            color = self.colors.get(class_name, self.default_color)
+
+            # Draw bounding box with higher thickness for better visibility
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), color, self.thickness)
+
+            # Prepare label text (class name and track ID, no confidence)
+            label = class_name.upper() if track_id is None else f"{class_name.upper()} #{track_id}"
+            (text_width, text_height), baseline = self._text_size(label)
+
+            # Calculate label position (above the box)
+            label_y = y1 - 10 if y1 - 10 > text_height else y1 + text_height + 10
+
+            # Semi-transparent background, blended only where the label sits
+            self._blend_rect(canvas,
+                             (x1, label_y - text_height - 8),
+                             (x1 + text_width + 10, label_y + baseline + 2),
+                             color)
+
+            # Draw black outline for text (for better visibility)
+            cv2.putText(canvas, label, (x1 + 5, label_y),
+                        self.font, self.font_scale, (0, 0, 0), self.font_thickness + 2, cv2.LINE_AA)
+
+            # Draw white text on top
+            cv2.putText(canvas, label, (x1 + 5, label_y),
+                        self.font, self.font_scale, (255, 255, 255), self.font_thickness, cv2.LINE_AA)
+
+            # Add class-specific indicator
+            if class_name == 'soldier':
+                # Draw small circle in top-right corner of box
+                cv2.circle(canvas, (x2 - 10, y1 + 10), 6, color, -1)
+                cv2.circle(canvas, (x2 - 10, y1 + 10), 6, (255, 255, 255), 1)
+            elif class_name == 'civilian':
+                # Draw small square in top-right corner of box
+                cv2.rectangle(canvas, (x2 - 16, y1 + 4), (x2 - 4, y1 + 16), color, -1)
+                cv2.rectangle(canvas, (x2 - 16, y1 + 4), (x2 - 4, y1 + 16), (255, 255, 255), 1)
+
+        return canvas
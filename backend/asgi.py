@@ -0,0 +1,331 @@
+"""
+ASGI Server
+Async serving mode: frame streams (SSE, multipart and WebSocket), raw-body
+uploads and status polling run on one event loop, and every other REST route
+is served by the Flask app on a bounded thread pool
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    python asgi.py
+
+Needs the optional starlette and uvicorn packages. Viewers no longer hold a
+thread each, and inference (/api/detect/frame, /api/detect/image) still runs
+in Flask handlers, at most SKYGUARD_ASGI_WORKER_THREADS at a time.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+import server
+from detections import json_default
+from uploads import UploadError
+from streaming import AsyncSubscriber, MULTIPART_BOUNDARY, sse_event, multipart_close
+
+# Threads running Flask routes (and so inference); requests beyond this wait on the loop
+WORKER_THREADS = int(os.environ.get('SKYGUARD_ASGI_WORKER_THREADS', 8))
+UPLOAD_WRITE_BYTES = 1024 * 1024  # Upload bytes buffered before each disk write
+
+executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix='asgi-worker')
+io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='asgi-io')
+
+
+class DetectionJSONResponse(JSONResponse):
+    """JSONResponse that expands columnar Detections, like the Flask JSON provider"""
+
+    def render(self, content):
+        return json.dumps(content, default=server.DetectionJSONProvider.default).encode('utf-8')
+
+
+class RequestBody(io.RawIOBase):
+    """
+    wsgi.input reading an ASGI request body as it arrives
+
+    Runs on a worker thread and pulls each chunk from the event loop, so
+    Flask parses uploads incrementally instead of after buffering them.
+    """
+
+    def __init__(self, loop, receive):
+        self._loop = loop
+        self._receive = receive
+        self._buffer = bytearray()
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                self._more = False
+                break
+            self._buffer += message.get('body', b'')
+            self._more = message.get('more_body', False)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        del self._buffer[:n]
+        return n
+
+
+def wsgi_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BufferedReader(body, UPLOAD_WRITE_BYTES),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+class WSGIBridge:
+    """
+    Serve a WSGI app from ASGI on a bounded executor
+
+    The app call and each response chunk run on the executor, so a slow
+    handler or file download only ever occupies one of its threads.
+    """
+
+    def __init__(self, wsgi_app, pool):
+        self.wsgi_app = wsgi_app
+        self.pool = pool
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        environ = wsgi_environ(scope, RequestBody(loop, receive))
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+        result = await loop.run_in_executor(self.pool, self.wsgi_app, environ, start_response)
+        try:
+            await send({'type': 'http.response.start', 'status': started['status'],
+                        'headers': started['headers']})
+            chunks = iter(result)
+            while True:
+                chunk = await loop.run_in_executor(self.pool, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.pool, result.close)
+
+
+async def iter_stream_async(job_id):
+    """Async server.iter_stream: StreamFrames for a job, None as a keepalive tick"""
+    subscriber = AsyncSubscriber(server.STREAM_BUFFER_FRAMES, asyncio.get_running_loop())
+    broadcaster, subscriber = server.open_stream(job_id, subscriber)
+    try:
+        while True:
+            try:
+                frame_data = await subscriber.get_async(timeout=server.STREAM_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield None
+                continue
+            if frame_data is None:  # End signal
+                break
+            yield frame_data
+    finally:
+        server.close_stream(job_id, broadcaster, subscriber)
+
+
+async def job_exists(job_id):
+    """Whether the registry knows a job (spilled records are checked on disk, off the loop)"""
+    return await asyncio.get_running_loop().run_in_executor(io_executor, server.processing_status.__contains__,
+                                                            job_id)
+
+
+async def stream_frames(request):
+    """Server-Sent Events stream, as /api/stream/<job_id> in server.py"""
+    if not await job_exists(request.path_params['job_id']):
+        return JSONResponse({'error': 'Job not found'}, status_code=404)
+
+    async def generate():
+        async for frame_data in iter_stream_async(request.path_params['job_id']):
+            yield sse_event({'type': 'keepalive'}) if frame_data is None else frame_data.to_sse()
+        yield sse_event({'type': 'complete'})
+
+    return StreamingResponse(generate(), media_type='text/event-stream')
+
+
+async def stream_frames_binary(request):
+    """multipart/x-mixed-replace stream, as /api/stream/<job_id>/mjpeg in server.py"""
+    if not await job_exists(request.path_params['job_id']):
+        return JSONResponse({'error': 'Job not found'}, status_code=404)
+
+    async def generate():
+        async for frame_data in iter_stream_async(request.path_params['job_id']):
+            if frame_data is not None:
+                yield frame_data.to_multipart()
+        yield multipart_close()
+
+    return StreamingResponse(generate(), media_type=f'multipart/x-mixed-replace; boundary={MULTIPART_BOUNDARY}',
+                             headers={'Cache-Control': 'no-cache', 'Access-Control-Expose-Headers': 'X-Frame-Meta'})
+
+
+async def stream_frames_websocket(websocket):
+    """
+    WebSocket stream of a job's frames
+
+    Each frame is a text message with its metadata ({"type": "frame", ...},
+    as in the SSE stream but without the base64 image) followed by a binary
+    message with the JPEG. Keepalives and the final {"type": "complete"} are
+    text messages; the server closes the socket after the last one. Unknown
+    jobs are closed straight away with code 4404.
+    """
+    await websocket.accept()
+    if not await job_exists(websocket.path_params['job_id']):
+        await websocket.close(code=4404, reason='Job not found')
+        return
+    try:
+        async for frame_data in iter_stream_async(websocket.path_params['job_id']):
+            if frame_data is None:
+                await websocket.send_text(json.dumps({'type': 'keepalive'}))
+                continue
+            await websocket.send_text(json.dumps({'type': 'frame', **frame_data.meta}, default=json_default))
+            await websocket.send_bytes(frame_data.jpeg)
+        await websocket.send_text(json.dumps({'type': 'complete'}))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+async def get_status(request):
+    """Job status, as /api/status/<job_id> in server.py"""
+    status = await asyncio.get_running_loop().run_in_executor(io_executor, server.job_status,
+                                                              request.path_params['job_id'])
+    if status is None:
+        return JSONResponse({'error': 'Job not found'}, status_code=404)
+    return DetectionJSONResponse(status)
+
+
+async def raw_upload(request):
+    """Hash and write a raw request body to disk as it arrives"""
+    file_type = request.query_params.get('type', 'video')
+    if file_type not in ('video', 'image'):
+        return JSONResponse({'error': "type must be 'video' or 'image'"}, status_code=400)
+    filename = request.query_params.get('filename', '')
+    error = server.upload_error(filename, file_type)
+    if error:
+        return JSONResponse({'error': error}, status_code=400)
+
+    loop = asyncio.get_running_loop()
+    digest = hashlib.sha256()
+    temp_path = server.new_upload_path()
+    out = await loop.run_in_executor(io_executor, open, temp_path, 'wb')
+    try:
+        pending = bytearray()
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > server.MAX_UPLOAD_BYTES:
+                raise UploadError(f"Upload exceeds {server.MAX_UPLOAD_BYTES} bytes", 413)
+            digest.update(chunk)
+            pending += chunk
+            if len(pending) >= UPLOAD_WRITE_BYTES:
+                await loop.run_in_executor(io_executor, out.write, bytes(pending))
+                pending.clear()
+        await loop.run_in_executor(io_executor, out.write, bytes(pending))
+    except BaseException as e:
+        out.close()
+        os.remove(temp_path)
+        if isinstance(e, UploadError):
+            return JSONResponse({'error': str(e)}, status_code=e.status)
+        raise
+    out.close()
+
+    response = await loop.run_in_executor(io_executor, server.store_upload, temp_path, filename,
+                                          digest.hexdigest(), file_type)
+    return JSONResponse(response)
+
+
+class UploadEndpoint:
+    """
+    /api/upload: raw bodies are received on the loop (raw_upload), multipart
+    forms go to the Flask route, which parses them from the incoming stream
+    """
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            await flask_app(scope, receive, send)
+            return
+        response = await raw_upload(request)
+        await response(scope, receive, send)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    server.prepare_server()
+    server.start_job_workers()
+    print(f"Async server: {WORKER_THREADS} worker threads for Flask routes")
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+    io_executor.shutdown(wait=False, cancel_futures=True)
+
+
+flask_app = WSGIBridge(server.app, executor)
+
+# Flask-CORS only covers the bridged routes
+cors = [Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                   expose_headers=['X-Frame-Meta'])]
+
+app = Starlette(
+    routes=[
+        Route('/api/stream/{job_id}', stream_frames, middleware=cors),
+        Route('/api/stream/{job_id}/mjpeg', stream_frames_binary, middleware=cors),
+        WebSocketRoute('/api/ws/stream/{job_id}', stream_frames_websocket),
+        Route('/api/status/{job_id}', get_status, middleware=cors),
+        Route('/api/upload', UploadEndpoint(), methods=['POST', 'OPTIONS'], middleware=cors),
+        Mount('/', app=flask_app)
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("=" * 60)
+    print("Aerial Object Detection API Server (async)")
+    print("=" * 60)
+    uvicorn.run(app, host='0.0.0.0', port=5000)
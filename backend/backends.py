@@ -0,0 +1,255 @@
+"""
+Inference Backends
+Exports the YOLO checkpoint to CPU-optimized formats (cached next to the
+checkpoint, keyed by file hash) and runs it through ONNX Runtime
+"""
+
+import ast
+import hashlib
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from metrics import timed
+
+# Backends selectable in ObjectDetector / init_detector / SKYGUARD_BACKEND
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+# Weight/activation precisions; 'int8' is a calibrated ONNX model (see quantize.py)
+PRECISIONS = ('fp32', 'int8')
+
+
+def file_hash(path, length=12):
+    """Short SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+@contextmanager
+def file_lock(lock_path, timeout=600):
+    """Cross-process lock so concurrent workers don't export the same model twice"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            # Break locks left behind by a crashed exporter
+            try:
+                if time.time() - os.path.getmtime(lock_path) > timeout:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Timed out waiting for {lock_path}")
+            time.sleep(0.5)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def exported_path(model_path, fmt, suffix=''):
+    """Where the exported artifact for a checkpoint lives: models/<stem>.<hash><suffix>.<fmt>"""
+    model_path = Path(model_path)
+    key = file_hash(model_path)
+    if fmt == 'openvino':
+        return model_path.with_name(f"{model_path.stem}.{key}{suffix}_openvino_model")
+    return model_path.with_name(f"{model_path.stem}.{key}{suffix}.onnx")
+
+
+def quantized_path(model_path):
+    """Where quantize.py stores the calibrated INT8 model for a checkpoint"""
+    return exported_path(model_path, 'onnx', suffix='.int8')
+
+
+def export_model(model_path, fmt='onnx', imgsz=640):
+    """
+    Export a .pt checkpoint once and return the cached artifact path
+
+    The artifact is stored next to the checkpoint and keyed by the
+    checkpoint's hash, so replacing the weights triggers a fresh export.
+    Exports use dynamic batch/height/width.
+
+    Args:
+        model_path: Path to the .pt checkpoint
+        fmt: 'onnx' or 'openvino'
+        imgsz: Nominal export image size
+
+    Returns:
+        str: Path to the exported .onnx file or OpenVINO model directory
+    """
+    if fmt not in ('onnx', 'openvino'):
+        raise ValueError(f"Unsupported export format '{fmt}'")
+
+    target = exported_path(model_path, fmt)
+    if target.exists():
+        return str(target)
+
+    with file_lock(f"{target}.lock"):
+        # Another process may have finished the export while we waited
+        if target.exists():
+            return str(target)
+
+        from ultralytics import YOLO
+
+        print(f"Exporting {model_path} to {fmt} (one-time, cached as {target.name})...")
+        exported = YOLO(model_path).export(format=fmt, dynamic=True, imgsz=imgsz, verbose=False)
+
+        # Ultralytics writes <stem>.onnx / <stem>_openvino_model next to the checkpoint
+        tmp = Path(f"{target}.tmp")
+        if tmp.exists():
+            shutil.rmtree(tmp) if tmp.is_dir() else tmp.unlink()
+        shutil.move(exported, tmp)
+        os.replace(tmp, target)
+        print(f"✅ Exported model cached at {target}")
+
+    return str(target)
+
+
+def letterbox(frame, imgsz, stride=32, auto=True):
+    """
+    Resize and pad a frame the way Ultralytics' LetterBox does
+
+    Returns:
+        tuple: (padded frame, gain, (pad_left, pad_top))
+    """
+    height, width = frame.shape[:2]
+    gain = min(imgsz / height, imgsz / width)
+    new_width, new_height = int(round(width * gain)), int(round(height * gain))
+    pad_w, pad_h = imgsz - new_width, imgsz - new_height
+    if auto:
+        # Minimum rectangle: only pad up to the next stride multiple
+        pad_w, pad_h = pad_w % stride, pad_h % stride
+    pad_w, pad_h = pad_w / 2, pad_h / 2
+
+    if (width, height) != (new_width, new_height):
+        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return frame, gain, (left, top)
+
+
+def preprocess(frames, imgsz, stride=32):
+    """
+    Letterbox a batch of BGR frames into the model's float32 NCHW input
+
+    Returns:
+        tuple: (input blob, [(padded frame, gain, pad)] per frame)
+    """
+    # Stride-aligned rectangles when the whole batch shares a shape, squares otherwise
+    same_shape = len({frame.shape for frame in frames}) == 1
+    letterboxed = [letterbox(frame, imgsz, stride, auto=same_shape) for frame in frames]
+
+    blob = np.stack([padded for padded, _, _ in letterboxed])
+    blob = blob[..., ::-1].transpose(0, 3, 1, 2)  # BGR -> RGB, BHWC -> BCHW
+    blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+    return blob, letterboxed
+
+
+class OnnxRuntimeBackend:
+    """
+    Run an exported YOLO ONNX model with ONNX Runtime
+
+    Pre-processing (letterbox), decoding and class-aware NMS mirror the
+    Ultralytics predictor so results match the torch backend within
+    numerical tolerance.
+    """
+
+    def __init__(self, onnx_path, intra_op_threads=None, inter_op_threads=1):
+        """
+        Args:
+            onnx_path: Exported model (see export_model)
+            intra_op_threads: Threads used inside an operator (defaults to all cores)
+            inter_op_threads: Threads used across independent operators
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads or (os.cpu_count() or 1)
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+        self.stride = int(metadata.get('stride', 32))
+        self.intra_op_threads = options.intra_op_num_threads
+
+    def infer(self, frames, imgsz, conf, iou, max_det, classes=None):
+        """
+        Args:
+            frames: List of BGR uint8 frames
+            imgsz: Inference size
+            conf: Confidence threshold
+            iou: NMS IoU threshold
+            max_det: Maximum detections per frame
+            classes: Optional list of class ids to keep
+
+        Returns:
+            list: (xyxy, class_id, confidence) arrays per frame
+        """
+        with timed('preprocess', len(frames)):
+            blob, letterboxed = preprocess(frames, imgsz, self.stride)
+
+        # (batch, 4 + num_classes, anchors) -> (batch, anchors, 4 + num_classes)
+        with timed('inference', len(frames)):
+            predictions = self.session.run(None, {self.input_name: blob})[0].transpose(0, 2, 1)
+
+        outputs = []
+        with timed('nms', len(frames)):
+            for frame, (_, gain, pad), prediction in zip(frames, letterboxed, predictions):
+                outputs.append(self._postprocess(prediction, frame.shape, gain, pad, conf, iou, max_det, classes))
+        return outputs
+
+    def _postprocess(self, prediction, shape, gain, pad, conf, iou, max_det, classes):
+        scores = prediction[:, 4:]
+        class_ids = scores.argmax(axis=1).astype(np.int32)
+        confidences = scores[np.arange(len(scores)), class_ids]
+
+        keep = confidences > conf
+        if classes is not None:
+            keep &= np.isin(class_ids, classes)
+
+        boxes, class_ids, confidences = prediction[keep, :4], class_ids[keep], confidences[keep]
+        if len(boxes) == 0:
+            return np.zeros((0, 4), np.float32), np.zeros(0, np.int32), np.zeros(0, np.float32)
+
+        # cx, cy, w, h -> x, y, w, h for OpenCV's NMS
+        xywh = boxes.copy()
+        xywh[:, 0] -= xywh[:, 2] / 2
+        xywh[:, 1] -= xywh[:, 3] / 2
+        indices = cv2.dnn.NMSBoxesBatched(xywh.tolist(), confidences.tolist(), class_ids.tolist(), conf, iou)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+        # Highest scores first, capped at max_det
+        indices = indices[np.argsort(-confidences[indices], kind='stable')][:max_det]
+
+        xyxy = np.empty((len(indices), 4), dtype=np.float32)
+        xyxy[:, :2] = xywh[indices, :2]
+        xyxy[:, 2:] = xywh[indices, :2] + xywh[indices, 2:]
+
+        # Undo letterbox and clip to the original frame
+        xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad[0]) / gain).clip(0, shape[1])
+        xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad[1]) / gain).clip(0, shape[0])
+
+        return xyxy, class_ids[indices], confidences[indices]
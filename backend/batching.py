@@ -0,0 +1,144 @@
+"""
+Dynamic Micro-Batching
+Groups single-frame requests that arrive close together into one model call
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+
+class _Request:
+    __slots__ = ('frame', 'future', 'submitted_at')
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collect frames for up to max_wait_ms (or until max_batch_size frames are
+    waiting) and run them through detector.detect_batch in one call
+
+    Each caller gets its own unannotated result back through a Future;
+    drawing and encoding stay on the caller's thread.
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=10):
+        """
+        Args:
+            detector: ObjectDetector (or PooledDetector) used for inference
+            max_batch_size: Frames per model call at most
+            max_wait_ms: How long the first frame of a batch may wait for company
+        """
+        self.detector = detector
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+
+        # Pooled detectors can run several batches at once. A batch window only
+        # opens once a slot is free, so frames keep accumulating while the
+        # model is busy and batches grow with load.
+        concurrency = max(1, int(getattr(detector, 'concurrency', 1)))
+        self._slots = threading.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='microbatch')
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+        self._queue_waits = deque(maxlen=1000)  # Seconds from submit to batch start
+        self._batch_sizes = deque(maxlen=1000)
+
+        self._thread = threading.Thread(target=self._collect_loop, name='microbatch-collector', daemon=True)
+        self._thread.start()
+
+    def submit(self, frame):
+        """Queue one frame; returns a Future resolving to its detect_batch result dict"""
+        request = _Request(frame)
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify()
+        return request.future
+
+    def detect(self, frame, timeout=None):
+        """Blocking helper: submit a frame and wait for its result"""
+        return self.submit(frame).result(timeout=timeout)
+
+    def _collect_loop(self):
+        while True:
+            self._slots.acquire()
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                # The batch window opens when its first frame arrived
+                deadline = self._pending[0].submitted_at + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            self._infer(batch)
+        finally:
+            self._slots.release()
+
+    def _infer(self, batch):
+        started = time.perf_counter()
+        with self._stats_lock:
+            self.batches += 1
+            self.frames += len(batch)
+            self._batch_sizes.append(len(batch))
+            self._queue_waits.extend(started - request.submitted_at for request in batch)
+
+        try:
+            results = self.detector.detect_batch([request.frame for request in batch], annotate=False)
+            if results is None:
+                raise RuntimeError('Model not loaded')
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+    def stats(self):
+        """Batch fill rate and queueing latency added by batching"""
+        with self._stats_lock:
+            waits = np.array(self._queue_waits, dtype=np.float64) * 1000.0
+            sizes = np.array(self._batch_sizes, dtype=np.float64)
+            batches, frames = self.batches, self.frames
+
+        with self._cond:
+            queued = len(self._pending)
+
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': batches,
+            'frames': frames,
+            'queued': queued,
+            'mean_batch_size': round(float(sizes.mean()), 2) if len(sizes) else 0.0,
+            'fill_rate': round(float(sizes.mean()) / self.max_batch_size, 3) if len(sizes) else 0.0,
+            'queue_wait_ms': {
+                'mean': round(float(waits.mean()), 2) if len(waits) else 0.0,
+                'p50': round(float(np.percentile(waits, 50)), 2) if len(waits) else 0.0,
+                'p95': round(float(np.percentile(waits, 95)), 2) if len(waits) else 0.0,
+                'max': round(float(waits.max()), 2) if len(waits) else 0.0
+            }
+        }
@@ -0,0 +1,601 @@
+"""
+Benchmarks
+Reproducible throughput/latency measurements of the detector and the HTTP
+endpoints, written as JSON, plus a compare mode that flags regressions
+
+Usage:
+    python benchmark.py detector --output detector.json
+    python benchmark.py detector --backends torch,onnx --resolutions 640x360,1920x1080 --batch-sizes 1,8
+    python benchmark.py server --url http://127.0.0.1:5000 --clients 1,4,16 --output server.json
+    python benchmark.py compare baseline.json detector.json
+
+Inputs are synthetic frames/clips generated from a fixed seed (or --video),
+so two runs on the same machine measure the same work. The server must
+already be running (python server.py).
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from metrics import process_memory_bytes
+
+REPORT_VERSION = 1
+SEED = 1234
+FRAME_POOL = 8  # Distinct synthetic frames per resolution, cycled through
+DEFAULT_REGRESSION_THRESHOLD = 0.10  # Relative change in throughput/latency flagged by compare
+DEFAULT_MEMORY_THRESHOLD = 0.20  # Relative growth in peak RSS flagged by compare
+
+
+def parse_resolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def _csv(cast=str):
+    return lambda value: [cast(item) for item in value.split(',') if item]
+
+
+def synthetic_frames(width, height, count=FRAME_POOL, seed=SEED):
+    """
+    Deterministic aerial-looking frames: textured ground with small moving blobs
+
+    The same seed always gives the same pixels, so runs are comparable.
+    """
+    rng = np.random.default_rng(seed)
+    ground = cv2.GaussianBlur(rng.integers(40, 160, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    blobs = rng.uniform(0, 1, (24, 2)) * (width, height)
+    velocity = rng.uniform(-4, 4, (24, 2))
+    size = max(4, min(width, height) // 60)
+
+    frames = []
+    for index in range(count):
+        frame = ground.copy()
+        for x, y in (blobs + velocity * index) % (width, height):
+            cv2.rectangle(frame, (int(x), int(y)), (int(x) + size, int(y) + size * 2), (30, 30, 30), -1)
+        frames.append(frame)
+    return frames
+
+
+def synthetic_video(path, width, height, frame_count, fps=25):
+    """Write frame_count synthetic frames to an MP4"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    try:
+        pool = synthetic_frames(width, height)
+        for index in range(frame_count):
+            writer.write(pool[index % len(pool)])
+    finally:
+        writer.release()
+    return path
+
+
+def latency_summary(seconds):
+    """Milliseconds at p50/p95/p99 plus mean and max"""
+    if not seconds:
+        return None
+    values = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'p99': round(float(p99), 3),
+            'mean': round(float(values.mean()), 3), 'max': round(float(values.max()), 3)}
+
+
+class PeakMemory:
+    """
+    Peak resident memory while the block runs
+
+    Samples the current RSS on a thread (or a callable, e.g. a server's
+    /metrics), so each case gets its own peak rather than the process-wide
+    high-water mark.
+    """
+
+    def __init__(self, sample=process_memory_bytes, interval=0.02):
+        self.sample = sample
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample_loop(self):
+        while True:
+            try:
+                self.peak_bytes = max(self.peak_bytes, self.sample() or 0)
+            except Exception:
+                pass
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample_loop, name='peak-memory', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if not self.peak_bytes and self.sample is process_memory_bytes:
+            # No /proc: fall back to the process high-water mark (KB on Linux, bytes on macOS; none on Windows)
+            try:
+                import resource
+            except ImportError:
+                return
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak_bytes = maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+    @property
+    def peak_mb(self):
+        return round(self.peak_bytes / 1e6, 1) if self.peak_bytes else None
+
+
+def environment():
+    """Machine and code version the numbers belong to"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit
+    }
+    try:
+        import torch
+        info['torch'] = torch.__version__
+        info['cuda'] = torch.cuda.is_available()
+    except ImportError:
+        pass
+    return info
+
+
+def _report(kind, settings, cases):
+    return {
+        'version': REPORT_VERSION,
+        'kind': kind,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'settings': settings,
+        'cases': cases
+    }
+
+
+# --- Detector benchmarks ------------------------------------------------------
+
+def bench_detect_frame(detector, frames, iterations, warmup):
+    """Time detect_frame one frame at a time"""
+    for index in range(warmup):
+        detector.detect_frame(frames[index % len(frames)])
+
+    latencies = []
+    with PeakMemory() as memory:
+        started = time.perf_counter()
+        for index in range(iterations):
+            start = time.perf_counter()
+            detector.detect_frame(frames[index % len(frames)])
+            latencies.append(time.perf_counter() - start)
+        wall = time.perf_counter() - started
+    return {
+        'frames': iterations,
+        'throughput_fps': round(iterations / wall, 3),
+        'latency_ms': latency_summary(latencies),
+        'peak_rss_mb': memory.peak_mb
+    }
+
+
+def bench_process_video(detector, video_path, batch_size, video_io):
+    """Run process_video over a clip (with output encoding); latency is the gap between results"""
+    output_path = os.path.join(tempfile.gettempdir(), f"benchmark_{uuid.uuid4().hex}.mp4")
+    gaps = []
+    frames = 0
+    try:
+        with PeakMemory() as memory:
+            started = last = time.perf_counter()
+            for _ in detector.process_video(video_path, output_path, batch_size=batch_size, video_io=video_io):
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+                frames += 1
+            wall = time.perf_counter() - started
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    return {
+        'frames': frames,
+        'throughput_fps': round(frames / wall, 3) if wall > 0 else 0.0,
+        # The first gap includes pipeline start-up (decoder, first batch)
+        'first_result_ms': round(gaps[0] * 1000, 3) if gaps else None,
+        'latency_ms': latency_summary(gaps[1:]),
+        'peak_rss_mb': memory.peak_mb
+    }
+
+
+def run_detector_benchmarks(args):
+    """Every combination of backend x augment x resolution (x batch size for process_video)"""
+    from detect import ObjectDetector
+
+    cases = []
+    workdir = tempfile.mkdtemp(prefix='benchmark_')
+    clips = {}
+    if args.video:
+        cap = cv2.VideoCapture(args.video)
+        clips['source'] = (args.video, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+    try:
+        for backend in args.backends:
+            try:
+                detector = ObjectDetector(args.model, args.conf, args.profile, backend=backend, threads=args.threads)
+                if detector.model is None:
+                    raise RuntimeError('model failed to load')
+            except Exception as e:
+                print(f"⚠️  Skipping backend '{backend}': {e}")
+                cases.append({'name': f"{backend}", 'backend': backend, 'error': str(e)})
+                continue
+
+            for augment in args.augment:
+                if augment and backend != 'torch':
+                    continue  # Test-time augmentation only exists on the torch backend
+                detector.augment = augment
+                tag = f"{backend}/augment={'on' if augment else 'off'}"
+
+                for width, height in args.resolutions:
+                    frames = synthetic_frames(width, height)
+                    name = f"detect_frame/{tag}/{width}x{height}"
+                    print(f"▶ {name}")
+                    cases.append({'name': name, 'kind': 'detect_frame', 'backend': backend, 'augment': augment,
+                                  'resolution': f"{width}x{height}",
+                                  **bench_detect_frame(detector, frames, args.iterations, args.warmup)})
+
+                    key = f"{width}x{height}"
+                    if key not in clips:
+                        path = os.path.join(workdir, f"synthetic_{key}.mp4")
+                        clips[key] = (synthetic_video(path, width, height, args.video_frames), width, height)
+
+                for key, (path, width, height) in clips.items():
+                    for batch_size in args.batch_sizes:
+                        name = f"process_video/{tag}/{key}/batch={batch_size}"
+                        print(f"▶ {name}")
+                        cases.append({'name': name, 'kind': 'process_video', 'backend': backend, 'augment': augment,
+                                      'resolution': f"{width}x{height}", 'batch_size': batch_size,
+                                      'clip': os.path.basename(path) if key == 'source' else 'synthetic',
+                                      **bench_process_video(detector, path, batch_size, args.video_io)})
+    finally:
+        for path, _, _ in clips.values():
+            if path.startswith(workdir):
+                os.remove(path)
+        os.rmdir(workdir)
+    return cases
+
+
+# --- HTTP load tests ----------------------------------------------------------
+
+def _multipart(field, filename, content, content_type, fields=None):
+    """multipart/form-data body (urllib has no encoder)"""
+    boundary = f"benchmark-{uuid.uuid4().hex}"
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode())
+    parts.append(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+                 f"Content-Type: {content_type}\r\n\r\n".encode() + content + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b''.join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _request(url, body=None, content_type=None, timeout=60):
+    headers = {'Content-Type': content_type} if content_type else {}
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST' if body is not None else 'GET')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def _json_request(url, payload=None, timeout=60):
+    body = json.dumps(payload).encode() if payload is not None else None
+    _, data = _request(url, body, 'application/json' if body is not None else None, timeout)
+    return json.loads(data)
+
+
+def server_memory(base_url):
+    """Callable returning the server's RSS from /metrics (for PeakMemory)"""
+    def sample():
+        _, data = _request(f"{base_url}/metrics", timeout=5)
+        for line in data.decode().splitlines():
+            if line.startswith('skyguard_process_resident_memory_bytes '):
+                return float(line.split()[1])
+        return 0
+    return sample
+
+
+def load_test_frames(base_url, clients, requests_per_client, width, height, profile=None):
+    """N clients each POSTing frames to /api/detect/frame back to back"""
+    jpeg = cv2.imencode('.jpg', synthetic_frames(width, height, count=1)[0])[1].tobytes()
+    body, content_type = _multipart('frame', 'frame.jpg', jpeg, 'image/jpeg', {'profile': profile} if profile else None)
+    url = f"{base_url}/api/detect/frame"
+
+    def client(_):
+        latencies, errors = [], 0
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                status, _ = _request(url, body, content_type)
+                if status != 200:
+                    errors += 1
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    with PeakMemory(server_memory(base_url), interval=0.25) as memory:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(clients) as pool:
+            results = list(pool.map(client, range(clients)))
+        wall = time.perf_counter() - started
+
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    return {
+        'requests': clients * requests_per_client,
+        'errors': sum(errors for _, errors in results),
+        'throughput_rps': round(len(latencies) / wall, 3),
+        'latency_ms': latency_summary(latencies),
+        'server_peak_rss_mb': memory.peak_mb
+    }
+
+
+def _watch_stream(url, timeout):
+    """Read an SSE stream until 'complete'; returns connect time, frame arrival times and bytes"""
+    connected = time.perf_counter()
+    arrivals, received = [], 0
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        for line in response:
+            received += len(line)
+            if not line.startswith(b'data: '):
+                continue
+            event_type = json.loads(line[6:]).get('type')
+            if event_type == 'frame':
+                arrivals.append(time.perf_counter())
+            elif event_type == 'complete':
+                break
+    return connected, arrivals, received
+
+
+def load_test_stream(base_url, clients, video_path, timeout=600):
+    """Start a video job and have N viewers watch its /api/stream until it completes"""
+    with open(video_path, 'rb') as f:
+        body, content_type = _multipart('video', f"benchmark_{uuid.uuid4().hex[:8]}.mp4", f.read(), 'video/mp4')
+    _, data = _request(f"{base_url}/api/upload", body, content_type)
+    filename = json.loads(data)['filename']
+
+    with PeakMemory(server_memory(base_url), interval=0.25) as memory:
+        job = _json_request(f"{base_url}/api/detect/video", {'filename': filename, 'use_cache': False,
+                                                             'segmented': False})
+        job_id = job['job_id']
+        with ThreadPoolExecutor(clients) as pool:
+            results = list(pool.map(lambda _: _watch_stream(f"{base_url}/api/stream/{job_id}", timeout),
+                                    range(clients)))
+    status = _json_request(f"{base_url}/api/status/{job_id}")
+
+    gaps, first_frame, frames, rates = [], [], [], []
+    for connected, arrivals, _ in results:
+        frames.append(len(arrivals))
+        if arrivals:
+            first_frame.append(arrivals[0] - connected)
+            gaps.extend(np.diff(arrivals).tolist())
+            if arrivals[-1] > connected:
+                rates.append(len(arrivals) / (arrivals[-1] - connected))
+    return {
+        'job_id': job_id,
+        # Frames delivered per second to each viewer, averaged over viewers
+        'throughput_fps': round(float(np.mean(rates)), 3) if rates else 0.0,
+        'job_status': status.get('status'),
+        'job_fps': status.get('pipeline', {}).get('fps'),
+        'frames_per_client': {'min': min(frames), 'max': max(frames), 'mean': round(float(np.mean(frames)), 1)},
+        'bytes_per_client': round(float(np.mean([received for _, _, received in results]))),
+        'first_frame_ms': latency_summary(first_frame),
+        'frame_gap_ms': latency_summary(gaps),
+        'server_peak_rss_mb': memory.peak_mb
+    }
+
+
+def run_server_benchmarks(args):
+    base_url = args.url.rstrip('/')
+    health = _json_request(f"{base_url}/api/health")
+    if not health.get('model_loaded'):
+        raise RuntimeError(f"Server at {base_url} has no model loaded")
+
+    cases = []
+    width, height = args.resolution
+    for clients in args.clients:
+        name = f"detect_frame_http/clients={clients}/{width}x{height}"
+        print(f"▶ {name}")
+        cases.append({'name': name, 'kind': 'detect_frame_http', 'clients': clients, 'resolution': f"{width}x{height}",
+                      **load_test_frames(base_url, clients, args.requests, width, height, args.profile)})
+
+    if not args.skip_stream:
+        video_path = args.video or synthetic_video(os.path.join(tempfile.gettempdir(), f"benchmark_{uuid.uuid4().hex}.mp4"),
+                                                   width, height, args.video_frames)
+        try:
+            for clients in args.clients:
+                name = f"stream/clients={clients}/{os.path.basename(args.video) if args.video else f'{width}x{height}'}"
+                print(f"▶ {name}")
+                cases.append({'name': name, 'kind': 'stream', 'clients': clients,
+                              **load_test_stream(base_url, clients, video_path)})
+        finally:
+            if not args.video:
+                os.remove(video_path)
+    return cases
+
+
+# --- Compare ------------------------------------------------------------------
+
+# metric path -> True if higher is better
+COMPARED_METRICS = {
+    ('throughput_fps',): True,
+    ('throughput_rps',): True,
+    ('latency_ms', 'p50'): False,
+    ('latency_ms', 'p95'): False,
+    ('latency_ms', 'p99'): False,
+    ('frame_gap_ms', 'p95'): False,
+    ('peak_rss_mb',): False,
+    ('server_peak_rss_mb',): False
+}
+
+
+def _lookup(case, path):
+    value = case
+    for key in path:
+        if not isinstance(value, dict) or value.get(key) is None:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(baseline, current, threshold=DEFAULT_REGRESSION_THRESHOLD, memory_threshold=DEFAULT_MEMORY_THRESHOLD):
+    """
+    Match cases by name and flag metrics that got worse by more than the threshold
+
+    Returns:
+        dict: rows (one per case and metric), regressions, and cases only in one run
+    """
+    before = {case['name']: case for case in baseline['cases'] if 'error' not in case}
+    after = {case['name']: case for case in current['cases'] if 'error' not in case}
+
+    rows = []
+    for name in before.keys() & after.keys():
+        for path, higher_is_better in COMPARED_METRICS.items():
+            old, new = _lookup(before[name], path), _lookup(after[name], path)
+            if old is None or new is None or old == 0:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            limit = memory_threshold if 'rss' in path[0] else threshold
+            rows.append({'case': name, 'metric': '.'.join(path), 'baseline': old, 'current': new,
+                         'change': round(change, 4), 'regression': worse > limit})
+
+    rows.sort(key=lambda row: (row['case'], row['metric']))
+    return {
+        'threshold': threshold,
+        'memory_threshold': memory_threshold,
+        'baseline_commit': baseline.get('environment', {}).get('commit'),
+        'current_commit': current.get('environment', {}).get('commit'),
+        'rows': rows,
+        'regressions': [row for row in rows if row['regression']],
+        'only_in_baseline': sorted(before.keys() - after.keys()),
+        'only_in_current': sorted(after.keys() - before.keys())
+    }
+
+
+def print_comparison(result):
+    print(f"\n{'='*60}")
+    print(f"Benchmark comparison {result['baseline_commit'] or '?'} -> {result['current_commit'] or '?'} "
+          f"(threshold {result['threshold']:.0%}, memory {result['memory_threshold']:.0%})")
+    print(f"{'='*60}")
+    for row in result['rows']:
+        flag = '❌' if row['regression'] else '  '
+        print(f"{flag} {row['case']:<55} {row['metric']:<20} {row['baseline']:>10.2f} -> {row['current']:>10.2f} "
+              f"({row['change']:+.1%})")
+    for name in result['only_in_baseline']:
+        print(f"⚠️  Missing from current run: {name}")
+    for name in result['only_in_current']:
+        print(f"   New case: {name}")
+    print(f"\n{len(result['regressions'])} regression(s)\n")
+
+
+def print_cases(report):
+    print(f"\n{'='*60}")
+    for case in report['cases']:
+        if 'error' in case:
+            print(f"{case['name']:<55} error: {case['error']}")
+            continue
+        throughput = case.get('throughput_fps', case.get('throughput_rps'))
+        latency = case.get('latency_ms') or case.get('frame_gap_ms') or {}
+        rss = case.get('peak_rss_mb', case.get('server_peak_rss_mb'))
+        print(f"{case['name']:<55} {throughput if throughput is not None else '-':>9} /s  "
+              f"p50 {latency.get('p50', '-')} p95 {latency.get('p95', '-')} p99 {latency.get('p99', '-')} ms  "
+              f"peak RSS {rss if rss is not None else '-'} MB")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SkyGuard detector and API benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    detector_parser = commands.add_parser('detector', help='detect_frame and process_video throughput/latency')
+    detector_parser.add_argument('--model', default='models/yolo11s.pt')
+    detector_parser.add_argument('--profile', default='balanced', help='Inference profile (augment is set per case)')
+    detector_parser.add_argument('--backends', type=_csv(), default=['torch'], help='e.g. torch,onnx,openvino')
+    detector_parser.add_argument('--resolutions', type=_csv(parse_resolution), default=[(640, 360), (1280, 720)])
+    detector_parser.add_argument('--batch-sizes', type=_csv(int), default=[1, 8], help='process_video batch sizes')
+    detector_parser.add_argument('--augment', choices=['off', 'on', 'both'], default='off',
+                                 help='Test-time augmentation (torch only)')
+    detector_parser.add_argument('--iterations', type=int, default=50, help='detect_frame calls per case')
+    detector_parser.add_argument('--warmup', type=int, default=5)
+    detector_parser.add_argument('--video', help='Also run process_video on this clip')
+    detector_parser.add_argument('--video-frames', type=int, default=120, help='Length of the synthetic clips')
+    detector_parser.add_argument('--video-io', default='opencv', choices=['auto', 'ffmpeg', 'opencv'])
+    detector_parser.add_argument('--threads', type=int, default=None, help='ONNX Runtime intra-op threads')
+    detector_parser.add_argument('--conf', type=float, default=None, help="Override the profile's confidence threshold")
+    detector_parser.add_argument('--output', help='Write the report as JSON')
+
+    server_parser = commands.add_parser('server', help='Load-test /api/detect/frame and /api/stream')
+    server_parser.add_argument('--url', default='http://127.0.0.1:5000')
+    server_parser.add_argument('--clients', type=_csv(int), default=[1, 4, 16], help='Concurrent clients per case')
+    server_parser.add_argument('--requests', type=int, default=20, help='/api/detect/frame requests per client')
+    server_parser.add_argument('--resolution', type=parse_resolution, default=(640, 360))
+    server_parser.add_argument('--profile', default=None, help='Profile sent with /api/detect/frame')
+    server_parser.add_argument('--video', help='Clip streamed to the viewers (default: synthetic)')
+    server_parser.add_argument('--video-frames', type=int, default=120)
+    server_parser.add_argument('--skip-stream', action='store_true', help='Only load-test /api/detect/frame')
+    server_parser.add_argument('--output', help='Write the report as JSON')
+
+    compare_parser = commands.add_parser('compare', help='Flag regressions between two reports')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                                help='Relative throughput/latency change counted as a regression')
+    compare_parser.add_argument('--memory-threshold', type=float, default=DEFAULT_MEMORY_THRESHOLD)
+    compare_parser.add_argument('--output', help='Write the comparison as JSON')
+
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        result = compare(baseline, current, args.threshold, args.memory_threshold)
+        print_comparison(result)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=2)
+        # Non-zero exit so CI can fail on regressions
+        sys.exit(1 if result['regressions'] else 0)
+
+    settings = {key: value for key, value in vars(args).items() if key not in ('command', 'output')}
+    if args.command == 'detector':
+        args.augment = {'off': [False], 'on': [True], 'both': [False, True]}[args.augment]
+        report = _report('detector', settings, run_detector_benchmarks(args))
+    else:
+        report = _report('server', settings, run_server_benchmarks(args))
+
+    print_cases(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
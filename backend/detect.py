@@ -10,24 +10,106 @@ import numpy as np
 from pathlib import Path
 import json
 import base64
+import os
+import threading
+import time
 from datetime import datetime
 
+from annotate import AnnotationRenderer
+from backends import BACKENDS, PRECISIONS, OnnxRuntimeBackend, export_model, quantized_path
+from detections import Detections
+from metrics import observe_stage, timed
+from pipeline import VideoPipeline
+from tiling import TiledInference
+
+# Named accuracy/speed trade-offs, selectable per request
+INFERENCE_PROFILES = {
+    # Live webcam/stream use: single forward pass, smaller input, fewer boxes
+    'realtime': {
+        'augment': False,
+        'imgsz': 480,
+        'conf_threshold': 0.30,
+        'iou_threshold': 0.45,
+        'max_det': 100
+    },
+    # Full resolution without test-time augmentation
+    'balanced': {
+        'augment': False,
+        'imgsz': 640,
+        'conf_threshold': 0.25,
+        'iou_threshold': 0.45,
+        'max_det': 300
+    },
+    # Offline/archival jobs: test-time augmentation (several passes per frame)
+    'accurate': {
+        'augment': True,
+        'imgsz': 640,
+        'conf_threshold': 0.25,
+        'iou_threshold': 0.45,
+        'max_det': 300
+    },
+    # High-altitude / 4K footage: native-resolution overlapping tiles plus a
+    # full-frame pass instead of TTA, for small distant targets
+    'aerial': {
+        'augment': False,
+        'imgsz': 640,
+        'conf_threshold': 0.25,
+        'iou_threshold': 0.45,
+        'max_det': 300,
+        'tiling': {
+            'tile_size': 640,
+            'overlap': 0.2,
+            'full_frame': True,
+            'skip_empty': True
+        }
+    }
+}
+
+DEFAULT_PROFILE = 'accurate'
+
+
 class ObjectDetector:
-    def __init__(self, model_path='models/yolo11s.pt', conf_threshold=0.25):
+    def __init__(self, model_path='models/yolo11s.pt', conf_threshold=None, profile=DEFAULT_PROFILE,
+                 backend='torch', threads=None, precision='fp32', tiling=None):
         """
         Initialize the object detector
         
         Args:
             model_path: Path to YOLO11 model file
-            conf_threshold: Confidence threshold for detections (lowered for better recall)
+            conf_threshold: Confidence threshold for detections (overrides the profile's)
+            profile: Name of an entry in INFERENCE_PROFILES
+            backend: 'torch', 'onnx' (ONNX Runtime) or 'openvino'; the .pt checkpoint
+                     is exported once and cached for the non-torch backends
+            threads: Intra-op CPU threads for the ONNX Runtime session (defaults to all cores)
+            precision: 'fp32' or 'int8' (the calibrated model from quantize.py; onnx backend only)
+            tiling: TiledInference options overriding the profile's, or False to
+                    disable sliced inference
         """
+        if profile not in INFERENCE_PROFILES:
+            raise ValueError(f"Unknown inference profile '{profile}'. "
+                             f"Available: {', '.join(INFERENCE_PROFILES)}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend '{backend}'. "
+                             f"Available: {', '.join(BACKENDS)}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Available: {', '.join(PRECISIONS)}")
+        if precision == 'int8' and backend != 'onnx':
+            raise ValueError("INT8 precision requires the onnx backend")
+        
+        settings = INFERENCE_PROFILES[profile]
+        
         self.model_path = model_path
         self.model_name = Path(model_path).stem  # Get model name without extension
-        self.conf_threshold = conf_threshold
-        self.iou_threshold = 0.45  # IOU threshold for NMS (lower = allow more overlapping detections)
-        self.imgsz = 640  # Image size for inference
-        self.max_det = 300  # Maximum detections per image
+        self.profile = profile
+        self.backend = backend
+        self.threads = threads
+        self.precision = precision
+        self.conf_threshold = conf_threshold if conf_threshold is not None else settings['conf_threshold']
+        self.iou_threshold = settings['iou_threshold']  # IOU threshold for NMS (lower = allow more overlapping detections)
+        self.imgsz = settings['imgsz']  # Image size for inference
+        self.max_det = settings['max_det']  # Maximum detections per image
         self.model = None
+        self._inference_lock = threading.Lock()  # One forward pass at a time per model replica
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.half = False  # Half precision mode
         
@@ -45,20 +127,55 @@ class ObjectDetector:
             'soldier': (0, 0, 255),      # Red
             'civilian': (0, 255, 0)      # Green
         }
+        self.renderer = AnnotationRenderer(self.colors)
         
-        # Augmentation settings for better detection
-        self.augment = True  # Enable test-time augmentation
+        # Test-time augmentation: better accuracy, several forward passes per frame
+        # (only the torch backend can run the augmented passes)
+        self.augment = settings['augment']
+        if self.augment and backend != 'torch':
+            print(f"⚠️  Test-time augmentation is not supported by the {backend} backend; "
+                  f"profile '{profile}' runs a single pass")
+            self.augment = False
+        
+        # Sliced inference for small objects in large frames (see tiling.py)
+        tiling = settings.get('tiling') if tiling is None else tiling
+        self.tiler = TiledInference(**tiling) if tiling else None
+        
+        # Frames per model call when processing video
+        self.batch_size = 8
+        
+        # Batches that may be in flight at once (see pipeline.VideoPipeline)
+        self.concurrency = 1
         
         self.load_model()
     
     def load_model(self):
         """Load the YOLO11 model with optimizations"""
         try:
-            print(f"Loading model: {self.model_name} from {self.model_path}")
-            print(f"Using device: {self.device}")
+            print(f"Loading model: {self.model_name} from {self.model_path} "
+                  f"(profile: {self.profile}, backend: {self.backend}, precision: {self.precision})")
             
-            self.model = YOLO(self.model_path)
-            self.model.to(self.device)
+            if self.backend == 'onnx':
+                self.device = 'cpu'
+                if self.precision == 'int8':
+                    onnx_path = quantized_path(self.model_path)
+                    if not onnx_path.exists():
+                        raise FileNotFoundError(f"No INT8 model for {self.model_path}; run "
+                                                f"'python quantize.py calibrate --frames <dir>' first")
+                    onnx_path = str(onnx_path)
+                else:
+                    # Exported once per checkpoint hash, then reused
+                    onnx_path = export_model(self.model_path, 'onnx')
+                self.model = OnnxRuntimeBackend(onnx_path, intra_op_threads=self.threads)
+                print(f"ONNX Runtime session: {onnx_path}, {self.model.intra_op_threads} intra-op thread(s)")
+            elif self.backend == 'openvino':
+                self.device = 'cpu'
+                self.model = YOLO(export_model(self.model_path, 'openvino'), task='detect')
+            else:
+                self.model = YOLO(self.model_path)
+                self.model.to(self.device)
+            
+            print(f"Using device: {self.device}")
             
             # Enable half precision for GPU to improve speed
             if self.device == 'cuda':
@@ -87,9 +204,7 @@ class ObjectDetector:
             # Warm up the model with a dummy image to reduce first inference latency
             print("Warming up model...")
             dummy_img = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
-            _ = self.model(dummy_img, conf=self.conf_threshold, iou=self.iou_threshold, 
-                          imgsz=self.imgsz, half=self.half, max_det=self.max_det, 
-                          agnostic_nms=False, verbose=False)
+            _ = self.infer_batch([dummy_img])
             
             print(f"✅ Model {self.model_name} loaded and warmed up successfully!")
             print(f"Detection settings: conf={self.conf_threshold}, iou={self.iou_threshold}, imgsz={self.imgsz}, max_det={self.max_det}")
@@ -99,90 +214,44 @@ class ObjectDetector:
             print(f"Error loading model: {e}")
             return False
     
-    def draw_detections(self, frame, detections):
+    def model_memory_bytes(self):
+        """Bytes of model weights held by this detector (0 if unknown or not loaded)"""
+        module = getattr(self.model, 'model', None)
+        if isinstance(module, torch.nn.Module):
+            tensors = list(module.parameters()) + list(module.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+        path = getattr(self.model, 'path', None)
+        if path and os.path.isfile(path):
+            return os.path.getsize(path)
+        return 0
+    
+    def draw_detections(self, frame, detections, out=None):
         """
         Draw bounding boxes and labels on frame
         
         Args:
             frame: Input frame
-            detections: Detection results
+            detections: Detections (or the equivalent list of dicts)
+            out: Destination buffer; pass frame itself to draw in place
+                 (see AnnotationRenderer.render)
             
         Returns:
             Annotated frame
         """
-        annotated_frame = frame.copy()
-        
-        for det in detections:
-            x1, y1, x2, y2 = map(int, det['bbox'])
-            class_name = det['class']
-            confidence = det['confidence']
-            
-            # Get color based on class name
-            color = self.colors.get(class_name, (128, 128, 128))
-            
-            # Draw bounding box with higher thickness for better visibility
-            thickness = 3
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, thickness)
-            
-            # Prepare label text (class name only, no confidence)
-            label = f"{class_name.upper()}"
-            
-            # Get text size for background
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.6
-            font_thickness = 2
-            (text_width, text_height), baseline = cv2.getTextSize(label, font, font_scale, font_thickness)
-            
-            # Calculate label position (above the box)
-            label_y = y1 - 10 if y1 - 10 > text_height else y1 + text_height + 10
-            
-            # Draw semi-transparent background for label
-            overlay = annotated_frame.copy()
-            cv2.rectangle(overlay, 
-                         (x1, label_y - text_height - 8),
-                         (x1 + text_width + 10, label_y + baseline + 2),
-                         color, -1)
-            
-            # Blend the overlay with the original frame for transparency
-            alpha = 0.8
-            cv2.addWeighted(overlay, alpha, annotated_frame, 1 - alpha, 0, annotated_frame)
-            
-            # Draw black outline for text (for better visibility)
-            cv2.putText(annotated_frame, label,
-                       (x1 + 5, label_y),
-                       font, font_scale, (0, 0, 0), font_thickness + 2, cv2.LINE_AA)
-            
-            # Draw white text on top
-            cv2.putText(annotated_frame, label,
-                       (x1 + 5, label_y),
-                       font, font_scale, (255, 255, 255), font_thickness, cv2.LINE_AA)
-            
-            # Add class-specific indicator
-            if class_name == 'soldier':
-                # Draw small circle in top-right corner of box
-                cv2.circle(annotated_frame, (x2 - 10, y1 + 10), 6, color, -1)
-                cv2.circle(annotated_frame, (x2 - 10, y1 + 10), 6, (255, 255, 255), 1)
-            elif class_name == 'civilian':
-                # Draw small square in top-right corner of box
-                cv2.rectangle(annotated_frame, (x2 - 16, y1 + 4), (x2 - 4, y1 + 16), color, -1)
-                cv2.rectangle(annotated_frame, (x2 - 16, y1 + 4), (x2 - 4, y1 + 16), (255, 255, 255), 1)
-        
-        return annotated_frame
+        with timed('draw'):
+            return self.renderer.render(frame, detections, out=out)
     
-    def detect_frame(self, frame, use_enhancement=False):
+    def _prepare_frame(self, frame, use_enhancement=False):
         """
-        Perform detection on a single frame with optimized settings
+        Normalize color layout and optionally enhance a frame before inference
         
         Args:
             frame: Input frame (numpy array)
             use_enhancement: Apply CLAHE enhancement (slower but better for low-light)
             
         Returns:
-            dict: Detection results and annotated frame
+            tuple: (frame used for drawing, frame passed to the model)
         """
-        if self.model is None:
-            return None
-        
         # Preprocess frame for better detection accuracy
         # Ensure RGB color space (YOLO11 expects RGB)
         if len(frame.shape) == 2:  # Grayscale
@@ -202,140 +271,196 @@ class ObjectDetector:
         else:
             enhanced_frame = frame
         
+        return frame, enhanced_frame
+    
+    def _extract_detections(self, result):
+        """
+        Convert one Ultralytics result into columnar Detections
+        
+        The whole box tensor is moved to host in a single transfer and
+        filtered against allowed_classes with NumPy.
+        """
+        boxes = result.boxes
+        
+        if boxes is None or len(boxes) == 0:
+            return Detections.empty(self.class_names)
+        
+        # Rows are x1, y1, x2, y2, [track_id,] conf, cls
+        data = boxes.data.cpu().numpy()
+        return self._build_detections(data[:, :4], data[:, -1].astype(np.int32), data[:, -2])
+    
+    def _build_detections(self, xyxy, class_ids, confidences):
+        """Keep only allowed classes and wrap the columns as Detections"""
+        # Only accept civilian and soldier classes
+        allowed_ids = [idx for idx, name in self.class_names.items() if name in self.allowed_classes]
+        keep = np.isin(class_ids, allowed_ids)
+        
+        if not keep.all():
+            print(f"Skipped {int((~keep).sum())} detection(s) outside allowed classes")
+        
+        return Detections(xyxy[keep], class_ids[keep], confidences[keep], self.class_names)
+    
+    def infer_batch(self, frames):
+        """
+        Run the model on already-prepared frames
+        
+        Args:
+            frames: List of frames as returned by _prepare_frame
+            
+        Returns:
+            list: One Detections per frame, in input order (None if no model)
+        """
+        if self.model is None:
+            return None
+        
+        if self.backend == 'onnx':
+            with self._inference_lock:
+                outputs = self.model.infer(frames, self.imgsz, self.conf_threshold, self.iou_threshold,
+                                           self.max_det, classes=[0, 1])
+            return [self._build_detections(*output) for output in outputs]
+        
         # Perform inference with optimized parameters
         # Custom model trained with class 0 = civilian, class 1 = soldier
-        results = self.model(
-            enhanced_frame, 
-            conf=self.conf_threshold,
-            iou=self.iou_threshold,
-            imgsz=self.imgsz,
-            half=self.half,
-            augment=self.augment,  # Enable test-time augmentation for better accuracy
-            agnostic_nms=False,  # Class-specific NMS for better class distinction
-            max_det=self.max_det,  # Maximum detections per image
-            classes=[0, 1],  # Detect class 0 (civilian) and class 1 (soldier)
-            verbose=False
-        )
-        
-        detections = []
-        
-        # Process results
-        for result in results:
-            boxes = result.boxes
+        with self._inference_lock:
+            results = self.model(
+                frames,
+                conf=self.conf_threshold,
+                iou=self.iou_threshold,
+                imgsz=self.imgsz,
+                half=self.half,
+                augment=self.augment,  # Test-time augmentation, set by the inference profile
+                agnostic_nms=False,  # Class-specific NMS for better class distinction
+                max_det=self.max_det,  # Maximum detections per image
+                classes=[0, 1],  # Detect class 0 (civilian) and class 1 (soldier)
+                verbose=False
+            )
+        
+        # Results come back in the same order as the input frames
+        start = time.perf_counter()
+        detections = [self._extract_detections(result) for result in results]
+        extract_seconds = time.perf_counter() - start
+        
+        # Ultralytics reports per-image milliseconds for the batch; NMS and extraction count as one stage
+        if results:
+            speed, count = results[0].speed, len(results)
+            observe_stage('preprocess', (speed.get('preprocess') or 0) / 1000 * count, count)
+            observe_stage('inference', (speed.get('inference') or 0) / 1000 * count, count)
+            observe_stage('nms', (speed.get('postprocess') or 0) / 1000 * count + extract_seconds, count)
+        return detections
+    
+    def run_inference(self, frames):
+        """
+        infer_batch, or sliced inference over tiles when the profile enables tiling
+        
+        Args:
+            frames: List of frames as returned by _prepare_frame
             
-            for box in boxes:
-                # Extract box coordinates
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                
-                # Get class and confidence
-                cls = int(box.cls[0].cpu().numpy())
-                conf = float(box.conf[0].cpu().numpy())
-                
-                # Get class name from the model
-                if hasattr(result, 'names'):
-                    detected_class = result.names[cls].lower()
-                else:
-                    detected_class = self.class_names.get(cls, 'unknown')
-                
-                # Only accept civilian and soldier classes
-                if detected_class not in self.allowed_classes:
-                    print(f"Skipped detection: Class '{detected_class}' not in allowed classes")
-                    continue
-                
-                detection = {
-                    'bbox': [float(x1), float(y1), float(x2), float(y2)],
-                    'class': detected_class,
-                    'class_id': cls,
-                    'confidence': conf
-                }
-                
-                detections.append(detection)
+        Returns:
+            list: One Detections per frame, in input order (None if no model)
+        """
+        if self.tiler is not None:
+            return self.tiler.infer(self.infer_batch, frames, self.class_names, self.max_det)
+        return self.infer_batch(frames)
+    
+    def detect_batch(self, frames, use_enhancement=False, annotate=True):
+        """
+        Perform detection on several frames with a single model call
         
-        # Draw detections on frame
-        annotated_frame = self.draw_detections(frame, detections)
+        Args:
+            frames: List of input frames (numpy arrays)
+            use_enhancement: Apply CLAHE enhancement (slower but better for low-light)
+            annotate: Draw detections; when False 'frame' is the unannotated input
+            
+        Returns:
+            list: One detection result dict per input frame, in input order
+        """
+        if not frames:
+            return []
         
-        return {
-            'detections': detections,
-            'frame': annotated_frame,
-            'count': len(detections),
-            'timestamp': datetime.now().isoformat()
-        }
+        prepared = [self._prepare_frame(frame, use_enhancement) for frame in frames]
+        batch_detections = self.run_inference([enhanced_frame for _, enhanced_frame in prepared])
+        
+        if batch_detections is None:
+            return None
+        
+        outputs = []
+        
+        for (frame, _), detections in zip(prepared, batch_detections):
+            # Draw detections on frame
+            if annotate:
+                frame = self.draw_detections(frame, detections)
+            
+            outputs.append({
+                'detections': detections,
+                'frame': frame,
+                'count': len(detections),
+                'timestamp': datetime.now().isoformat()
+            })
+        
+        return outputs
     
-    def process_video(self, video_path, output_path=None, frame_skip=1):
+    def detect_frame(self, frame, use_enhancement=False):
+        """
+        Perform detection on a single frame with optimized settings
+        
+        Args:
+            frame: Input frame (numpy array)
+            use_enhancement: Apply CLAHE enhancement (slower but better for low-light)
+            
+        Returns:
+            dict: Detection results and annotated frame
+        """
+        results = self.detect_batch([frame], use_enhancement)
+        
+        if not results:
+            return None
+        
+        return results[0]
+    
+    def process_video(self, video_path, output_path=None, frame_skip=1, batch_size=None,
+                      annotate_workers=None, encode_quality=None, track_every=None,
+                      motion_threshold=None, max_staleness=30, video_io='opencv'):
         """
         Process entire video file
         
+        Decoding, batched inference and annotation run as overlapping
+        pipeline stages (see pipeline.VideoPipeline).
+        
         Args:
             video_path: Path to input video
             output_path: Path to save output video (optional)
             frame_skip: Process every nth frame for speed
+            batch_size: Number of frames sent to the model per call
+                        (defaults to self.batch_size)
+            annotate_workers: Threads used for drawing and encoding
+            encode_quality: Also JPEG-encode each frame into result['jpeg']
+            track_every: Run the model every N frames and track boxes (with
+                         track IDs) through the frames in between
+            motion_threshold: Reuse the previous detections for frames whose
+                              changed-pixel fraction is below this (None = off)
+            max_staleness: Run the model at least every K frames when motion gating
+            video_io: 'opencv', 'ffmpeg' (pipe decode, H.264 output) or 'auto'
             
         Yields:
             Detection results for each processed frame
         """
-        cap = cv2.VideoCapture(video_path)
-        
-        if not cap.isOpened():
-            raise ValueError(f"Cannot open video: {video_path}")
-        
-        # Get video properties
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        # Initialize video writer if output path provided
-        writer = None
-        if output_path:
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            # Keep original FPS for output video to maintain timing
-            # Frame skip only affects processing, not output playback speed
-            output_fps = fps
-            writer = cv2.VideoWriter(output_path, fourcc, output_fps, (width, height))
-            print(f"Output video FPS: {output_fps:.2f} (original: {fps}, frame_skip: {frame_skip})")
-        
-        frame_count = 0
-        processed_count = 0
-        
-        try:
-            while cap.isOpened():
-                ret, frame = cap.read()
-                
-                if not ret:
-                    break
-                
-                frame_count += 1
-                
-                # Skip frames for performance
-                if frame_count % frame_skip != 0:
-                    continue
-                
-                # Detect objects
-                result = self.detect_frame(frame)
-                
-                if result:
-                    processed_count += 1
-                    result['frame_number'] = frame_count
-                    result['total_frames'] = total_frames
-                    result['progress'] = (frame_count / total_frames) * 100
-                    
-                    # Write annotated frame
-                    if writer:
-                        writer.write(result['frame'])
-                    
-                    yield result
-        
-        finally:
-            cap.release()
-            if writer:
-                writer.release()
+        pipeline = VideoPipeline(self, video_path, output_path, frame_skip, batch_size,
+                                 annotate_workers=annotate_workers, encode_quality=encode_quality,
+                                 track_every=track_every, motion_threshold=motion_threshold,
+                                 max_staleness=max_staleness, video_io=video_io)
+        yield from pipeline.run()
+    
+    def frame_to_jpeg(self, frame, quality=70):
+        """Encode frame as JPEG bytes"""
+        encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        with timed('jpeg'):
+            _, buffer = cv2.imencode('.jpg', frame, encode_params)
+        return buffer.tobytes()
     
     def frame_to_base64(self, frame, quality=70):
         """Convert frame to base64 for transmission with compression"""
         # Reduce JPEG quality for faster encoding and smaller size
-        encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
-        _, buffer = cv2.imencode('.jpg', frame, encode_params)
-        return base64.b64encode(buffer).decode('utf-8')
+        return base64.b64encode(self.frame_to_jpeg(frame, quality)).decode('utf-8')
 
 
 if __name__ == '__main__':
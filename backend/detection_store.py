@@ -0,0 +1,300 @@
+"""
+Detection Store
+Append-only columnar files holding every frame's detections for a job, with
+running aggregates and frame/time-range queries over memory-mapped columns
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+from detections import Detections
+
+# Per-detection columns: name -> (dtype, values per row)
+ROW_COLUMNS = {
+    'class_id': (np.int32, 1),
+    'confidence': (np.float32, 1),
+    'xyxy': (np.float32, 4),
+    'track_id': (np.int64, 1)  # -1 when the job isn't tracking
+}
+# Per-frame index: frame number, first row and number of rows of that frame's detections
+FRAME_COLUMNS = {
+    'frame': (np.int64, 1),
+    'offset': (np.int64, 1),
+    'count': (np.int32, 1)
+}
+META_FILE = 'meta.json'
+
+
+def _column_path(directory, name):
+    return os.path.join(directory, f"{name}.bin")
+
+
+def _append(directory, name, values):
+    with open(_column_path(directory, name), 'ab') as f:
+        f.write(values.tobytes())
+
+
+def _new_aggregates():
+    return {'frames': 0, 'detections': 0, 'class_counts': {}, 'max_count': 0, 'first_frame': None,
+            'last_frame': None}
+
+
+class DetectionWriter:
+    """
+    Append a job's per-frame detections to a store directory
+
+    Rows are buffered and written every flush_frames frames, so memory stays
+    flat however long the video is. meta.json (fps, class names and the
+    running aggregates) is rewritten on every flush, which lets the store be
+    queried while the job is still running.
+    """
+
+    def __init__(self, directory, fps, names, flush_frames=256):
+        """
+        Args:
+            directory: Store directory (replaced if it exists)
+            fps: Source frame rate, for time-based queries
+            names: Mapping of class index -> class name
+            flush_frames: Frames buffered before writing to disk
+        """
+        self.directory = directory
+        self.fps = float(fps or 0.0)
+        self.names = {int(k): v for k, v in names.items()}
+        self.flush_frames = max(1, int(flush_frames))
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+        self.aggregates = _new_aggregates()
+        self._rows_written = 0
+        self._pending_rows = 0
+        self._index = {name: [] for name in FRAME_COLUMNS}
+        self._columns = {name: [] for name in ROW_COLUMNS}
+        self._write_meta(complete=False)
+
+    def append(self, frame_number, detections):
+        """Record one frame's Detections (empty frames are recorded too)"""
+        count = len(detections)
+        self._index['frame'].append(frame_number)
+        self._index['offset'].append(self._rows_written + self._pending_rows)
+        self._index['count'].append(count)
+        if count:
+            self._columns['class_id'].append(detections.class_id)
+            self._columns['confidence'].append(detections.confidence)
+            self._columns['xyxy'].append(detections.xyxy)
+            track_id = detections.track_id if detections.track_id is not None else np.full(count, -1)
+            self._columns['track_id'].append(track_id)
+            self._pending_rows += count
+
+        aggregates = self.aggregates
+        aggregates['frames'] += 1
+        aggregates['detections'] += count
+        aggregates['max_count'] = max(aggregates['max_count'], count)
+        if aggregates['first_frame'] is None:
+            aggregates['first_frame'] = frame_number
+        aggregates['last_frame'] = frame_number
+        if count:
+            classes, counts = np.unique(detections.class_id, return_counts=True)
+            class_counts = aggregates['class_counts']
+            for cls, n in zip(classes.tolist(), counts.tolist()):
+                name = self.names.get(cls, 'unknown')
+                class_counts[name] = class_counts.get(name, 0) + n
+
+        if len(self._index['frame']) >= self.flush_frames:
+            self.flush()
+
+    def flush(self):
+        if not self._index['frame']:
+            return
+        # Rows before the index, so a concurrent reader never sees a frame whose rows are missing
+        for name, (dtype, _) in ROW_COLUMNS.items():
+            if self._columns[name]:
+                _append(self.directory, name, np.concatenate(self._columns[name]).astype(dtype, copy=False))
+            self._columns[name] = []
+        for name, (dtype, _) in FRAME_COLUMNS.items():
+            _append(self.directory, name, np.asarray(self._index[name], dtype=dtype))
+            self._index[name] = []
+
+        self._rows_written += self._pending_rows
+        self._pending_rows = 0
+        self._write_meta(complete=False)
+
+    def close(self):
+        self.flush()
+        self._write_meta(complete=True)
+
+    def _write_meta(self, complete):
+        meta = {
+            'fps': self.fps,
+            'names': self.names,
+            'rows': self._rows_written,
+            'complete': complete,
+            'aggregates': self.aggregates
+        }
+        temp_path = os.path.join(self.directory, META_FILE + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, os.path.join(self.directory, META_FILE))
+
+
+def merge_aggregates(parts):
+    """Combine the aggregates of consecutive parts of one video"""
+    merged = _new_aggregates()
+    for part in parts:
+        if not part['frames']:
+            continue
+        merged['frames'] += part['frames']
+        merged['detections'] += part['detections']
+        merged['max_count'] = max(merged['max_count'], part['max_count'])
+        if merged['first_frame'] is None:
+            merged['first_frame'] = part['first_frame']
+        merged['last_frame'] = part['last_frame']
+        for name, count in part['class_counts'].items():
+            merged['class_counts'][name] = merged['class_counts'].get(name, 0) + count
+    return merged
+
+
+def concat_stores(part_dirs, directory):
+    """
+    Join stores of consecutive video segments into one
+
+    Column files are appended as-is; only the per-frame row offsets are
+    shifted by the rows of the parts before them.
+    """
+    stores = [DetectionStore(part) for part in part_dirs]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+    rows = 0
+    for store in stores:
+        for name in ROW_COLUMNS:
+            source = _column_path(store.directory, name)
+            if os.path.exists(source):
+                with open(source, 'rb') as src, open(_column_path(directory, name), 'ab') as dst:
+                    shutil.copyfileobj(src, dst)
+        index = store._frame_index()
+        if index is not None:
+            _append(directory, 'frame', np.asarray(index['frame']))
+            _append(directory, 'offset', np.asarray(index['offset']) + rows)
+            _append(directory, 'count', np.asarray(index['count']))
+        rows += store.rows
+
+    meta = {
+        'fps': stores[0].fps if stores else 0.0,
+        'names': stores[0].names if stores else {},
+        'rows': rows,
+        'complete': all(store.complete for store in stores),
+        'aggregates': merge_aggregates([store.aggregates for store in stores])
+    }
+    with open(os.path.join(directory, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    return DetectionStore(directory)
+
+
+class DetectionStore:
+    """Read side of a store written by DetectionWriter"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        self.fps = meta['fps']
+        self.names = {int(k): v for k, v in meta['names'].items()}
+        self.rows = meta['rows']
+        self.complete = meta['complete']
+        self.aggregates = meta['aggregates']
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, META_FILE))
+
+    def _column(self, name, count):
+        """Memory-mapped view of the first `count` entries of a column"""
+        dtype, width = (ROW_COLUMNS.get(name) or FRAME_COLUMNS[name])
+        shape = (count, width) if width > 1 else (count,)
+        return np.memmap(_column_path(self.directory, name), dtype=dtype, mode='r', shape=shape)
+
+    def _frame_index(self):
+        """Memory-mapped frame, offset and count columns of every flushed frame (None if none yet)"""
+        path = _column_path(self.directory, 'count')
+        frames_flushed = os.path.getsize(path) // 4 if os.path.exists(path) else 0
+        if not frames_flushed:
+            return None
+        return {name: self._column(name, frames_flushed) for name in FRAME_COLUMNS}
+
+    def frame_at(self, seconds):
+        """Frame number (1-based, as in pipeline results) shown at a time in the video"""
+        return int(seconds * self.fps) + 1 if self.fps else 0
+
+    def time_of(self, frame_number):
+        """Seconds into the video of a frame number"""
+        return round((frame_number - 1) / self.fps, 3) if self.fps else None
+
+    def query(self, start_frame=None, end_frame=None, classes=None, min_confidence=None, limit=None,
+              skip_empty=True):
+        """
+        Detections of the frames in [start_frame, end_frame]
+
+        The frame range is found by binary search on the frame column and only
+        that range's rows are read from the memory-mapped columns, so the cost
+        doesn't depend on the length of the job.
+
+        Args:
+            start_frame: First frame number (inclusive, None = start)
+            end_frame: Last frame number (inclusive, None = end)
+            classes: Class names to keep (None = all)
+            min_confidence: Drop detections scoring below this
+            limit: Stop after this many frames
+            skip_empty: Leave out frames with no (remaining) detections
+
+        Returns:
+            tuple: (list of (frame_number, Detections), frame number to continue
+                    from when limit cut the result short, else None)
+        """
+        index = self._frame_index()
+        if index is None:
+            return [], None
+        frames, offsets, counts = index['frame'], index['offset'], index['count']
+
+        first = 0 if start_frame is None else int(np.searchsorted(frames, start_frame, side='left'))
+        last = len(frames) if end_frame is None else int(np.searchsorted(frames, end_frame, side='right'))
+        if first >= last:
+            return [], None
+
+        rows = int(offsets[last - 1]) + int(counts[last - 1])
+        columns = {name: self._column(name, rows) for name in ROW_COLUMNS} if rows else None
+
+        class_filter = None
+        if classes:
+            wanted = {name.lower() for name in classes}
+            class_filter = np.array([cls for cls, name in self.names.items() if name.lower() in wanted],
+                                    dtype=np.int32)
+
+        results = []
+        for i in range(first, last):
+            count = int(counts[i])
+            if count:
+                window = slice(int(offsets[i]), int(offsets[i]) + count)
+                track_id = np.array(columns['track_id'][window])
+                detections = Detections(np.array(columns['xyxy'][window]), np.array(columns['class_id'][window]),
+                                        np.array(columns['confidence'][window]), self.names,
+                                        track_id if (track_id >= 0).all() else None)
+                mask = np.ones(count, dtype=bool)
+                if class_filter is not None:
+                    mask &= np.isin(detections.class_id, class_filter)
+                if min_confidence is not None:
+                    mask &= detections.confidence >= min_confidence
+                if not mask.all():
+                    detections = detections.filter(mask)
+            else:
+                detections = Detections.empty(self.names)
+
+            if skip_empty and not len(detections):
+                continue
+            if limit is not None and len(results) >= limit:
+                return results, int(frames[i])
+            results.append((int(frames[i]), detections))
+        return results, None
@@ -0,0 +1,97 @@
+"""
+Columnar Detection Results
+Compact NumPy-backed container for the detections of a single frame
+"""
+
+import numpy as np
+
+
+class Detections:
+    """
+    Detections for one frame stored as parallel arrays
+
+    The list-of-dicts view used by the JSON API is only built (and then
+    cached) when to_list() is called, e.g. while a response is serialized.
+    """
+
+    __slots__ = ('xyxy', 'class_id', 'confidence', 'names', 'track_id', '_list')
+
+    def __init__(self, xyxy, class_id, confidence, names, track_id=None):
+        """
+        Args:
+            xyxy: (N, 4) float32 array of box corners in pixels
+            class_id: (N,) int32 array of class indices
+            confidence: (N,) float32 array of scores
+            names: Mapping of class index -> class name
+            track_id: Optional (N,) int64 array of tracker IDs (see tracking.py)
+        """
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.class_id = np.asarray(class_id, dtype=np.int32).reshape(-1)
+        self.confidence = np.asarray(confidence, dtype=np.float32).reshape(-1)
+        self.names = names
+        self.track_id = None if track_id is None else np.asarray(track_id, dtype=np.int64).reshape(-1)
+        self._list = None
+
+    @classmethod
+    def empty(cls, names):
+        """Detections with no boxes"""
+        return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int32),
+                   np.zeros(0, dtype=np.float32), names)
+
+    @classmethod
+    def from_list(cls, detections, names=None):
+        """Build from the list-of-dicts format returned by to_list()"""
+        if names is None:
+            names = {det['class_id']: det['class'] for det in detections}
+        if not detections:
+            return cls.empty(names)
+        track_id = None
+        if all('track_id' in det for det in detections):
+            track_id = [det['track_id'] for det in detections]
+        return cls([det['bbox'] for det in detections],
+                   [det['class_id'] for det in detections],
+                   [det['confidence'] for det in detections],
+                   names, track_id)
+
+    def __len__(self):
+        return len(self.class_id)
+
+    def filter(self, mask):
+        """Return a new Detections with only the rows selected by mask"""
+        track_id = None if self.track_id is None else self.track_id[mask]
+        return Detections(self.xyxy[mask], self.class_id[mask], self.confidence[mask], self.names, track_id)
+
+    def to_list(self):
+        """List-of-dicts view: [{'bbox', 'class', 'class_id', 'confidence'[, 'track_id']}, ...]"""
+        if self._list is None:
+            self._list = [
+                {
+                    'bbox': bbox,
+                    'class': self.names.get(cls, 'unknown'),
+                    'class_id': cls,
+                    'confidence': conf
+                }
+                for bbox, cls, conf in zip(self.xyxy.tolist(), self.class_id.tolist(),
+                                           self.confidence.tolist())
+            ]
+            if self.track_id is not None:
+                for det, track_id in zip(self._list, self.track_id.tolist()):
+                    det['track_id'] = track_id
+        return self._list
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def json_default(obj):
+    """json.dumps default hook that serializes Detections lazily"""
+    if isinstance(obj, Detections):
+        return obj.to_list()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
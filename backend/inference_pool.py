@@ -0,0 +1,304 @@
+"""
+Multi-Process Inference Pool
+Runs ObjectDetector replicas in worker processes; frames reach the workers
+through shared memory and only compact detection arrays come back
+"""
+
+import atexit
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from detect import ObjectDetector, DEFAULT_PROFILE
+from detections import Detections
+from metrics import timed
+
+REPLICA_WAIT_SECONDS = 120  # Longest infer() waits for an idle replica (covers a respawn)
+
+
+def _worker_main(model_path, profile, conf_threshold, backend, precision, threads, conn):
+    """Worker process: load a detector replica and serve batches from shared memory"""
+    import torch
+    torch.set_num_threads(threads)
+
+    detector = ObjectDetector(model_path=model_path, conf_threshold=conf_threshold, profile=profile,
+                              backend=backend, threads=threads, precision=precision)
+    if detector.model is None:
+        conn.send(('error', f"Failed to load {model_path}"))
+        return
+    conn.send(('ready', detector.class_names))
+
+    segments = {}  # name -> SharedMemory attached in this process
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+
+        name, layout = message
+        if name not in segments:
+            # The parent grew its buffer; drop segments that are no longer used
+            for old_name in list(segments):
+                try:
+                    segments.pop(old_name).close()
+                except BufferError:
+                    pass  # Still referenced by the predictor; released with the process
+            segments[name] = shared_memory.SharedMemory(name=name)
+
+        buffer = segments[name].buf
+        frames = [np.ndarray(shape, dtype=np.uint8, buffer=buffer, offset=offset) for offset, shape in layout]
+
+        try:
+            batch = detector.infer_batch(frames)
+            conn.send(('ok', [(d.xyxy, d.class_id, d.confidence) for d in batch]))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+        finally:
+            del frames
+
+    for segment in segments.values():
+        try:
+            segment.close()
+        except BufferError:
+            pass
+
+
+class _Replica:
+    """Parent-side handle for one worker process and its input buffer"""
+
+    def __init__(self, ctx, index, model_path, profile, conf_threshold, backend, precision, threads):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, name=f'inference-{index}', daemon=True,
+                                   args=(model_path, profile, conf_threshold, backend, precision,
+                                         threads, child_conn))
+        self.process.start()
+        child_conn.close()
+        self.shm = None
+
+    def wait_ready(self):
+        """Block until the worker has loaded its model; returns its class names"""
+        status, payload = self.conn.recv()
+        if status != 'ready':
+            raise RuntimeError(f"Inference worker failed to start: {payload}")
+        return payload
+
+    def buffer(self, nbytes):
+        """Shared input buffer of at least nbytes, replaced with a larger one when needed"""
+        if self.shm is None or self.shm.size < nbytes:
+            size = max(nbytes, 2 * self.shm.size if self.shm else 0)
+            if self.shm is not None:
+                self.shm.close()
+                self.shm.unlink()
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        return self.shm
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class InferencePool:
+    """
+    N worker processes, each with its own warmed-up ObjectDetector
+
+    infer() may be called from several threads at once; each call is served
+    by one idle replica, so up to N batches run in parallel. A replica whose
+    process dies is replaced in the background; once none are left (every
+    replacement failed to start), infer() raises instead of waiting.
+    """
+
+    def __init__(self, model_path, profile=DEFAULT_PROFILE, workers=2, threads_per_worker=None,
+                 conf_threshold=None, backend='torch', precision='fp32'):
+        """
+        Args:
+            model_path: Path to YOLO11 model file
+            profile: Inference profile each replica is created with
+            workers: Number of worker processes
+            threads_per_worker: torch / ONNX Runtime CPU threads per worker (defaults to cores / workers)
+            conf_threshold: Optional confidence override passed to each replica
+            backend: Inference backend each replica runs (see ObjectDetector)
+            precision: 'fp32' or 'int8' (see ObjectDetector)
+        """
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.class_names = {}
+
+        print(f"Starting inference pool: {self.workers} worker(s) x {self.threads_per_worker} thread(s)")
+
+        # spawn: torch and OpenCV thread pools don't survive fork reliably
+        self._ctx = mp.get_context('spawn')
+        self._replica_args = (model_path, profile, conf_threshold, backend, precision, self.threads_per_worker)
+        self._replicas = [_Replica(self._ctx, i, *self._replica_args) for i in range(self.workers)]
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._live = 0  # Replicas serving or idle
+        self._respawning = 0
+        self._spawned = self.workers
+        self._closed = False
+
+        for replica in self._replicas:
+            try:
+                self.class_names = replica.wait_ready()
+            except (RuntimeError, EOFError, OSError):
+                self.close()
+                raise
+            self._live += 1
+            self._idle.put(replica)
+
+        atexit.register(self.close)
+        print(f"✅ Inference pool ready ({self.workers} replica(s))")
+
+    def infer(self, frames):
+        """
+        Run one batch on an idle replica
+
+        Args:
+            frames: List of uint8 frames
+
+        Returns:
+            list: (xyxy, class_id, confidence) arrays per frame, in input order
+        """
+        if not frames:
+            return []
+
+        replica = self._acquire()
+        healthy = True
+        try:
+            frames = [np.asarray(frame, dtype=np.uint8) for frame in frames]
+            shm = replica.buffer(sum(frame.nbytes for frame in frames))
+
+            # One copy per frame into shared memory instead of pickling it
+            layout = []
+            offset = 0
+            for frame in frames:
+                view = np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                np.copyto(view, frame)
+                layout.append((offset, frame.shape))
+                offset += frame.nbytes
+                del view
+
+            replica.conn.send((shm.name, layout))
+            status, payload = replica.conn.recv()
+        except (EOFError, OSError) as e:
+            healthy = False
+            self._replace(replica)
+            raise RuntimeError(f"Inference worker {replica.process.name} died: {e}")
+        finally:
+            if healthy:
+                self._idle.put(replica)
+
+        if status != 'ok':
+            raise RuntimeError(f"Inference worker error: {payload}")
+        return payload
+
+    def _acquire(self):
+        """Next idle replica; raises if none are left or none frees up in REPLICA_WAIT_SECONDS"""
+        deadline = time.monotonic() + REPLICA_WAIT_SECONDS
+        while True:
+            with self._lock:
+                if self._closed or not (self._live or self._respawning):
+                    raise RuntimeError('No inference workers left')
+            try:
+                return self._idle.get(timeout=min(1.0, max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"No inference worker free after {REPLICA_WAIT_SECONDS}s")
+
+    def _replace(self, replica):
+        """Drop a dead replica and start a new one in the background"""
+        with self._lock:
+            self._live -= 1
+            if self._closed:
+                return
+            self._respawning += 1
+            index = self._spawned
+            self._spawned += 1
+        print(f"⚠️ Inference worker {replica.process.name} died, starting a replacement")
+        threading.Thread(target=self._respawn, args=(replica, index), name=f'inference-respawn-{index}',
+                         daemon=True).start()
+
+    def _respawn(self, dead, index):
+        dead.close()
+        replica = None
+        try:
+            replica = _Replica(self._ctx, index, *self._replica_args)
+            replica.wait_ready()
+        except Exception as e:
+            print(f"❌ Inference worker replacement failed: {e}")
+            if replica is not None:
+                replica.close()
+            replica = None
+        with self._lock:
+            self._respawning -= 1
+            if dead in self._replicas:
+                self._replicas.remove(dead)
+            closed = self._closed
+            if replica is not None and not closed:
+                self._replicas.append(replica)
+                self._live += 1
+                self._idle.put(replica)
+        if replica is not None and closed:
+            replica.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            replicas, self._replicas = self._replicas, []
+        for replica in replicas:
+            replica.close()
+
+
+class PooledDetector(ObjectDetector):
+    """
+    ObjectDetector whose inference runs on an InferencePool
+
+    Drawing, encoding and result assembly stay in the calling process, so
+    detect_frame, detect_batch and process_video work unchanged.
+    """
+
+    def __init__(self, model_path='models/yolo11s.pt', conf_threshold=None, profile=DEFAULT_PROFILE,
+                 workers=2, threads_per_worker=None, backend='torch', precision='fp32'):
+        self.pool = None
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self._conf_override = conf_threshold
+        super().__init__(model_path=model_path, conf_threshold=conf_threshold, profile=profile,
+                         backend=backend, precision=precision)
+        # Let the video pipeline keep one batch in flight per replica
+        self.concurrency = self.workers
+
+    def load_model(self):
+        """Start the worker processes instead of loading the model in-process"""
+        try:
+            self.pool = InferencePool(self.model_path, self.profile, self.workers,
+                                      self.threads_per_worker, self._conf_override,
+                                      self.backend, self.precision)
+            self.class_names = {int(idx): name.lower() for idx, name in self.pool.class_names.items()}
+            self.allowed_classes = set(self.class_names.values())
+            self.device = 'cpu'
+            return True
+        except Exception as e:
+            print(f"Error starting inference pool: {e}")
+            return False
+
+    def infer_batch(self, frames):
+        if self.pool is None:
+            return None
+        # Round trip through a replica: preprocess, inference and NMS happen in the worker process
+        with timed('inference', len(frames)):
+            outputs = self.pool.infer(frames)
+        return [Detections(xyxy, class_id, confidence, self.class_names) for xyxy, class_id, confidence in outputs]
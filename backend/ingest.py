@@ -0,0 +1,286 @@
+"""
+Streaming Ingest
+Downloads YouTube and direct-URL videos to disk on a background thread while
+the detection pipeline decodes the part that has already arrived
+"""
+
+import ipaddress
+import os
+import re
+import socket
+import threading
+import urllib.request
+from urllib.parse import urlparse
+
+import cv2
+import yt_dlp
+
+YOUTUBE_URL = re.compile(r'^(https?://)?(www\.)?(youtube\.com/watch\?v=|youtu\.be/)[\w-]+')
+
+# Single-file (progressive) formats can be decoded while they download; HLS/DASH cannot
+PROGRESSIVE_FORMAT = ('best[height<=720][ext=mp4][protocol^=http][protocol!*=dash]'
+                      '/best[height<=720][protocol^=http][protocol!*=dash]')
+# Full-download fallback for sources with only adaptive formats
+DOWNLOAD_FORMAT = 'best[height<=720][ext=mp4]/best[height<=720]/best'
+
+CHUNK_SIZE = 1 << 20
+HEADER_PROBE_BYTES = 64 * 1024  # First attempt at reading the container header; doubled until it parses
+
+
+def is_youtube_url(url):
+    return bool(YOUTUBE_URL.match(url))
+
+
+def is_direct_url(url):
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and bool(parsed.netloc)
+
+
+def is_public_url(url):
+    """
+    Whether every address the URL's host resolves to is public
+
+    Loopback, private, link-local (cloud metadata at 169.254.169.254) and
+    other reserved addresses don't count, so the server can't be used to
+    reach its own network.
+    """
+    host = urlparse(url).hostname
+    if not host:
+        return False
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        return True  # Unresolvable: the download itself fails with the DNS error
+    return all(ipaddress.ip_address(address.split('%')[0]).is_global for address in addresses)
+
+
+class _PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follow redirects only to public hosts"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not is_public_url(newurl):
+            raise ValueError(f"Refusing to follow a redirect to a non-public address: {newurl}")
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def resolve_source(url):
+    """
+    Find the media URL to download for a YouTube or direct video URL
+
+    Returns:
+        dict: url (None if the source only has adaptive formats and must be
+              downloaded with yt-dlp), headers, title and filesize (or None)
+    """
+    if not is_youtube_url(url):
+        return {'url': url, 'headers': {}, 'title': os.path.basename(urlparse(url).path) or url, 'filesize': None}
+
+    options = {'format': PROGRESSIVE_FORMAT, 'quiet': True, 'noplaylist': True, 'nocheckcertificate': True}
+    try:
+        with yt_dlp.YoutubeDL(options) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except yt_dlp.utils.DownloadError as e:
+        if 'Requested format is not available' not in str(e):
+            raise
+        return {'url': None, 'headers': {}, 'title': url, 'filesize': None}
+
+    return {
+        'url': info.get('url'),
+        'headers': info.get('http_headers') or {},
+        'title': info.get('title', 'Unknown'),
+        'filesize': info.get('filesize') or info.get('filesize_approx')
+    }
+
+
+def download_with_ytdlp(url, video_path, progress_hook=None):
+    """Download a whole video with yt-dlp (sources that can't be streamed)"""
+    options = {
+        'format': DOWNLOAD_FORMAT,
+        'outtmpl': video_path,
+        'quiet': False,
+        'no_warnings': False,
+        'noplaylist': True,
+        'nocheckcertificate': True,
+        'progress_hooks': [progress_hook] if progress_hook else [],
+    }
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(url, download=True)
+        print(f"Downloaded: {info.get('title', 'Unknown')}")
+
+
+class StreamingDownload:
+    """
+    Download a URL into a file on a background thread
+
+    Readers can follow the file while it grows: wait() blocks until enough
+    bytes have arrived and iter_bytes() yields the content as it is written.
+    """
+
+    def __init__(self, url, path, headers=None, chunk_size=CHUNK_SIZE, timeout=30, progress_callback=None,
+                 allow_private=False):
+        """
+        Args:
+            url: http(s) URL of the media file
+            path: File to write
+            headers: Extra request headers (e.g. from yt-dlp)
+            chunk_size: Largest read from the connection
+            timeout: Socket timeout in seconds
+            progress_callback: Called with this download after every chunk;
+                               an exception raised there aborts the download
+            allow_private: Also download from (and follow redirects to)
+                           loopback, private and link-local addresses
+        """
+        self.url = url
+        self.allow_private = allow_private
+        self.path = path
+        self.headers = headers or {}
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.progress_callback = progress_callback
+
+        self.bytes_done = 0
+        self.total_bytes = None  # From Content-Length, when the server sends it
+        self.error = None
+        self.finished = False
+
+        self._cancelled = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._download_loop, name='download', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _download_loop(self):
+        try:
+            if self.allow_private:
+                opener = urllib.request.build_opener()
+            elif is_public_url(self.url):
+                opener = urllib.request.build_opener(_PublicRedirectHandler)
+            else:
+                raise ValueError(f"Refusing to download from a non-public address: {self.url}")
+            request = urllib.request.Request(self.url, headers=self.headers)
+            with opener.open(request, timeout=self.timeout) as response, open(self.path, 'wb') as out:
+                length = response.headers.get('Content-Length')
+                self.total_bytes = int(length) if length else None
+
+                while not self._cancelled:
+                    # read1 returns what has arrived instead of waiting for a full chunk
+                    chunk = response.read1(self.chunk_size)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    out.flush()
+                    with self._cond:
+                        self.bytes_done += len(chunk)
+                        self._cond.notify_all()
+                    if self.progress_callback is not None:
+                        self.progress_callback(self)
+
+            if not self._cancelled and self.total_bytes is not None and self.bytes_done < self.total_bytes:
+                raise IOError(f"Connection closed after {self.bytes_done} of {self.total_bytes} bytes")
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+
+    @property
+    def progress(self):
+        """Percent downloaded, or None while the size is unknown"""
+        if self.finished and self.error is None:
+            return 100.0
+        if not self.total_bytes:
+            return None
+        return 100.0 * self.bytes_done / self.total_bytes
+
+    def wait(self, min_bytes=None, timeout=None):
+        """
+        Block until min_bytes have arrived (or the whole file, if None)
+
+        Returns:
+            bool: False if the timeout expired first
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.finished or (min_bytes is not None and self.bytes_done >= min_bytes), timeout)
+
+    def iter_bytes(self):
+        """
+        Yield the file's content as it is downloaded
+
+        Raises the download's error once the data received before it has
+        been yielded.
+        """
+        self.wait(1)
+        position = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self.finished or self.bytes_done > position)
+                    available, finished = self.bytes_done, self.finished
+
+                while position < available:
+                    chunk = f.read(min(self.chunk_size, available - position))
+                    if not chunk:
+                        break
+                    position += len(chunk)
+                    yield chunk
+
+                if finished and position >= self.bytes_done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+
+    def cancel(self):
+        self._cancelled = True
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+
+def wait_for_header(download, min_bytes=HEADER_PROBE_BYTES, check_cancelled=None):
+    """
+    Wait until the partial file's container header can be read
+
+    Faststart MP4s, WebM and MKV put the header first, so this returns after
+    the first few hundred KB. MP4s with the index at the end only parse once
+    the download is complete; 'streaming' is False then.
+
+    Args:
+        download: Running StreamingDownload
+        min_bytes: Bytes to have before the first attempt
+        check_cancelled: Called while waiting; raise (e.g. JobCancelled) to abort
+
+    Returns:
+        dict: fps, frame_count, width, height and streaming
+    """
+    target = min_bytes
+    while True:
+        if not download.wait(target, timeout=0.5):
+            if check_cancelled is not None:
+                check_cancelled()
+            continue
+        if check_cancelled is not None:
+            check_cancelled()
+
+        finished = download.finished
+        if finished and download.error is not None:
+            raise download.error
+
+        cap = cv2.VideoCapture(download.path)
+        try:
+            if cap.isOpened() and cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0 and cap.get(cv2.CAP_PROP_FRAME_WIDTH) > 0:
+                return {
+                    'fps': cap.get(cv2.CAP_PROP_FPS),
+                    'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+                    'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                    'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    'streaming': not finished
+                }
+        finally:
+            cap.release()
+
+        if finished:
+            raise ValueError(f"Cannot read video from {download.url}")
+        target = max(target, download.bytes_done) * 2
@@ -0,0 +1,260 @@
+"""
+Job Registry
+Status of video jobs, kept in memory while they run and spilled to a compact
+on-disk record once they have been finished for a while
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from detections import Detections
+
+FINISHED_STATES = ('completed', 'error', 'cancelled')
+# Left out of spilled records: the job's detection store has every frame's detections
+SPILL_EXCLUDED_KEYS = ('detections',)
+
+
+def _deep_sizeof(obj, seen=None):
+    """Approximate memory held by a status value (containers, arrays and Detections)"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + (obj.nbytes if obj.base is None else 0)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, deque)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif isinstance(obj, Detections):
+        size += sum(_deep_sizeof(getattr(obj, slot), seen) for slot in Detections.__slots__ if slot != 'names')
+    return size
+
+
+class JobRegistry(MutableMapping):
+    """
+    job_id -> status dict, bounded by age and count
+
+    Behaves like the plain dict it replaces. Jobs are evicted by sweep() once
+    they have been finished for ttl_seconds, or earlier (oldest finished
+    first) while more than max_jobs are held. Evicted jobs are written to
+    <directory>/<job_id>.json without their detection lists, and lookups fall
+    back to that record, so status requests keep working. Running and queued
+    jobs are never evicted.
+
+    The registry also owns the jobs' stream broadcasters (streams) and
+    reaps those nobody is watching anymore.
+    """
+
+    def __init__(self, directory, ttl_seconds=600, max_jobs=200, stream_grace_seconds=60):
+        """
+        Args:
+            directory: Folder for spilled job records
+            ttl_seconds: How long finished jobs stay in memory
+            max_jobs: Jobs held in memory before finished ones are evicted early
+            stream_grace_seconds: How long a finished job's stream waits for
+                                  (re)connecting viewers before it is dropped
+        """
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max(1, int(max_jobs))
+        self.stream_grace_seconds = stream_grace_seconds
+        os.makedirs(directory, exist_ok=True)
+
+        self.streams = {}  # job_id -> FrameBroadcaster
+        self.spilled = 0
+        self.reaped_streams = 0
+
+        self._jobs = OrderedDict()
+        self._finished_at = {}  # job_id -> time.monotonic() when first seen finished
+        self._lock = threading.RLock()
+        self._sweeper = None
+
+    def _record_path(self, job_id):
+        return os.path.join(self.directory, f"{os.path.basename(job_id)}.json")
+
+    def _load_record(self, job_id):
+        try:
+            with open(self._record_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def __getitem__(self, job_id):
+        with self._lock:
+            status = self._jobs.get(job_id)
+        if status is None:
+            status = self._load_record(job_id)
+            if status is None:
+                raise KeyError(job_id)
+        return status
+
+    def __setitem__(self, job_id, status):
+        with self._lock:
+            self._jobs[job_id] = status
+            self._jobs.move_to_end(job_id)
+            self._finished_at.pop(job_id, None)
+
+    def __delitem__(self, job_id):
+        with self._lock:
+            found = self._jobs.pop(job_id, None) is not None
+            self._finished_at.pop(job_id, None)
+        if os.path.exists(self._record_path(job_id)):
+            os.remove(self._record_path(job_id))
+            found = True
+        if not found:
+            raise KeyError(job_id)
+
+    def __contains__(self, job_id):
+        with self._lock:
+            if job_id in self._jobs:
+                return True
+        return os.path.exists(self._record_path(job_id))
+
+    def __iter__(self):
+        """Jobs held in memory (spilled records are only reached by job_id)"""
+        with self._lock:
+            return iter(list(self._jobs))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def sweep(self):
+        """
+        Evict expired finished jobs and reap unwatched streams
+
+        Returns:
+            int: Number of jobs spilled to disk
+        """
+        now = time.monotonic()
+        with self._lock:
+            for job_id, status in self._jobs.items():
+                if status.get('status') in FINISHED_STATES:
+                    self._finished_at.setdefault(job_id, now)
+
+            # Oldest finished first
+            finished = sorted(self._finished_at, key=self._finished_at.get)
+            evict = [job_id for job_id in finished if now - self._finished_at[job_id] >= self.ttl_seconds]
+            excess = len(self._jobs) - len(evict) - self.max_jobs
+            if excess > 0:
+                evict += [job_id for job_id in finished if job_id not in evict][:excess]
+
+            for job_id in evict:
+                self._spill(job_id, self._jobs.pop(job_id))
+                del self._finished_at[job_id]
+            self.spilled += len(evict)
+
+            self._reap_streams(now)
+        return len(evict)
+
+    def _spill(self, job_id, status):
+        record = {key: value for key, value in status.items() if key not in SPILL_EXCLUDED_KEYS}
+        record['spilled'] = True
+        temp_path = self._record_path(job_id) + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(record, f, default=str)
+        os.replace(temp_path, self._record_path(job_id))
+
+    def _reap_streams(self, now):
+        """Drop broadcasters without viewers whose job is gone or finished past the grace period"""
+        for job_id, broadcaster in list(self.streams.items()):
+            if broadcaster.subscriber_count:
+                continue
+            if job_id in self._jobs:
+                finished_at = self._finished_at.get(job_id)
+                if finished_at is None or now - finished_at < self.stream_grace_seconds:
+                    continue
+            # Orphan: evicted job, unknown job_id, or nobody came to watch the finished job
+            broadcaster.close()
+            if self.streams.get(job_id) is broadcaster:
+                del self.streams[job_id]
+                self.reaped_streams += 1
+
+    def cleanup(self, max_age_seconds):
+        """Delete spilled records older than max_age_seconds"""
+        removed = 0
+        cutoff = time.time() - max_age_seconds
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.json') and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def memory_usage(self, job_id):
+        """
+        Approximate bytes held in memory for a job
+
+        Returns:
+            dict: status_bytes (status dict incl. recent detections),
+                  stream_bytes (frames buffered for viewers) and total
+        """
+        with self._lock:
+            status = self._jobs.get(job_id)
+        status_bytes = _deep_sizeof(status) if status is not None else 0
+        broadcaster = self.streams.get(job_id)
+        stream_bytes = broadcaster.buffered_bytes() if broadcaster is not None else 0
+        return {'status_bytes': status_bytes, 'stream_bytes': stream_bytes, 'total': status_bytes + stream_bytes}
+
+    def start_sweeper(self, interval=30, tasks=()):
+        """
+        Run sweep() every interval seconds on a daemon thread
+
+        Args:
+            interval: Seconds between sweeps
+            tasks: Other housekeeping callables run after each sweep
+        """
+        if self._sweeper is not None:
+            return
+
+        def sweep_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    evicted = self.sweep()
+                    if evicted:
+                        print(f"🗃️  Spilled {evicted} finished job(s) to disk")
+                except Exception as e:
+                    print(f"❌ Job registry sweep failed: {e}")
+                for task in tasks:
+                    try:
+                        task()
+                    except Exception as e:
+                        print(f"❌ {getattr(task, '__name__', task)} failed: {e}")
+
+        self._sweeper = threading.Thread(target=sweep_loop, name='job-registry-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stats(self):
+        with self._lock:
+            job_ids = list(self._jobs)
+            finished = len(self._finished_at)
+        jobs = {job_id: self.memory_usage(job_id) for job_id in job_ids}
+        orphan_streams = [job_id for job_id in list(self.streams) if job_id not in jobs]
+        for job_id in orphan_streams:
+            broadcaster = self.streams.get(job_id)
+            if broadcaster is not None:
+                jobs[job_id] = {'status_bytes': 0, 'stream_bytes': broadcaster.buffered_bytes(),
+                                'total': broadcaster.buffered_bytes()}
+        return {
+            'in_memory': len(job_ids),
+            'finished_in_memory': finished,
+            'max_jobs': self.max_jobs,
+            'ttl_seconds': self.ttl_seconds,
+            'streams': len(self.streams),
+            'spilled': self.spilled,
+            'reaped_streams': self.reaped_streams,
+            'bytes': sum(usage['total'] for usage in jobs.values()),
+            'jobs': jobs
+        }
@@ -0,0 +1,260 @@
+"""
+Job Scheduler
+Bounded worker pool with priority/FIFO queueing, cancellation and
+SQLite-backed persistence so queued jobs survive a server restart
+"""
+
+import heapq
+import itertools
+import json
+import sqlite3
+import threading
+import time
+
+from metrics import REGISTRY
+
+# Lower value runs first; jobs with equal priority run in submission order
+PRIORITIES = {
+    'high': 0,
+    'normal': 1,
+    'low': 2
+}
+
+
+JOBS_FINISHED = REGISTRY.counter('skyguard_jobs_finished_total', 'Jobs finished, by kind and final status',
+                                 labels=('kind', 'status'))
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
+
+class Job:
+    """A unit of work handed to a registered handler"""
+
+    def __init__(self, job_id, kind, params, priority=PRIORITIES['normal'], created_at=None):
+        self.job_id = job_id
+        self.kind = kind
+        self.params = params
+        self.priority = priority
+        self.created_at = created_at or time.time()
+        self.status = 'queued'
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job was cancelled; call this between units of work"""
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+
+
+class JobStore:
+    """SQLite persistence for job metadata"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def save(self, job):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, kind, params, priority, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.job_id, job.kind, json.dumps(job.params), job.priority, job.status, job.created_at, now))
+
+    def set_status(self, job_id, status, error=None):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                               (status, error, time.time(), job_id))
+
+    def unfinished(self):
+        """Jobs that were queued or running when the server last stopped"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, kind, params, priority, created_at FROM jobs "
+                "WHERE status IN ('queued', 'running') ORDER BY created_at").fetchall()
+        return [Job(job_id, kind, json.loads(params), priority, created_at)
+                for job_id, kind, params, priority, created_at in rows]
+
+
+class JobScheduler:
+    """
+    Run jobs on a fixed number of worker threads
+
+    Jobs wait in a priority queue (FIFO within a priority) until a worker is
+    free, so concurrent submissions queue up instead of all competing for
+    the model at once.
+    """
+
+    def __init__(self, db_path, workers=2):
+        """
+        Args:
+            db_path: SQLite file used to persist job metadata
+            workers: Number of jobs allowed to run at the same time
+        """
+        self.store = JobStore(db_path)
+        self.workers = max(1, int(workers))
+        self._handlers = {}
+        self._heap = []  # (priority, seq, job_id)
+        self._seq = itertools.count()
+        self._jobs = {}  # job_id -> Job, for queued and running jobs
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def register(self, kind, handler):
+        """Register handler(job) for jobs of the given kind"""
+        self._handlers[kind] = handler
+
+    def start(self):
+        """
+        Restore unfinished jobs from storage and start the workers
+
+        Returns:
+            list: Jobs restored from a previous run, already re-queued
+        """
+        restored = []
+        for job in self.store.unfinished():
+            if job.kind not in self._handlers:
+                self.store.set_status(job.job_id, 'error', f"No handler for job kind '{job.kind}'")
+                continue
+            self._enqueue(job)
+            restored.append(job)
+
+        if restored:
+            print(f"♻️  Restored {len(restored)} queued job(s) from {self.store.db_path}")
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        return restored
+
+    def _enqueue(self, job):
+        job.status = 'queued'
+        self.store.save(job)
+        with self._cond:
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._heap, (job.priority, next(self._seq), job.job_id))
+            self._cond.notify()
+
+    def submit(self, job_id, kind, params, priority='normal'):
+        """
+        Queue a job
+
+        Args:
+            job_id: Unique job identifier
+            kind: Registered handler name
+            params: JSON-serializable handler arguments
+            priority: 'high', 'normal' or 'low'
+
+        Returns:
+            Job: The queued job
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'. Available: {', '.join(PRIORITIES)}")
+        if self.is_active(job_id):
+            raise ValueError(f"Job {job_id} is already queued or running")
+
+        job = Job(job_id, kind, params, PRIORITIES[priority])
+        self._enqueue(job)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job
+
+        Queued jobs are dropped immediately; running jobs stop at their next
+        check_cancelled() call.
+
+        Returns:
+            bool: True if the job was found and flagged
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job._cancel.set()
+            was_queued = job.status == 'queued'
+            if was_queued:
+                # Its heap entry is skipped by the workers when popped
+                del self._jobs[job_id]
+                job.status = 'cancelled'
+        if was_queued:
+            self.store.set_status(job_id, 'cancelled')
+        return True
+
+    def is_active(self, job_id):
+        """True while the job is queued or running"""
+        with self._cond:
+            return job_id in self._jobs
+
+    def position(self, job_id):
+        """1-based position in the queue, or None if the job is not waiting"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                return None
+            waiting = sorted(entry for entry in self._heap
+                             if entry[2] in self._jobs and self._jobs[entry[2]].status == 'queued')
+        for index, (_, _, queued_id) in enumerate(waiting):
+            if queued_id == job_id:
+                return index + 1
+        return None
+
+    def stats(self):
+        with self._cond:
+            queued = sum(1 for job in self._jobs.values() if job.status == 'queued')
+            running = sum(1 for job in self._jobs.values() if job.status == 'running')
+        return {'workers': self.workers, 'queued': queued, 'running': running}
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                while self._heap:
+                    _, _, job_id = heapq.heappop(self._heap)
+                    job = self._jobs.get(job_id)
+                    if job is not None and job.status == 'queued':
+                        job.status = 'running'
+                        return job
+                self._cond.wait()
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            self.store.set_status(job.job_id, 'running')
+            status, error = 'completed', None
+            try:
+                self._handlers[job.kind](job)
+            except JobCancelled:
+                status = 'cancelled'
+            except Exception as e:
+                status, error = 'error', f"{type(e).__name__}: {e}"
+                print(f"❌ Job {job.job_id} failed: {error}")
+            finally:
+                with self._cond:
+                    if self._jobs.get(job.job_id) is job:
+                        del self._jobs[job.job_id]
+                    job.status = status
+                self.store.set_status(job.job_id, status, error)
+                JOBS_FINISHED.inc(kind=job.kind, status=status)
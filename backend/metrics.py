@@ -0,0 +1,255 @@
+"""
+Metrics
+Dependency-free counters, gauges and histograms rendered in the Prometheus
+text exposition format, plus the per-stage timing helpers used across the
+detection code
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans a single NMS call up to a slow model batch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        self._function = None
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def set_function(self, function):
+        """
+        Compute the values at scrape time instead
+
+        function returns a number (unlabelled metric) or {label values tuple: number}.
+        """
+        self._function = function
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) tuples for rendering"""
+        if self._function is not None:
+            values = self._function()
+            if not isinstance(values, dict):
+                values = {(): values}
+            return [('', tuple(str(v) for v in key), (), value) for key, value in values.items()]
+        with self._lock:
+            return [('', key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.label_names, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count (name should end in _total)
+
+    Either inc() explicitly or, for a count kept elsewhere, read at scrape
+    time with set_function(fn).
+    """
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down
+
+    Either set() explicitly or computed at scrape time by set_function(fn),
+    where fn returns a number (unlabelled gauge) or {label values tuple: number}.
+    """
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, count=1, **labels):
+        """Record `count` observations of `value`"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += count
+                    break
+            state['sum'] += value * count
+            state['count'] += count
+
+    def drain(self):
+        """
+        Take the observations recorded so far, leaving the histogram empty
+
+        Returns:
+            dict: {label values tuple: {'buckets', 'sum', 'count'}}, picklable,
+                  for merge() in another process
+        """
+        with self._lock:
+            states, self._values = self._values, {}
+        return states
+
+    def merge(self, states):
+        """Add observations taken with drain() (e.g. from a worker process)"""
+        with self._lock:
+            for key, other in states.items():
+                state = self._values.get(key)
+                if state is None:
+                    state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                state['buckets'] = [a + b for a, b in zip(state['buckets'], other['buckets'])]
+                state['sum'] += other['sum']
+                state['count'] += other['count']
+
+    def snapshot(self, **labels):
+        """{'count', 'sum', 'buckets': [(upper bound, cumulative count), ...]} for one label set"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                return {'count': 0, 'sum': 0.0, 'buckets': [(bound, 0) for bound in self.buckets]}
+            cumulative, running = [], 0
+            for bound, count in zip(self.buckets, state['buckets']):
+                running += count
+                cumulative.append((bound, running))
+            return {'count': state['count'], 'sum': state['sum'], 'buckets': cumulative}
+
+    def samples(self):
+        with self._lock:
+            states = [(key, list(state['buckets']), state['sum'], state['count'])
+                      for key, state in self._values.items()]
+        samples = []
+        for key, buckets, total, count in states:
+            running = 0
+            for bound, bucket_count in zip(self.buckets, buckets):
+                running += bucket_count
+                samples.append(('_bucket', key, (('le', _format_value(bound)),), running))
+            samples.append(('_sum', key, (), total))
+            samples.append(('_count', key, (), count))
+        return samples
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together by /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.label_names != tuple(labels):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labels, buckets=buckets)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # A failing scrape-time callback shouldn't take the whole endpoint down
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Time per frame in each stage; batched stages record their batch time split across its frames
+STAGE_SECONDS = REGISTRY.histogram(
+    'skyguard_stage_seconds',
+    'Per-frame latency of each processing stage (decode, preprocess, inference, nms, draw, jpeg, write)',
+    labels=('stage',))
+STREAM_DROPPED_FRAMES = REGISTRY.counter(
+    'skyguard_stream_dropped_frames_total',
+    'Frames dropped from full stream viewer buffers')
+
+
+def observe_stage(stage, seconds, frames=1):
+    """Record `seconds` spent in a stage on `frames` frames"""
+    if frames > 0:
+        STAGE_SECONDS.observe(seconds / frames, count=frames, stage=stage)
+
+
+@contextmanager
+def timed(stage, frames=1):
+    """Time the enclosed block as one run of a stage over `frames` frames"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, frames)
+
+
+def process_memory_bytes():
+    """Resident set size of this process (0 where /proc isn't available)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
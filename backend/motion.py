@@ -0,0 +1,91 @@
+"""
+Motion Gating
+Cheap change detection that lets near-static frames reuse the previous
+frame's detections instead of running the model
+"""
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decide per frame whether the model needs to run
+
+    Each frame is shrunk to a small blurred grayscale thumbnail and compared
+    with the thumbnail of the last frame that went through the model. When
+    the share of changed pixels stays below threshold the frame is skipped,
+    but never more than max_staleness frames in a row.
+
+    Not thread-safe: call check() from one thread (the decoder).
+    """
+
+    def __init__(self, threshold=0.01, max_staleness=30, width=160, pixel_delta=15):
+        """
+        Args:
+            threshold: Fraction of thumbnail pixels that must change to run the model
+            max_staleness: Run the model at least every K frames regardless of motion
+            width: Thumbnail width the comparison runs at
+            pixel_delta: Gray-level difference that counts a pixel as changed
+        """
+        self.threshold = float(threshold)
+        self.max_staleness = max(1, int(max_staleness))
+        self.width = width
+        self.pixel_delta = pixel_delta
+
+        self._reference = None
+        self._since_inference = 0
+
+        self.inferred = 0
+        self.skipped = 0
+        self.forced = 0  # Inferences triggered by max_staleness rather than motion
+        self.last_score = 0.0
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Blur away sensor noise and compression artifacts
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame):
+        """
+        Args:
+            frame: Decoded frame
+
+        Returns:
+            bool: True if the model should run on this frame
+        """
+        thumbnail = self._thumbnail(frame)
+
+        if self._reference is None or thumbnail.shape != self._reference.shape:
+            run = True
+        else:
+            changed = cv2.absdiff(thumbnail, self._reference) > self.pixel_delta
+            self.last_score = float(np.count_nonzero(changed)) / changed.size
+            run = self.last_score >= self.threshold
+            if not run and self._since_inference + 1 >= self.max_staleness:
+                run = True
+                self.forced += 1
+
+        if run:
+            self._reference = thumbnail
+            self._since_inference = 0
+            self.inferred += 1
+        else:
+            self._since_inference += 1
+            self.skipped += 1
+        return run
+
+    def stats(self):
+        total = self.inferred + self.skipped
+        return {
+            'threshold': self.threshold,
+            'max_staleness': self.max_staleness,
+            'inferred': self.inferred,
+            'skipped': self.skipped,
+            'forced': self.forced,
+            'skip_rate': round(self.skipped / total, 3) if total else 0.0
+        }
@@ -0,0 +1,525 @@
+"""
+Staged Video Processing Pipeline
+Overlaps decoding, inference and annotation/encoding of video frames
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+
+from detections import Detections
+from metrics import observe_stage
+from motion import MotionGate
+from tracking import OpticalFlowTracker
+from video_io import FFmpegReader, FFmpegWriter, resolve_video_io
+
+
+_END = object()  # Sentinel marking the end of a stage's output
+
+# Annotated frames buffered ahead of the ffmpeg encoder
+ENCODER_QUEUE = 16
+
+
+class _Failure:
+    """Carries an exception from a worker thread to the consuming thread"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class StageStats:
+    """Thread-safe frame counter and busy-time accumulator for one stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, frames, seconds):
+        with self._lock:
+            self.frames += frames
+            self.busy_seconds += seconds
+
+    def as_dict(self):
+        with self._lock:
+            frames = self.frames
+            busy = self.busy_seconds
+        return {
+            'frames': frames,
+            'busy_seconds': round(busy, 3),
+            'fps': round(frames / busy, 2) if busy > 0 else 0.0
+        }
+
+
+class VideoPipeline:
+    """
+    Run a video through decode -> inference -> annotate/encode stages
+
+    The decoder runs on its own thread, inference runs batched on a second
+    thread, and annotation plus JPEG encoding run on a thread pool. Stages are
+    joined by bounded queues, so OpenCV decode/encode (which release the GIL)
+    overlap with model inference. Results are yielded in frame order.
+
+    With track_every=N the model only sees every Nth frame (sooner when
+    tracks are lost) and OpticalFlowTracker fills in the frames between, so
+    every frame is still annotated and written.
+
+    With motion_threshold set, the decoder runs a MotionGate over each frame
+    and near-static frames reuse the previous detections instead of going
+    through the model.
+
+    With video_io='ffmpeg' frames are decoded by an ffmpeg subprocess into a
+    fixed pool of reused buffers and the output is encoded to H.264 by a
+    second one, fed from its own thread; 'opencv' uses cv2.VideoCapture and
+    an mp4v cv2.VideoWriter.
+    """
+
+    def __init__(self, detector, video_path, output_path=None, frame_skip=1,
+                 batch_size=None, annotate_workers=None, encode_quality=None, track_every=None,
+                 motion_threshold=None, max_staleness=30, start_frame=0, end_frame=None, video_io='opencv',
+                 input_stream=None):
+        """
+        Args:
+            detector: ObjectDetector used for inference and drawing
+            video_path: Path to input video
+            output_path: Path to save output video (optional)
+            frame_skip: Process every nth frame for speed
+            batch_size: Number of frames sent to the model per call
+                        (defaults to detector.batch_size)
+            annotate_workers: Threads used for drawing and encoding
+            encode_quality: JPEG quality for result['jpeg'] (None disables encoding)
+            track_every: Run the model on every Nth frame and track in between
+                         (None disables tracking; frame_skip is ignored when set)
+            motion_threshold: Fraction of changed pixels below which a frame reuses
+                              the previous detections (None disables motion gating)
+            max_staleness: With motion gating, run the model at least every K frames
+            start_frame: First frame (0-based) to process; frame numbers stay
+                         relative to the whole video (see segments.py)
+            end_frame: Stop before this frame (None = end of video)
+            video_io: 'opencv', 'ffmpeg' or 'auto' (ffmpeg when it is on PATH)
+            input_stream: Iterator of the video's bytes for a file that is still
+                          being written (see ingest.StreamingDownload); frames are
+                          decoded from it while video_path is only probed for
+                          metadata. Needs the ffmpeg backend.
+        """
+        self.detector = detector
+        self.video_path = video_path
+        self.output_path = output_path
+        self.frame_skip = max(1, int(frame_skip or 1))
+        self.track_every = max(1, int(track_every)) if track_every else None
+        if self.track_every and self.frame_skip > 1:
+            print(f"Tracking mode writes every frame; ignoring frame_skip={self.frame_skip}")
+            self.frame_skip = 1
+        self.batch_size = max(1, int(batch_size or detector.batch_size))
+        self.annotate_workers = annotate_workers or min(4, os.cpu_count() or 1)
+        self.encode_quality = encode_quality
+        self.start_frame = max(0, int(start_frame or 0))
+        self.end_frame = end_frame
+        self.video_io = resolve_video_io(video_io)
+        self.input_stream = input_stream
+        if input_stream is not None and self.video_io != 'ffmpeg':
+            raise ValueError("input_stream needs video_io='ffmpeg'")
+
+        # Detectors backed by several model replicas can take more than one batch at once
+        self.concurrency = max(1, int(getattr(detector, 'concurrency', 1)))
+
+        # Bounded queues keep memory flat when one stage is slower than the rest
+        self.decoded_queue = queue.Queue(maxsize=self.batch_size * (self.concurrency + 1))
+        self.annotate_queue = queue.Queue(maxsize=self.batch_size + self.annotate_workers * 2)
+
+        self.fps = 0
+        self.total_frames = 0
+        self.started_at = None
+        self.finished_at = None
+        self.stages = {name: StageStats(name)
+                       for name in ('decode', 'inference', 'track', 'annotate', 'encode', 'write')}
+
+        # Tracking mode counters
+        self.tracker = OpticalFlowTracker(detector.class_names) if self.track_every else None
+        self.keyframes = 0
+        self.redetections = 0  # Keyframes brought forward because tracks were lost
+
+        # Motion gating; tracking already keeps the model off most frames
+        self.motion_gate = None
+        if motion_threshold is not None:
+            if self.track_every:
+                print("Motion gating is not used in tracking mode; ignoring motion_threshold")
+            else:
+                self.motion_gate = MotionGate(motion_threshold, max_staleness)
+        self._last_detections = None  # Reused for frames the motion gate skips
+        self._reader = None  # FFmpegReader whose buffers are recycled once a frame is done
+
+        self._stop = threading.Event()
+
+    def stats(self):
+        """Per-stage throughput and queue depths for this run"""
+        end = self.finished_at or time.perf_counter()
+        wall = end - self.started_at if self.started_at else 0.0
+        written = self.stages['write'].frames
+        stats = {
+            'wall_seconds': round(wall, 3),
+            'fps': round(written / wall, 2) if wall > 0 else 0.0,
+            'batch_size': self.batch_size,
+            'annotate_workers': self.annotate_workers,
+            'concurrency': self.concurrency,
+            'video_io': self.video_io,
+            'stages': {name: stage.as_dict() for name, stage in self.stages.items()},
+            'queues': {
+                'decoded': self.decoded_queue.qsize(),
+                'annotate': self.annotate_queue.qsize()
+            }
+        }
+        if self.tracker is not None:
+            stats['tracking'] = {
+                'track_every': self.track_every,
+                'keyframes': self.keyframes,
+                'redetections': self.redetections,
+                'tracked_frames': self.stages['track'].frames - self.keyframes,
+                'active_tracks': self.tracker.active_tracks
+            }
+        if self.motion_gate is not None:
+            stats['motion_gate'] = self.motion_gate.stats()
+        return stats
+
+    def _put(self, q, item):
+        """Blocking put that gives up once the pipeline is stopping"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """Blocking get that gives up once the pipeline is stopping"""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _recycle(self, frame):
+        """Hand a finished frame's buffer back to the ffmpeg reader's pool"""
+        if self._reader is not None:
+            self._reader.recycle(frame)
+
+    def _decode_loop(self, cap):
+        """Decoder thread: read frames and hand the kept ones to inference"""
+        try:
+            # The ffmpeg reader drops skipped frames itself and only returns every step-th one
+            step = getattr(cap, 'frame_step', 1)
+            frame_count = self.start_frame // step * step
+            while not self._stop.is_set() and (self.end_frame is None or frame_count + step - 1 < self.end_frame):
+                start = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                frame_count += step
+
+                # Skip frames for performance
+                if frame_count % self.frame_skip != 0:
+                    self._recycle(frame)
+                    continue
+
+                # Cheap change check here, off the inference thread
+                run_model = self.motion_gate.check(frame) if self.motion_gate is not None else True
+
+                elapsed = time.perf_counter() - start
+                self.stages['decode'].add(1, elapsed)
+                observe_stage('decode', elapsed)
+                if not self._put(self.decoded_queue, (frame_count, frame, run_model)):
+                    break
+            self._put(self.decoded_queue, _END)
+        except Exception as e:
+            self._put(self.decoded_queue, _Failure(e))
+        finally:
+            cap.release()
+
+    def _frames(self):
+        """Decoded (frame_number, frame, run_model) items until end of stream"""
+        while not self._stop.is_set():
+            item = self._get(self.decoded_queue)
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+
+    def _batches(self):
+        """Group decoded frames into batches, stopping early at end of stream"""
+        batch = []
+        for item in self._frames():
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch and not self._stop.is_set():
+            yield batch
+
+    def _infer(self, batch):
+        """Run the model on the batch's gated-in frames; frames it skips map to None"""
+        frames = [frame for _, frame, run_model in batch if run_model]
+        if not frames:
+            return [None] * len(batch)
+
+        start = time.perf_counter()
+        results = self.detector.detect_batch(frames, annotate=False)
+        self.stages['inference'].add(len(frames), time.perf_counter() - start)
+
+        if results is None:
+            return None
+        results = iter(results)
+        return [next(results) if run_model else None for _, _, run_model in batch]
+
+    def _reuse(self, frame):
+        """Result for a near-static frame: the last inferred detections on the new frame"""
+        detections = self._last_detections
+        if detections is None:
+            detections = Detections.empty(self.detector.class_names)
+        return {
+            'detections': detections,
+            'frame': frame,
+            'count': len(detections),
+            'timestamp': datetime.now().isoformat(),
+            'reused': True
+        }
+
+    def _dispatch(self, pool, batch, results):
+        """Fan one batch's results out to the annotation pool, in frame order"""
+        if not results:
+            # Failed batch: its frames are dropped, but ffmpeg reader buffers must go back to the pool
+            for _, frame, _ in batch:
+                self._recycle(frame)
+            return True
+        for (frame_number, frame, _), result in zip(batch, results):
+            # Runs in frame order, so the last inferred frame is always the one before
+            if result is None:
+                result = self._reuse(frame)
+            else:
+                self._last_detections = result['detections']
+            result['frame_number'] = frame_number
+            future = pool.submit(self._annotate, result)
+            if not self._put(self.annotate_queue, future):
+                return False
+        return True
+
+    def _inference_loop(self, pool):
+        """
+        Inference thread: batch decoded frames and fan out annotation jobs
+
+        Detectors backed by several model replicas advertise a concurrency
+        above 1; that many batches are then kept in flight at once.
+        """
+        if self.tracker is not None:
+            return self._tracking_loop(pool)
+
+        concurrency = self.concurrency
+        infer_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='infer') if concurrency > 1 else None
+        in_flight = deque()  # (batch, future), oldest first
+        try:
+            for batch in self._batches():
+                if infer_pool is None:
+                    if not self._dispatch(pool, batch, self._infer(batch)):
+                        return
+                    continue
+
+                in_flight.append((batch, infer_pool.submit(self._infer, batch)))
+                if len(in_flight) >= concurrency:
+                    done_batch, future = in_flight.popleft()
+                    if not self._dispatch(pool, done_batch, future.result()):
+                        return
+
+            while in_flight:
+                done_batch, future = in_flight.popleft()
+                if not self._dispatch(pool, done_batch, future.result()):
+                    return
+            self._put(self.annotate_queue, _END)
+        except Exception as e:
+            self._put(self.annotate_queue, _Failure(e))
+        finally:
+            if infer_pool is not None:
+                infer_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _tracking_loop(self, pool):
+        """
+        Inference thread in tracking mode
+
+        Frames are handled one at a time because whether a frame is a
+        keyframe depends on how tracking went on the frame before it.
+        """
+        since_keyframe = None
+        try:
+            for frame_number, frame, _ in self._frames():
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+                # Re-detect early when optical flow lost a track
+                lost = since_keyframe is not None and self.tracker.lost_since_keyframe > 0
+                if since_keyframe is None or since_keyframe + 1 >= self.track_every or lost:
+                    results = self._infer([(frame_number, frame, True)])
+                    if not results:
+                        self._recycle(frame)
+                        continue
+                    result = results[0]
+
+                    start = time.perf_counter()
+                    result['detections'] = self.tracker.update(gray, result['detections'])
+                    self.stages['track'].add(1, time.perf_counter() - start)
+
+                    result['keyframe'] = True
+                    since_keyframe = 0
+                    self.keyframes += 1
+                    if lost:
+                        self.redetections += 1
+                else:
+                    start = time.perf_counter()
+                    detections = self.tracker.propagate(gray)
+                    self.stages['track'].add(1, time.perf_counter() - start)
+
+                    result = {
+                        'detections': detections,
+                        'frame': frame,
+                        'count': len(detections),
+                        'timestamp': datetime.now().isoformat(),
+                        'keyframe': False
+                    }
+                    since_keyframe += 1
+
+                if not self._dispatch(pool, [(frame_number, frame, True)], [result]):
+                    return
+            self._put(self.annotate_queue, _END)
+        except Exception as e:
+            self._put(self.annotate_queue, _Failure(e))
+
+    def _annotate(self, result):
+        """Pool worker: draw detections and optionally JPEG-encode the frame"""
+        start = time.perf_counter()
+        # The decoded frame is owned by the pipeline, so draw straight into it
+        frame = result['frame']
+        result['frame'] = self.detector.draw_detections(frame, result['detections'], out=frame)
+        self.stages['annotate'].add(1, time.perf_counter() - start)
+
+        if self.encode_quality is not None:
+            start = time.perf_counter()
+            result['jpeg'] = self.detector.frame_to_jpeg(result['frame'], quality=self.encode_quality)
+            self.stages['encode'].add(1, time.perf_counter() - start)
+
+        frame_number = result['frame_number']
+        result['total_frames'] = self.total_frames
+        span = self.total_frames - self.start_frame
+        result['progress'] = ((frame_number - self.start_frame) / span) * 100 if span > 0 else 0
+        return result
+
+    def run(self):
+        """
+        Process the video
+
+        Yields:
+            Detection results for each processed frame, in frame order. With
+            video_io='ffmpeg', result['frame'] is a pooled buffer that is only
+            valid until the next result is requested; copy it to keep it.
+        """
+        cap = cv2.VideoCapture(self.video_path)
+
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open video: {self.video_path}")
+
+        # Get video properties
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = int(source_fps)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if self.end_frame is not None:
+            self.total_frames = min(self.total_frames, self.end_frame) if self.total_frames > 0 else self.end_frame
+        if self.video_io == 'ffmpeg':
+            cap.release()
+            # Every frame between decode and write holds a buffer: both queues, the
+            # batches in flight, the encoder's queue and the frame being yielded
+            buffers = (self.decoded_queue.maxsize + self.annotate_queue.maxsize
+                       + self.batch_size * self.concurrency + self.annotate_workers + ENCODER_QUEUE + 2)
+            cap = self._reader = FFmpegReader(self.video_path, width, height, source_fps or 30.0,
+                                              start_frame=self.start_frame, frame_step=self.frame_skip,
+                                              buffers=buffers, input_stream=self.input_stream)
+        elif self.start_frame:
+            # Seeks to the preceding keyframe and decodes forward to the exact frame
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+
+        # Initialize video writer if output path provided
+        writer = None
+        if self.output_path:
+            # Only every frame_skip-th frame is written, so lower the output FPS
+            # to match and keep the original playback duration
+            output_fps = source_fps / self.frame_skip
+            if self.video_io == 'ffmpeg':
+                writer = FFmpegWriter(self.output_path, width, height, output_fps, queue_size=ENCODER_QUEUE,
+                                      on_written=self._reader.recycle)
+            else:
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                writer = cv2.VideoWriter(self.output_path, fourcc, output_fps, (width, height))
+            print(f"Output video FPS: {output_fps:.2f} (original: {source_fps:.2f}, frame_skip: {self.frame_skip})")
+
+        mode = f", track_every={self.track_every}" if self.track_every else ""
+        print(f"Pipeline: batch_size={self.batch_size}, annotate_workers={self.annotate_workers}, "
+              f"video_io={self.video_io}{mode}")
+
+        self.started_at = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=self.annotate_workers, thread_name_prefix='annotate')
+        decoder = threading.Thread(target=self._decode_loop, args=(cap,), daemon=True)
+        inference = threading.Thread(target=self._inference_loop, args=(pool,), daemon=True)
+        decoder.start()
+        inference.start()
+
+        try:
+            while True:
+                item = self._get(self.annotate_queue)
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+
+                result = item.result()
+
+                if self._reader is not None:
+                    # The buffer is reused once written, so the caller sees the frame
+                    # first and the encoder thread gets it afterwards
+                    yield result
+                    start = time.perf_counter()
+                    if writer:
+                        writer.write(result['frame'])
+                    else:
+                        self._recycle(result['frame'])
+                    self.stages['write'].add(1, time.perf_counter() - start)
+                    continue
+
+                # Write annotated frame
+                if writer:
+                    start = time.perf_counter()
+                    writer.write(result['frame'])
+                    elapsed = time.perf_counter() - start
+                    self.stages['write'].add(1, elapsed)
+                    observe_stage('write', elapsed)
+                else:
+                    self.stages['write'].add(1, 0.0)
+
+                yield result
+
+            if self._reader is not None and self._reader.stream_error is not None:
+                raise self._reader.stream_error
+        finally:
+            self._stop.set()
+            self.finished_at = time.perf_counter()
+            inference.join(timeout=5)
+            decoder.join(timeout=5)
+            pool.shutdown(wait=True, cancel_futures=True)
+            if writer:
+                writer.release()
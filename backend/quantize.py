@@ -0,0 +1,381 @@
+"""
+INT8 Post-Training Quantization
+Calibrates a static INT8 ONNX model from sample frames and compares it
+against FP32 on the same clip
+
+Usage:
+    python quantize.py calibrate --frames calibration_frames/
+    python quantize.py compare --video clip.mp4 --output report.json
+
+The calibrated model is cached next to the checkpoint (see
+backends.quantized_path) and selected with ObjectDetector(backend='onnx',
+precision='int8') or SKYGUARD_BACKEND=onnx SKYGUARD_PRECISION=int8.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backends import export_model, file_lock, preprocess, quantized_path
+from detect import ObjectDetector, INFERENCE_PROFILES
+from detections import box_iou
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
+
+# Calibration methods exposed on the command line
+CALIBRATION_METHODS = ('minmax', 'entropy', 'percentile')
+
+# IoU thresholds for mAP50-95
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def load_calibration_frames(folder, max_frames=200):
+    """
+    Read sample frames for calibration
+
+    Args:
+        folder: Directory of images representative of deployment footage
+        max_frames: Frames to use at most, sampled evenly across the folder
+
+    Returns:
+        list: BGR frames
+    """
+    paths = sorted(p for p in Path(folder).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not paths:
+        raise ValueError(f"No images found in {folder}")
+    if len(paths) > max_frames:
+        paths = [paths[i] for i in np.linspace(0, len(paths) - 1, max_frames).astype(int)]
+
+    frames = []
+    for path in paths:
+        frame = cv2.imread(str(path))
+        if frame is None:
+            print(f"⚠️  Skipping unreadable image {path}")
+            continue
+        frames.append(frame)
+    return frames
+
+
+def _head_decode_nodes(model):
+    """
+    Nodes of the Detect head that decode boxes and scores (DFL, anchors,
+    sigmoid, concat). They stay in FP32: quantizing them costs box precision
+    for almost no speed.
+    """
+    output_names = {output.name for output in model.graph.output}
+    producers = [node for node in model.graph.node if set(node.output) & output_names]
+    if not producers:
+        return []
+
+    # e.g. '/model.23/' for YOLO11
+    head_prefix = '/'.join(producers[0].name.split('/')[:2]) + '/'
+    return [node.name for node in model.graph.node
+            if node.name.startswith(head_prefix)
+            and not node.name.startswith((head_prefix + 'cv2', head_prefix + 'cv3'))]
+
+
+def calibrate(model_path, frames_dir, imgsz=640, max_frames=200, method='minmax'):
+    """
+    Produce the INT8 model for a checkpoint
+
+    Weights are quantized per channel (QInt8) and activations per tensor
+    (QUInt8) from ranges observed on the calibration frames.
+
+    Args:
+        model_path: Path to the .pt checkpoint
+        frames_dir: Folder of calibration images
+        imgsz: Inference size the frames are letterboxed to
+        max_frames: Calibration frames to use at most
+        method: One of CALIBRATION_METHODS
+
+    Returns:
+        str: Path to the INT8 ONNX model
+    """
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                          QuantType, quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if method not in CALIBRATION_METHODS:
+        raise ValueError(f"Unknown calibration method '{method}'. Available: {', '.join(CALIBRATION_METHODS)}")
+
+    frames = load_calibration_frames(frames_dir, max_frames)
+    fp32_path = export_model(model_path, 'onnx', imgsz=imgsz)
+    target = quantized_path(model_path)
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self._frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self._frames, None)
+            if frame is None:
+                return None
+            blob, _ = preprocess([frame], imgsz)
+            return {'images': blob}
+
+    print(f"Calibrating INT8 model on {len(frames)} frame(s) from {frames_dir} ({method})...")
+    started = time.perf_counter()
+
+    with file_lock(f"{target}.lock"), tempfile.TemporaryDirectory() as tmp:
+        # Fold constants and infer shapes first; quantization works best on the optimized graph
+        prepared = os.path.join(tmp, 'prepared.onnx')
+        quant_pre_process(fp32_path, prepared, skip_symbolic_shape=True)
+
+        excluded = _head_decode_nodes(onnx.load(prepared))
+        output = os.path.join(tmp, 'int8.onnx')
+        quantize_static(
+            prepared,
+            output,
+            FrameReader(),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method={'minmax': CalibrationMethod.MinMax,
+                              'entropy': CalibrationMethod.Entropy,
+                              'percentile': CalibrationMethod.Percentile}[method],
+            nodes_to_exclude=excluded
+        )
+
+        # Keep the class names/stride metadata OnnxRuntimeBackend reads
+        quantized = onnx.load(output)
+        del quantized.metadata_props[:]
+        quantized.metadata_props.extend(onnx.load(fp32_path, load_external_data=False).metadata_props)
+        onnx.save(quantized, output)
+        os.replace(output, target)
+
+    print(f"✅ INT8 model saved to {target} in {time.perf_counter() - started:.1f}s "
+          f"({os.path.getsize(fp32_path) / 1e6:.1f} MB -> {os.path.getsize(target) / 1e6:.1f} MB)")
+    return str(target)
+
+
+def _match(predictions, references, iou_threshold):
+    """
+    Greedily match predictions (highest confidence first) to reference boxes
+
+    Returns:
+        numpy.ndarray: True-positive flag per prediction, in the input order
+    """
+    true_positive = np.zeros(len(predictions.xyxy), dtype=bool)
+    if len(predictions.xyxy) == 0 or len(references.xyxy) == 0:
+        return true_positive
+
+    ious = box_iou(predictions.xyxy, references.xyxy)
+    ious[predictions.class_id[:, None] != references.class_id[None, :]] = 0.0
+    taken = np.zeros(len(references.xyxy), dtype=bool)
+
+    for index in np.argsort(-predictions.confidence, kind='stable'):
+        candidates = np.where(~taken & (ious[index] >= iou_threshold))[0]
+        if len(candidates):
+            best = candidates[ious[index, candidates].argmax()]
+            taken[best] = True
+            true_positive[index] = True
+    return true_positive
+
+
+def average_precision(true_positive, confidence, num_references):
+    """COCO-style 101-point interpolated AP"""
+    if num_references == 0:
+        return None
+    if len(true_positive) == 0:
+        return 0.0
+
+    order = np.argsort(-confidence, kind='stable')
+    tp = np.cumsum(true_positive[order])
+    fp = np.cumsum(~true_positive[order])
+    recall = tp / num_references
+    precision = tp / (tp + fp)
+
+    # Monotonically decreasing precision envelope
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    points = np.linspace(0, 1, 101)
+    indices = np.searchsorted(recall, points, side='left')
+    sampled = np.where(indices < len(precision), precision[np.minimum(indices, len(precision) - 1)], 0.0)
+    return float(sampled.mean())
+
+
+def evaluate(predictions, references, class_names):
+    """
+    Per-class agreement of predictions with reference detections
+
+    Args:
+        predictions: Detections per frame from the candidate model
+        references: Detections per frame treated as ground truth
+        class_names: class_id -> name
+
+    Returns:
+        dict: class name -> metrics
+    """
+    metrics = {}
+    for class_id, name in class_names.items():
+        num_references = 0
+        num_predictions = 0
+        confidences = []
+        matches = {threshold: [] for threshold in IOU_THRESHOLDS}
+
+        for predicted, reference in zip(predictions, references):
+            predicted = predicted.filter(predicted.class_id == class_id)
+            reference = reference.filter(reference.class_id == class_id)
+            num_references += len(reference)
+            num_predictions += len(predicted)
+            confidences.append(predicted.confidence)
+            for threshold in IOU_THRESHOLDS:
+                matches[threshold].append(_match(predicted, reference, threshold))
+
+        confidence = np.concatenate(confidences) if confidences else np.zeros(0)
+        true_positives = int(np.concatenate(matches[IOU_THRESHOLDS[0]]).sum()) if num_predictions else 0
+
+        # Metrics are None for classes with nothing to measure against
+        metrics[name] = {
+            'reference_boxes': num_references,
+            'predicted_boxes': num_predictions,
+            'ap50': None,
+            'ap50_95': None,
+            'recall': true_positives / num_references if num_references else None,
+            'precision': true_positives / num_predictions if num_predictions else None
+        }
+        if num_references:
+            per_threshold = [average_precision(np.concatenate(matches[t]), confidence, num_references)
+                             for t in IOU_THRESHOLDS]
+            metrics[name]['ap50'] = per_threshold[0]
+            metrics[name]['ap50_95'] = float(np.mean(per_threshold))
+    return metrics
+
+
+def _read_clip(video_path, max_frames, frame_skip):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    frames = []
+    index = 0
+    try:
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % frame_skip == 0:
+                frames.append(frame)
+            index += 1
+    finally:
+        cap.release()
+    return frames
+
+
+def _timed_inference(detector, frames, batch_size):
+    """Run the clip through a detector; returns (Detections per frame, seconds)"""
+    results = []
+    started = time.perf_counter()
+    for start in range(0, len(frames), batch_size):
+        results.extend(detector.infer_batch(frames[start:start + batch_size]))
+    return results, time.perf_counter() - started
+
+
+def compare(model_path, video_path, profile='balanced', max_frames=300, frame_skip=1, batch_size=8,
+            threads=None, conf_threshold=None):
+    """
+    Run FP32 and INT8 ONNX models over the same clip
+
+    FP32 detections are the reference, so each metric is the INT8 model's
+    agreement with FP32 and its delta is the accuracy lost by quantizing
+    (FP32 scores 1.0 against itself).
+
+    Returns:
+        dict: Report with per-class metrics/deltas, mAP and speedup
+    """
+    frames = _read_clip(video_path, max_frames, frame_skip)
+    if not frames:
+        raise ValueError(f"No frames read from {video_path}")
+
+    fp32 = ObjectDetector(model_path, conf_threshold, profile, backend='onnx', threads=threads, precision='fp32')
+    int8 = ObjectDetector(model_path, conf_threshold, profile, backend='onnx', threads=threads, precision='int8')
+
+    print(f"Comparing FP32 and INT8 on {len(frames)} frame(s) of {video_path}...")
+    references, fp32_seconds = _timed_inference(fp32, frames, batch_size)
+    predictions, int8_seconds = _timed_inference(int8, frames, batch_size)
+
+    classes = evaluate(predictions, references, fp32.class_names)
+    for metrics in classes.values():
+        metrics['ap50_delta'] = metrics['ap50'] - 1.0 if metrics['ap50'] is not None else None
+        metrics['recall_delta'] = metrics['recall'] - 1.0 if metrics['recall'] is not None else None
+
+    scored = [metrics for metrics in classes.values() if metrics['reference_boxes']]
+    return {
+        'video': video_path,
+        'frames': len(frames),
+        'profile': profile,
+        'settings': {'imgsz': fp32.imgsz, 'conf_threshold': fp32.conf_threshold, 'iou_threshold': fp32.iou_threshold},
+        'models': {
+            'fp32': {'path': fp32.model.path, 'mb': round(os.path.getsize(fp32.model.path) / 1e6, 2)},
+            'int8': {'path': int8.model.path, 'mb': round(os.path.getsize(int8.model.path) / 1e6, 2)}
+        },
+        'fp32_fps': len(frames) / fp32_seconds,
+        'int8_fps': len(frames) / int8_seconds,
+        'speedup': fp32_seconds / int8_seconds,
+        'map50': float(np.mean([m['ap50'] for m in scored])) if scored else None,
+        'map50_95': float(np.mean([m['ap50_95'] for m in scored])) if scored else None,
+        'classes': classes
+    }
+
+
+def _fmt(value, spec):
+    return '-' if value is None else format(value, spec)
+
+
+def print_report(report):
+    print(f"\n{'='*60}")
+    print(f"INT8 vs FP32 on {report['frames']} frame(s), profile '{report['profile']}'")
+    print(f"{'='*60}")
+    print(f"{'class':<10} {'ref':>6} {'int8':>6} {'AP50':>7} {'AP50-95':>8} {'recall':>7} {'ΔAP50':>7} {'Δrecall':>8}")
+    for name, m in report['classes'].items():
+        print(f"{name:<10} {m['reference_boxes']:>6} {m['predicted_boxes']:>6} {_fmt(m['ap50'], '>7.3f')} "
+              f"{_fmt(m['ap50_95'], '>8.3f')} {_fmt(m['recall'], '>7.3f')} "
+              f"{_fmt(m['ap50_delta'], '>+7.3f')} {_fmt(m['recall_delta'], '>+8.3f')}")
+    print(f"\nmAP50 {_fmt(report['map50'], '.3f')}  mAP50-95 {_fmt(report['map50_95'], '.3f')}")
+    print(f"FP32 {report['fp32_fps']:.1f} fps, INT8 {report['int8_fps']:.1f} fps -> {report['speedup']:.2f}x speedup")
+    print(f"Model size {report['models']['fp32']['mb']} MB -> {report['models']['int8']['mb']} MB\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='INT8 quantization for the SkyGuard detector')
+    parser.add_argument('--model', default='models/yolo11s.pt', help='Path to the .pt checkpoint')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    calibrate_parser = commands.add_parser('calibrate', help='Build the INT8 model from sample frames')
+    calibrate_parser.add_argument('--frames', required=True, help='Folder of calibration images')
+    calibrate_parser.add_argument('--imgsz', type=int, default=640)
+    calibrate_parser.add_argument('--max-frames', type=int, default=200)
+    calibrate_parser.add_argument('--method', choices=CALIBRATION_METHODS, default='minmax')
+
+    compare_parser = commands.add_parser('compare', help='Accuracy/speed report of INT8 against FP32')
+    compare_parser.add_argument('--video', required=True, help='Clip both precisions are run on')
+    compare_parser.add_argument('--profile', choices=list(INFERENCE_PROFILES), default='balanced')
+    compare_parser.add_argument('--max-frames', type=int, default=300)
+    compare_parser.add_argument('--frame-skip', type=int, default=1)
+    compare_parser.add_argument('--batch-size', type=int, default=8)
+    compare_parser.add_argument('--threads', type=int, default=None, help='ONNX Runtime intra-op threads')
+    compare_parser.add_argument('--conf', type=float, default=None, help="Override the profile's confidence threshold")
+    compare_parser.add_argument('--output', help='Also write the report as JSON')
+
+    args = parser.parse_args()
+
+    if args.command == 'calibrate':
+        calibrate(args.model, args.frames, args.imgsz, args.max_frames, args.method)
+    else:
+        report = compare(args.model, args.video, args.profile, args.max_frames, args.frame_skip,
+                         args.batch_size, args.threads, args.conf)
+        print_report(report)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
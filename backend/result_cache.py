@@ -0,0 +1,225 @@
+"""
+Result Cache
+Content-addressed store of finished detection results: the same file (or
+URL) run with the same model and settings is answered without inference
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from backends import file_hash
+
+# Memoized content hashes: path -> (size, mtime_ns, sha256)
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+
+def content_hash(path):
+    """SHA-256 of a file, memoized until the file changes"""
+    stat = os.stat(path)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    digest = file_hash(path, length=64)
+    remember_hash(path, digest)
+    return digest
+
+
+def remember_hash(path, digest):
+    """Record a hash computed elsewhere (e.g. while the upload was written)"""
+    stat = os.stat(path)
+    with _hashes_lock:
+        _hashes[path] = (stat.st_size, stat.st_mtime_ns, digest)
+
+
+def cache_key(*parts):
+    """Stable key from JSON-serializable parts (content hash, model hash, settings, ...)"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Detection results keyed by cache_key(), with size-based LRU eviction
+
+    Each entry is the JSON payload (detections, summary, ...) plus the
+    annotated output file. The output is hard-linked into the cache where
+    possible, so a cached result costs no extra disk while the original
+    output still exists and survives it being cleaned up. Index and
+    counters live in SQLite next to the job database.
+    """
+
+    def __init__(self, directory, max_bytes, max_age_seconds=None, json_default=str):
+        """
+        Args:
+            directory: Folder holding cached payloads and outputs
+            max_bytes: Total size above which least recently used entries are evicted
+            max_age_seconds: Entries unused for longer are removed by cleanup()
+            json_default: json.dump default= hook for payload objects (e.g. Detections)
+        """
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.max_age_seconds = max_age_seconds
+        self.json_default = json_default
+        os.makedirs(directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    artifact TEXT,
+                    bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+
+    def _payload_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """
+        Look up a result and mark it as recently used
+
+        Returns:
+            dict: {'kind', 'payload', 'artifact'} or None on a miss
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT kind, artifact FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                kind, artifact = row
+                artifact_path = os.path.join(self.directory, artifact) if artifact else None
+                try:
+                    with open(self._payload_path(key)) as f:
+                        payload = json.load(f)
+                    if artifact_path is not None and not os.path.exists(artifact_path):
+                        raise FileNotFoundError(artifact_path)
+                except (OSError, ValueError):
+                    # Files removed behind our back: drop the entry
+                    self._remove(key, artifact)
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            with self._conn:
+                self._conn.execute("UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                                   (time.time(), key))
+        return {'kind': kind, 'payload': payload, 'artifact': artifact_path}
+
+    def put(self, key, kind, payload, artifact_path=None):
+        """
+        Store a result, evicting least recently used entries if over max_bytes
+
+        Args:
+            key: cache_key() of the inputs
+            kind: 'image', 'video' or 'url'
+            payload: JSON-serializable result
+            artifact_path: Annotated output file to keep with it (optional)
+        """
+        artifact = None
+        if artifact_path is not None:
+            artifact = f"{key}{os.path.splitext(artifact_path)[1]}"
+            stored = os.path.join(self.directory, artifact)
+            if os.path.exists(stored):
+                os.remove(stored)
+            try:
+                os.link(artifact_path, stored)
+            except OSError:
+                shutil.copy2(artifact_path, stored)
+
+        payload_path = self._payload_path(key)
+        with open(payload_path, 'w') as f:
+            json.dump(payload, f, default=self.json_default)
+
+        size = os.path.getsize(payload_path)
+        if artifact is not None:
+            size += os.path.getsize(os.path.join(self.directory, artifact))
+
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, kind, artifact, bytes, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (key, kind, artifact, size, now, now))
+            self._evict_to(self.max_bytes, keep=key)
+
+    def restore(self, entry, output_path):
+        """Put a cached artifact back at output_path (e.g. after cleanup removed it)"""
+        artifact = entry['artifact']
+        if artifact is None:
+            return
+        if os.path.exists(output_path):
+            if os.path.samefile(artifact, output_path):
+                return
+            os.remove(output_path)
+        try:
+            os.link(artifact, output_path)
+        except OSError:
+            shutil.copy2(artifact, output_path)
+
+    def cleanup(self, max_age_seconds=None):
+        """Remove entries unused for max_age_seconds (defaults to the cache's own limit)"""
+        max_age_seconds = max_age_seconds or self.max_age_seconds
+        if not max_age_seconds:
+            return 0
+        with self._lock:
+            rows = self._conn.execute("SELECT key, artifact FROM entries WHERE last_used < ?",
+                                      (time.time() - max_age_seconds,)).fetchall()
+            for key, artifact in rows:
+                self._remove(key, artifact)
+            self.evictions += len(rows)
+        return len(rows)
+
+    def _evict_to(self, max_bytes, keep=None):
+        """Drop least recently used entries until the total fits (caller holds the lock)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+        if total <= max_bytes:
+            return
+        for key, artifact, size in self._conn.execute(
+                "SELECT key, artifact, bytes FROM entries ORDER BY last_used").fetchall():
+            if total <= max_bytes:
+                break
+            if key == keep:
+                continue
+            self._remove(key, artifact)
+            self.evictions += 1
+            total -= size
+
+    def _remove(self, key, artifact):
+        for path in (self._payload_path(key), os.path.join(self.directory, artifact) if artifact else None):
+            if path is not None:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        with self._conn:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,329 @@
+"""
+Parallel Segment Processing
+Splits long videos into time segments, runs each on its own worker process
+(with its own detector) and joins the annotated parts back together
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from detection_store import DetectionWriter, concat_stores
+from jobs import JobCancelled
+from metrics import STAGE_SECONDS
+
+# Frame summaries kept per segment for the merged summary (matches the live job view)
+RECENT_FRAMES = 100
+PREVIEW_QUALITY = 60  # JPEG quality of the sampled frames sent back for the live view
+
+# Worker-process state, set up once per process by _init_worker
+_worker = {}
+
+
+def keyframe_indices(video_path, fps):
+    """
+    Frame indices of the video's keyframes, or None without ffprobe
+
+    Segments cut at keyframes seek without decoding frames they don't own.
+    """
+    if shutil.which('ffprobe') is None:
+        return None
+    try:
+        output = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+             '-show_entries', 'frame=pts_time', '-of', 'csv=p=0', video_path],
+            capture_output=True, text=True, timeout=120, check=True).stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+    indices = set()
+    for line in output.splitlines():
+        line = line.strip().rstrip(',')
+        if line and line != 'N/A':
+            indices.add(int(round(float(line) * fps)))
+    return sorted(indices)
+
+
+def plan_segments(video_path, segments, min_segment_seconds=30):
+    """
+    Split a video into contiguous frame ranges
+
+    Boundaries are spread evenly and snapped to the nearest keyframe when
+    ffprobe is available; OpenCV's frame-accurate seek is used otherwise.
+
+    Args:
+        video_path: Input video
+        segments: Number of segments wanted
+        min_segment_seconds: Shortest segment worth a separate worker
+
+    Returns:
+        list: (start_frame, end_frame) ranges covering the video
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+
+    if total_frames <= 0:
+        raise ValueError(f"Cannot determine frame count of {video_path}")
+
+    segments = max(1, min(int(segments), int(total_frames / (fps * min_segment_seconds)) or 1))
+    boundaries = [round(total_frames * i / segments) for i in range(1, segments)]
+
+    keyframes = keyframe_indices(video_path, fps) if segments > 1 else None
+    if keyframes:
+        snapped = []
+        for boundary in boundaries:
+            nearest = min(keyframes, key=lambda k: abs(k - boundary))
+            if 0 < nearest < total_frames and (not snapped or nearest > snapped[-1]):
+                snapped.append(nearest)
+        boundaries = snapped
+
+    edges = [0] + boundaries + [total_frames]
+    return [(start, end) for start, end in zip(edges, edges[1:]) if end > start]
+
+
+def _init_worker(detector_config, threads, events, cancel_event):
+    """Process initializer: build this worker's detector once"""
+    import torch
+    torch.set_num_threads(threads)
+
+    from detect import ObjectDetector
+    _worker['detector'] = ObjectDetector(threads=threads, **detector_config)
+    _worker['events'] = events
+    _worker['cancel'] = cancel_event
+
+
+def _run_segment(index, video_path, output_path, start_frame, end_frame, pipeline_options, store_path=None,
+                 preview_interval=None):
+    """
+    Process one segment in a worker process; returns its summary
+
+    With preview_interval set, an annotated frame is JPEG-encoded and sent
+    back as a 'frame' event at most every preview_interval seconds. Stage
+    timings recorded in this process ride along with the progress events,
+    so the server's /metrics includes them.
+    """
+    from pipeline import VideoPipeline
+
+    detector = _worker['detector']
+    events = _worker['events']
+    cancel = _worker['cancel']
+    if detector.model is None:
+        raise RuntimeError('Model not loaded in segment worker')
+
+    pipeline = VideoPipeline(detector, video_path, output_path, start_frame=start_frame, end_frame=end_frame,
+                             **pipeline_options)
+
+    store = None
+    if store_path:
+        cap = cv2.VideoCapture(video_path)
+        store = DetectionWriter(store_path, cap.get(cv2.CAP_PROP_FPS), detector.class_names)
+        cap.release()
+    recent = deque(maxlen=RECENT_FRAMES)
+    frames = 0
+    total_detections = 0
+    last_report = 0.0
+    last_preview = 0.0
+
+    for result in pipeline.run():
+        if cancel.is_set():
+            raise JobCancelled(f"Segment {index} cancelled")
+
+        frames += 1
+        total_detections += result['count']
+        recent.append({
+            'frame': result['frame_number'],
+            'count': result['count'],
+            'detections': result['detections'].to_list(),
+            'timestamp': result['timestamp']
+        })
+        if store is not None:
+            store.append(result['frame_number'], result['detections'])
+
+        now = time.perf_counter()
+        if preview_interval is not None and now - last_preview >= preview_interval:
+            # The frame is only valid until the next result, so encode it here
+            jpeg = detector.frame_to_jpeg(result['frame'], quality=PREVIEW_QUALITY)
+            events.put(('frame', index, jpeg, {
+                'frame_number': result['frame_number'],
+                'detections': result['detections'].to_list(),
+                'count': result['count']
+            }))
+            last_preview = now
+        if now - last_report > 0.5:
+            events.put(('progress', index, result['frame_number'] - start_frame, STAGE_SECONDS.drain()))
+            last_report = now
+
+    if store is not None:
+        store.close()
+    events.put(('progress', index, end_frame - start_frame, STAGE_SECONDS.drain()))
+    return {
+        'index': index,
+        'start_frame': start_frame,
+        'end_frame': end_frame,
+        'frames_processed': frames,
+        'total_detections': total_detections,
+        'recent': list(recent),
+        'pipeline': pipeline.stats()
+    }
+
+
+def concat_segments(part_paths, output_path):
+    """
+    Join segment outputs into one file
+
+    Uses ffmpeg's concat demuxer (stream copy, no re-encode) when available,
+    otherwise re-muxes frame by frame with OpenCV.
+    """
+    if shutil.which('ffmpeg') is not None:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as listing:
+            for path in part_paths:
+                listing.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', listing.name,
+                            '-c', 'copy', '-movflags', '+faststart', output_path],
+                           check=True, capture_output=True, timeout=3600)
+            return
+        except (subprocess.SubprocessError, OSError) as e:
+            print(f"⚠️  ffmpeg concat failed ({e}); re-muxing with OpenCV")
+        finally:
+            os.remove(listing.name)
+
+    writer = None
+    try:
+        for path in part_paths:
+            cap = cv2.VideoCapture(path)
+            if writer is None:
+                size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), cap.get(cv2.CAP_PROP_FPS), size)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+            cap.release()
+    finally:
+        if writer is not None:
+            writer.release()
+
+
+def process_video_segments(video_path, output_path, detector_config, workers=2, segments=None,
+                           pipeline_options=None, progress_callback=None, check_cancelled=None,
+                           min_segment_seconds=30, store_path=None, frame_callback=None, preview_fps=5):
+    """
+    Process a video as parallel segments and merge the results
+
+    Args:
+        video_path: Input video
+        output_path: Final annotated video
+        detector_config: ObjectDetector keyword arguments (model_path, profile, backend, ...)
+        workers: Worker processes, each with its own detector
+        segments: Number of segments (defaults to workers)
+        pipeline_options: Extra VideoPipeline keyword arguments (frame_skip, batch_size, ...);
+                          not track_every, as every segment would number its tracks from 1
+        progress_callback: Called with (progress percent, per-segment frames done)
+        check_cancelled: Called while waiting; raise (e.g. JobCancelled) to abort
+        min_segment_seconds: Shortest segment worth a separate worker
+        store_path: Detection store directory (see detection_store.py) to
+                    fill with every frame's detections
+        frame_callback: Called with (jpeg bytes, meta dict) for sampled
+                        annotated frames of the earliest unfinished segment,
+                        so a live view plays the video in order
+        preview_fps: Sampled frames per second and segment for frame_callback
+
+    Returns:
+        dict: Merged summary (total_detections, frames_processed, detections,
+              segments and, with store_path, the store's aggregates)
+    """
+    workers = max(1, int(workers))
+    plan = plan_segments(video_path, segments or workers, min_segment_seconds)
+    workers = min(workers, len(plan))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    total = sum(end - start for start, end in plan)
+
+    print(f"Processing {video_path} as {len(plan)} segment(s) on {workers} worker(s) x {threads} thread(s)")
+
+    ctx = mp.get_context('spawn')
+    events = ctx.Queue()
+    cancel_event = ctx.Event()
+    done = [0] * len(plan)
+    lengths = [end - start for start, end in plan]
+    preview_interval = 1.0 / preview_fps if frame_callback is not None and preview_fps else None
+
+    part_dir = tempfile.mkdtemp(prefix='segments_', dir=os.path.dirname(os.path.abspath(output_path)))
+    part_paths = [os.path.join(part_dir, f"part_{i:04d}.mp4") for i in range(len(plan))]
+    store_parts = [os.path.join(part_dir, f"store_{i:04d}") if store_path else None for i in range(len(plan))]
+
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                   initargs=(detector_config, threads, events, cancel_event))
+    try:
+        futures = [executor.submit(_run_segment, i, video_path, part_paths[i], start, end, pipeline_options or {},
+                                   store_parts[i], preview_interval)
+                   for i, (start, end) in enumerate(plan)]
+
+        def handle(event):
+            if event[0] == 'progress':
+                _, index, frames_done, stages = event
+                done[index] = frames_done
+                STAGE_SECONDS.merge(stages)
+            else:
+                _, index, jpeg, meta = event
+                # Only the earliest segment still running is shown; the others' frames are dropped
+                current = next((i for i in range(len(plan)) if done[i] < lengths[i]), None)
+                if index == current:
+                    frame_callback(jpeg, meta)
+
+        while not all(future.done() for future in futures):
+            try:
+                handle(events.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            if check_cancelled is not None:
+                check_cancelled()
+            if progress_callback is not None:
+                progress_callback(100.0 * sum(done) / total if total else 0.0, list(done))
+
+        results = sorted((future.result() for future in futures), key=lambda r: r['index'])
+
+        # Each segment's last progress event carries its last stage timings and may still be queued
+        deadline = time.monotonic() + 5
+        while any(d < length for d, length in zip(done, lengths)) and time.monotonic() < deadline:
+            try:
+                handle(events.get(timeout=0.5))
+            except queue.Empty:
+                pass
+
+        # Segments run at full speed up to here; the join is a stream copy with ffmpeg
+        concat_segments(part_paths, output_path)
+        store = concat_stores(store_parts, store_path) if store_path else None
+    except BaseException:
+        # Stop the other segments instead of letting them run to the end
+        cancel_event.set()
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    recent = [frame for result in results for frame in result['recent']][-RECENT_FRAMES:]
+    summary = {
+        'total_detections': sum(result['total_detections'] for result in results),
+        'frames_processed': sum(result['frames_processed'] for result in results),
+        'detections': recent,
+        'segments': [{key: result[key] for key in ('start_frame', 'end_frame', 'frames_processed',
+                                                    'total_detections', 'pipeline')}
+                     for result in results]
+    }
+    if store is not None:
+        summary['aggregates'] = store.aggregates
+    return summary
@@ -4,6 +4,7 @@ Provides REST API endpoints for video processing and real-time detection
 """
 
 from flask import Flask, request, jsonify, send_file, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
@@ -15,11 +16,41 @@ import queue
 import base64
 import time
 import subprocess
-import re
-import yt_dlp
-from detect import ObjectDetector
+import hashlib
+import uuid
+import shutil
+from collections import deque
+from detect import ObjectDetector, INFERENCE_PROFILES, DEFAULT_PROFILE
+from batching import MicroBatcher
+from detections import json_default
+from inference_pool import PooledDetector
+from segments import process_video_segments
+from jobs import JobScheduler, JobCancelled, PRIORITIES
+from pipeline import VideoPipeline
+from video_io import resolve_video_io
+from result_cache import ResultCache, cache_key, content_hash, remember_hash
+from detection_store import DetectionWriter, DetectionStore
+from job_registry import JobRegistry, FINISHED_STATES
+from metrics import REGISTRY as METRICS, process_memory_bytes
+from uploads import UploadSessions, UploadError
+from ingest import (StreamingDownload, resolve_source, download_with_ytdlp, wait_for_header, is_youtube_url,
+                    is_direct_url, is_public_url)
+from streaming import StreamFrame, FrameBroadcaster, MULTIPART_BOUNDARY, sse_event, multipart_close
+
+
+class DetectionJSONProvider(DefaultJSONProvider):
+    """JSON provider that expands columnar Detections only when responding"""
+    
+    @staticmethod
+    def default(o):
+        try:
+            return json_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
 
 app = Flask(__name__)
+app.json = DetectionJSONProvider(app)
 CORS(app)
 
 # Configuration
@@ -28,17 +59,121 @@ OUTPUT_FOLDER = 'outputs'
 MODEL_FOLDER = 'models'
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
 ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'bmp', 'tiff', 'webp'}
+DATA_FOLDER = 'data'  # Server state (job database)
 MAX_FILE_AGE_HOURS = 24  # Auto-delete files older than 24 hours
+FRAME_PROFILE = 'realtime'  # Default inference profile for live /api/detect/frame
+STREAM_BUFFER_FRAMES = 30  # Frames buffered per stream viewer before dropping the oldest
+STREAM_KEEPALIVE_SECONDS = 30  # Idle time before a stream sends a keepalive
+JOBS_DB = os.path.join(DATA_FOLDER, 'jobs.db')
+# Video jobs allowed to run at once; extra submissions wait in the queue
+JOB_WORKERS = int(os.environ.get('SKYGUARD_JOB_WORKERS', max(1, min(4, (os.cpu_count() or 1) // 4))))
+# Model replica processes per inference profile (0 = run the model in this process)
+INFERENCE_WORKERS = int(os.environ.get('SKYGUARD_INFERENCE_WORKERS', 0))
+INFERENCE_THREADS = int(os.environ.get('SKYGUARD_INFERENCE_THREADS', 0)) or None  # torch/ONNX Runtime threads per replica
+# Inference runtime: 'torch', 'onnx' (ONNX Runtime) or 'openvino'
+INFERENCE_BACKEND = os.environ.get('SKYGUARD_BACKEND', 'torch')
+INFERENCE_PRECISION = os.environ.get('SKYGUARD_PRECISION', 'fp32')  # 'int8' needs the onnx backend
+# Micro-batching for /api/detect/frame: frames arriving within the window share one model call
+FRAME_BATCH_SIZE = int(os.environ.get('SKYGUARD_FRAME_BATCH_SIZE', 8))
+FRAME_BATCH_WAIT_MS = float(os.environ.get('SKYGUARD_FRAME_BATCH_WAIT_MS', 10))
+# Motion gating for video jobs: frames with less change reuse the previous detections (0 = off)
+MOTION_THRESHOLD = float(os.environ.get('SKYGUARD_MOTION_THRESHOLD', 0)) or None
+MOTION_MAX_STALENESS = int(os.environ.get('SKYGUARD_MOTION_MAX_STALENESS', 30))  # Run the model at least every K frames
+# Long uploads are split into segments processed by parallel worker processes, each with its own detector
+SEGMENT_WORKERS = int(os.environ.get('SKYGUARD_SEGMENT_WORKERS', max(1, (os.cpu_count() or 1) // 2)))
+SEGMENT_MIN_DURATION = float(os.environ.get('SKYGUARD_SEGMENT_MIN_DURATION', 600))  # Seconds; shorter videos run as one pipeline
+SEGMENT_PREVIEW_FPS = 5  # Frames per second streamed to viewers of segmented jobs
+# Video decode/encode: 'ffmpeg' (pipe decode, browser-playable H.264 output), 'opencv' (mp4v) or 'auto'
+VIDEO_IO = os.environ.get('SKYGUARD_VIDEO_IO', 'auto')
+# /api/detect/url fetches only public hosts unless set (e.g. for a video server on the local network)
+ALLOW_PRIVATE_URLS = os.environ.get('SKYGUARD_ALLOW_PRIVATE_URLS', '').lower() in ('1', 'true', 'yes')
+
+# Finished results keyed by content hash + model hash + settings, evicted least recently used first
+CACHE_FOLDER = os.path.join(DATA_FOLDER, 'cache')
+CACHE_MAX_MB = float(os.environ.get('SKYGUARD_CACHE_MAX_MB', 2048))
+CACHE_MAX_AGE_HOURS = float(os.environ.get('SKYGUARD_CACHE_MAX_AGE_HOURS', 24 * 7))  # Unused entries outlive outputs
+# Every frame's detections per video job, queryable by frame/time range (see detection_store.py)
+DETECTIONS_FOLDER = os.path.join(DATA_FOLDER, 'detections')
+RECENT_DETECTION_FRAMES = 100  # Frames of detections kept in /api/status and the summary file
+DETECTIONS_PAGE_LIMIT = 1000  # Most frames returned by one /api/detections request
+# Finished jobs leave memory after a TTL (or earlier past the count limit); /api/status then reads their record on disk
+JOB_STATUS_FOLDER = os.path.join(DATA_FOLDER, 'job_status')
+JOB_STATUS_TTL_SECONDS = float(os.environ.get('SKYGUARD_JOB_STATUS_TTL_SECONDS', 600))
+MAX_JOBS_IN_MEMORY = int(os.environ.get('SKYGUARD_MAX_JOBS_IN_MEMORY', 200))
+STREAM_GRACE_SECONDS = 60  # Finished job streams without viewers are dropped after this
+JOB_SWEEP_INTERVAL = 30  # Seconds between registry sweeps
+
+UPLOAD_SESSIONS_FOLDER = os.path.join(DATA_FOLDER, 'uploads')  # Resumable uploads in progress
+MAX_UPLOAD_MB = float(os.environ.get('SKYGUARD_MAX_UPLOAD_MB', 20 * 1024))
+UPLOAD_SESSION_TTL_HOURS = float(os.environ.get('SKYGUARD_UPLOAD_SESSION_TTL_HOURS', 24))  # Idle sessions are dropped
+UPLOAD_STALL_MINUTES = float(os.environ.get('SKYGUARD_UPLOAD_STALL_MINUTES', 30))  # Idle uploads fail the job following them
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
 
 # Create necessary folders
-for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, MODEL_FOLDER]:
+for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, MODEL_FOLDER, DATA_FOLDER, DETECTIONS_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
 # Initialize detector
-detector = None
-processing_status = {}
+detector = None  # Detector for DEFAULT_PROFILE
+detectors = {}  # One warmed-up detector per active inference profile
+detectors_lock = threading.Lock()  # Guards detectors, detector_loading and frame_batchers; never held while loading
+detector_loading = {}  # profile -> Lock held while that profile's detector is created
+frame_batchers = {}  # profile -> MicroBatcher for /api/detect/frame
+segmented_job_slot = threading.Lock()  # Segment workers take every core: one segmented job at a time
+processing_status = JobRegistry(JOB_STATUS_FOLDER, JOB_STATUS_TTL_SECONDS, MAX_JOBS_IN_MEMORY, STREAM_GRACE_SECONDS)
 results_queue = queue.Queue()
-frame_streams = {}  # Store frame streams for real-time viewing
+scheduler = JobScheduler(JOBS_DB, workers=JOB_WORKERS)
+result_cache = ResultCache(CACHE_FOLDER, CACHE_MAX_MB * 1024 * 1024, CACHE_MAX_AGE_HOURS * 3600,
+                           json_default=json_default)
+frame_streams = processing_status.streams  # job_id -> FrameBroadcaster fanning frames out to viewers
+upload_sessions = UploadSessions(UPLOAD_SESSIONS_FOLDER, MAX_UPLOAD_BYTES, UPLOAD_SESSION_TTL_HOURS * 3600,
+                                 UPLOAD_STALL_MINUTES * 60)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES  # Single-request uploads; sessions check their own limit
+
+
+def register_metrics():
+    """Gauges computed from server state whenever /metrics is scraped"""
+    def active_jobs():
+        counts = {(state,): 0 for state in ('queued', 'uploading', 'downloading', 'processing')}
+        for status in list(processing_status.values()):
+            if (status.get('status'),) in counts:
+                counts[(status['status'],)] += 1
+        return counts
+    
+    def job_fps():
+        return {(job_id,): status['pipeline']['fps'] for job_id, status in list(processing_status.items())
+                if status.get('status') == 'processing' and 'fps' in status.get('pipeline', {})}
+    
+    def stream_stat(key):
+        def collect():
+            values = {}
+            for job_id, broadcaster in list(frame_streams.items()):
+                stats = broadcaster.stats()
+                values[(job_id,)] = sum(stats[key]) if isinstance(stats[key], list) else stats[key]
+            return values
+        return collect
+    
+    METRICS.gauge('skyguard_active_jobs', 'Jobs queued or running, by state', ('state',)).set_function(active_jobs)
+    METRICS.gauge('skyguard_job_fps', 'Output frames per second of running video jobs',
+                  ('job_id',)).set_function(job_fps)
+    METRICS.gauge('skyguard_stream_queue_depth', 'Frames waiting in viewer buffers, summed per job stream',
+                  ('job_id',)).set_function(stream_stat('pending'))
+    METRICS.gauge('skyguard_stream_viewers', 'Viewers connected to each job stream',
+                  ('job_id',)).set_function(stream_stat('subscribers'))
+    METRICS.gauge('skyguard_model_memory_bytes', 'Model weight bytes per loaded inference profile',
+                  ('profile',)).set_function(
+        lambda: {(profile,): d.model_memory_bytes() for profile, d in list(detectors.items())})
+    METRICS.gauge('skyguard_process_resident_memory_bytes',
+                  'Resident memory of the server process').set_function(process_memory_bytes)
+    METRICS.gauge('skyguard_job_registry_bytes', 'Memory held by job statuses and stream buffers').set_function(
+        lambda: processing_status.stats()['bytes'])
+    METRICS.counter('skyguard_result_cache_hits_total', 'Result cache hits since start').set_function(
+        lambda: result_cache.hits)
+    METRICS.counter('skyguard_result_cache_misses_total', 'Result cache misses since start').set_function(
+        lambda: result_cache.misses)
+
+
+register_metrics()
 
 
 def cleanup_old_files():
@@ -71,6 +206,51 @@ def cleanup_old_files():
                     print(f"🗑️  Cleaned up old file: {filename} (age: {file_age/3600:.1f} hours)")
                 except Exception as e:
                     print(f"❌ Failed to delete {filename}: {e}")
+    
+    removed = processing_status.cleanup(max_age_seconds)
+    if removed:
+        print(f"🗑️  Removed {removed} old job status records")
+    
+    # Detection stores expire with the outputs they describe
+    for name in os.listdir(DETECTIONS_FOLDER):
+        store_path = os.path.join(DETECTIONS_FOLDER, name)
+        if current_time - os.path.getmtime(store_path) > max_age_seconds:
+            shutil.rmtree(store_path, ignore_errors=True)
+            print(f"🗑️  Cleaned up detection store: {name}")
+    
+    # Cached outputs are hard links, so they outlive the files removed above;
+    # entries unused for CACHE_MAX_AGE_HOURS go now, the rest by size (LRU)
+    removed = result_cache.cleanup()
+    if removed:
+        print(f"🗑️  Removed {removed} unused result cache entries")
+    
+    expire_upload_sessions()
+
+
+def expire_upload_sessions():
+    """Fail jobs following stalled uploads and delete sessions idle past their TTL (runs with each registry sweep)"""
+    stalled = upload_sessions.abort_stalled()
+    if stalled:
+        print(f"⚠️ Aborted {stalled} stalled upload(s) with a job waiting on them")
+    removed = upload_sessions.cleanup()
+    if removed:
+        print(f"🗑️  Removed {removed} idle upload sessions")
+
+
+def detection_store_path(job_id):
+    return os.path.join(DETECTIONS_FOLDER, secure_filename(job_id))
+
+
+def build_summary(aggregates, recent_detections, **extra):
+    """Job summary: totals over every frame plus the most recent frames' detections"""
+    return {
+        **extra,
+        'total_detections': aggregates['detections'],
+        'frames_processed': aggregates['frames'],
+        'class_counts': aggregates['class_counts'],
+        'max_detections_per_frame': aggregates['max_count'],
+        'detections': list(recent_detections)
+    }
 
 
 def allowed_file(filename, file_type='video'):
@@ -88,12 +268,89 @@ def allowed_file(filename, file_type='video'):
         return ext in ALLOWED_VIDEO_EXTENSIONS or ext in ALLOWED_IMAGE_EXTENSIONS
 
 
-def init_detector(model_path='models/yolo11s.pt'):
-    """Initialize the object detector"""
-    global detector
+def detection_settings(profile=None):
+    """
+    Everything that changes a profile's detector output, for result cache keys
+    
+    Taken from the configuration (as ObjectDetector resolves it) rather than
+    a detector, so building a key never creates or warms one up.
+    """
+    profile = profile or DEFAULT_PROFILE
+    settings = INFERENCE_PROFILES[profile]
+    return {
+        'model': content_hash(detector.model_path),
+        'profile': profile,
+        'backend': INFERENCE_BACKEND,
+        'precision': INFERENCE_PRECISION,
+        'conf': settings['conf_threshold'],
+        'iou': settings['iou_threshold'],
+        'imgsz': settings['imgsz'],
+        'max_det': settings['max_det'],
+        'augment': settings['augment'] and INFERENCE_BACKEND == 'torch'  # Other backends run a single pass
+    }
+
+
+def video_settings(profile, params):
+    """
+    detection_settings plus the video job options that change the result
+    
+    Options are cast and defaulted the way VideoPipeline and MotionGate apply
+    them, so equivalent requests ("0.02" and 0.02, 5 and 5.0, options the
+    pipeline ignores) share a key.
+    
+    Raises:
+        ValueError: If an option isn't a number
+    """
+    track_every = max(1, int(float(params['track_every']))) if params.get('track_every') else None
+    # Tracking writes every frame and doesn't use the motion gate
+    frame_skip = 1 if track_every else max(1, int(float(params.get('frame_skip') or 1)))
+    motion_threshold = params.get('motion_threshold')
+    motion_threshold = float(motion_threshold) if motion_threshold is not None and not track_every else None
+    max_staleness = params.get('max_staleness')
+    if motion_threshold is None:
+        max_staleness = None
+    else:
+        max_staleness = max(1, int(float(MOTION_MAX_STALENESS if max_staleness is None else max_staleness)))
+    return {
+        **detection_settings(profile),
+        'frame_skip': frame_skip,
+        'track_every': track_every,
+        'motion_threshold': motion_threshold,
+        'max_staleness': max_staleness,
+        'video_io': resolve_video_io(VIDEO_IO)
+    }
+
+
+def create_detector(model_path, profile):
+    """Create a detector for a profile, backed by a process pool if INFERENCE_WORKERS > 0"""
+    if INFERENCE_WORKERS > 0:
+        return PooledDetector(model_path=model_path, profile=profile, workers=INFERENCE_WORKERS,
+                              threads_per_worker=INFERENCE_THREADS, backend=INFERENCE_BACKEND,
+                              precision=INFERENCE_PRECISION)
+    return ObjectDetector(model_path=model_path, profile=profile, backend=INFERENCE_BACKEND,
+                          threads=INFERENCE_THREADS, precision=INFERENCE_PRECISION)
+
+
+def init_detector(model_path='models/yolo11s.pt', backend=None, precision=None):
+    """
+    Initialize the object detector
+    
+    Args:
+        model_path: Path to the .pt checkpoint
+        backend: Inference backend ('torch', 'onnx', 'openvino'); defaults to SKYGUARD_BACKEND
+        precision: 'fp32' or 'int8'; defaults to SKYGUARD_PRECISION
+    """
+    global detector, INFERENCE_BACKEND, INFERENCE_PRECISION
+    if backend is not None:
+        INFERENCE_BACKEND = backend
+    if precision is not None:
+        INFERENCE_PRECISION = precision
     try:
         if os.path.exists(model_path):
-            detector = ObjectDetector(model_path=model_path)
+            detector = create_detector(model_path, DEFAULT_PROFILE)
+            with detectors_lock:
+                detectors.clear()
+                detectors[DEFAULT_PROFILE] = detector
             return True
         else:
             print(f"Warning: Model file not found at {model_path}")
@@ -104,6 +361,120 @@ def init_detector(model_path='models/yolo11s.pt'):
         return False
 
 
+def get_detector(profile=None):
+    """
+    Return the warmed-up detector for an inference profile
+    
+    Detectors for profiles other than DEFAULT_PROFILE are created (and warmed
+    up) on first use and kept for later requests. Only callers of the profile
+    being created wait for it; other profiles are served meanwhile.
+    
+    Raises:
+        ValueError: If the profile name is unknown
+    """
+    profile = profile or DEFAULT_PROFILE
+    
+    if profile not in INFERENCE_PROFILES:
+        raise ValueError(f"Unknown profile '{profile}'. Available: {', '.join(INFERENCE_PROFILES)}")
+    
+    with detectors_lock:
+        if profile in detectors:
+            return detectors[profile]
+        loading = detector_loading.setdefault(profile, threading.Lock())
+    
+    with loading:
+        with detectors_lock:
+            if profile in detectors:  # Created by the caller we waited for
+                return detectors[profile]
+        profile_detector = create_detector(detector.model_path, profile)
+        with detectors_lock:
+            detectors[profile] = profile_detector
+        return profile_detector
+
+
+def get_batcher(profile):
+    """Return the micro-batcher feeding /api/detect/frame requests for a profile"""
+    with detectors_lock:
+        batcher = frame_batchers.get(profile)
+    if batcher is None:
+        profile_detector = get_detector(profile)
+        with detectors_lock:
+            batcher = frame_batchers.get(profile)
+            if batcher is None:
+                batcher = MicroBatcher(profile_detector, FRAME_BATCH_SIZE, FRAME_BATCH_WAIT_MS)
+                frame_batchers[profile] = batcher
+    return batcher
+
+
+def run_video_detection(job, job_detector, video_path, output_path, video_fps, frame_skip=1, batch_size=None,
+                        track_every=None, motion_threshold=None, max_staleness=MOTION_MAX_STALENESS,
+                        input_stream=None):
+    """
+    Run the detection pipeline for a video job and stream frames to viewers
+    
+    Updates processing_status[job.job_id] with progress, recent detections and
+    per-stage pipeline throughput. Every frame's detections are appended to
+    the job's detection store (see /api/detections). Stops with JobCancelled
+    if the job is cancelled. With track_every set, the model runs on every Nth frame and
+    detections carry track IDs (see tracking.OpticalFlowTracker). With
+    motion_threshold set, near-static frames reuse the previous detections
+    (see motion.MotionGate). With input_stream set, frames are decoded from
+    the bytes of a video that is still downloading or uploading (see
+    ingest.StreamingDownload and uploads.UploadSession).
+    
+    Returns:
+        dict: Summary with totals over all frames (see build_summary)
+    """
+    job_id = job.job_id
+    recent_detections = deque(maxlen=RECENT_DETECTION_FRAMES)
+    store = DetectionWriter(detection_store_path(job_id), video_fps, job_detector.class_names)
+    pipeline = VideoPipeline(job_detector, video_path, output_path, frame_skip, batch_size,
+                             encode_quality=60,  # Lower quality for faster transmission
+                             track_every=track_every, motion_threshold=motion_threshold,
+                             max_staleness=max_staleness, video_io=VIDEO_IO, input_stream=input_stream)
+    
+    for result in pipeline.run():
+        job.check_cancelled()
+        
+        # Update progress
+        processing_status[job_id]['progress'] = result['progress']
+        processing_status[job_id]['pipeline'] = pipeline.stats()
+        
+        # Store detections
+        detection_summary = {
+            'frame': result['frame_number'],
+            'count': result['count'],
+            'detections': result['detections'],
+            'timestamp': result['timestamp']
+        }
+        recent_detections.append(detection_summary)
+        store.append(result['frame_number'], result['detections'])
+        
+        processing_status[job_id]['detections'] = recent_detections
+        
+        # Stream frame to all viewers without rate limiting. JPEG was encoded
+        # on the pipeline's annotation pool; each transport builds its wire
+        # format from the raw bytes, once per frame
+        stream_data = StreamFrame(result['jpeg'], {
+            'frame_number': result['frame_number'],
+            'progress': result['progress'],
+            'detections': result['detections'],
+            'count': result['count'],
+            'fps': video_fps
+        })
+        # Never blocks: lagging viewers drop their own oldest frames
+        frame_streams[job_id].publish(stream_data)
+    
+    store.close()
+    stats = pipeline.stats()
+    processing_status[job_id]['pipeline'] = stats
+    print(f"Pipeline stats for {job_id}: {stats['fps']} fps over {stats['wall_seconds']}s")
+    if 'motion_gate' in stats:
+        print(f"Motion gate for {job_id}: skipped {stats['motion_gate']['skipped']} of "
+              f"{stats['motion_gate']['skipped'] + stats['motion_gate']['inferred']} inferences")
+    return build_summary(store.aggregates, recent_detections)
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -111,55 +482,676 @@ def health_check():
         'status': 'running',
         'model_loaded': detector is not None,
         'current_model': detector.model_name if detector else 'N/A',
-        'device': detector.device if detector else 'N/A'
+        'device': detector.device if detector else 'N/A',
+        'profiles': list(INFERENCE_PROFILES),
+        'loaded_profiles': list(detectors),
+        'inference_workers': INFERENCE_WORKERS,
+        'inference_backend': INFERENCE_BACKEND,
+        'inference_precision': INFERENCE_PRECISION,
+        'video_io': resolve_video_io(VIDEO_IO),
+        'result_cache': result_cache.stats(),
+        'uploads': upload_sessions.stats(),
+        'frame_batching': {profile: batcher.stats() for profile, batcher in list(frame_batchers.items())},
+        'tiling': {profile: d.tiler.stats() for profile, d in list(detectors.items()) if d.tiler is not None}
     })
 
 
-@app.route('/api/upload', methods=['POST'])
-def upload_file():
-    """Upload video or image file for processing"""
-    # Check for either 'video' or 'image' in request
-    file = None
-    file_type = None
-    
-    if 'video' in request.files:
-        file = request.files['video']
-        file_type = 'video'
-    elif 'image' in request.files:
-        file = request.files['image']
-        file_type = 'image'
-    else:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-    
-    if not allowed_file(file.filename, file_type):
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint: stage latency histograms, job/stream/memory gauges and counters"""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+
+def upload_error(filename, file_type):
+    """Validation error message for an uploaded file name, or None if it is acceptable"""
+    if not filename:
+        return 'No selected file'
+    if not allowed_file(filename, file_type):
         if file_type == 'video':
-            return jsonify({'error': 'Invalid video file type. Allowed: mp4, avi, mov, mkv, webm'}), 400
+            return 'Invalid video file type. Allowed: mp4, avi, mov, mkv, webm'
         else:
-            return jsonify({'error': 'Invalid image file type. Allowed: jpg, jpeg, png, bmp, tiff, webp'}), 400
+            return 'Invalid image file type. Allowed: jpg, jpeg, png, bmp, tiff, webp'
+    return None
+
+
+def new_upload_path():
+    """Temporary path an upload is written to before store_upload() names it"""
+    return os.path.join(UPLOAD_FOLDER, f".upload_{uuid.uuid4().hex}")
+
+
+def store_upload(temp_path, filename, digest, file_type):
+    """
+    Move a fully received upload into UPLOAD_FOLDER
+    
+    Identical content is kept under one name, and different content with an
+    existing name gets its own file.
     
-    filename = secure_filename(file.filename)
+    Args:
+        temp_path: Where the upload was written (see new_upload_path)
+        filename: Client-supplied file name
+        digest: SHA-256 hex digest of the content
+        file_type: 'video' or 'image'
+    
+    Returns:
+        dict: /api/upload response
+    """
+    filename = secure_filename(filename)
     filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
+    if os.path.exists(filepath) and content_hash(filepath) != digest:
+        stem, ext = os.path.splitext(filename)
+        filename = f"{stem}_{digest[:8]}{ext}"
+        filepath = os.path.join(UPLOAD_FOLDER, filename)
     
-    return jsonify({
+    if os.path.exists(filepath) and content_hash(filepath) == digest:
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, filepath)
+    remember_hash(filepath, digest)
+    
+    return {
         'success': True,
         'filename': filename,
         'filepath': filepath,
         'file_type': file_type,
+        'content_hash': digest,
         'message': f'{file_type.capitalize()} uploaded successfully'
+    }
+
+
+@app.route('/api/upload', methods=['POST'])
+def upload_file():
+    """
+    Upload video or image file for processing
+    
+    Either a multipart form with a 'video' or 'image' file, or the raw file
+    as the request body with ?filename= (and ?type=image for images).
+    """
+    if request.mimetype == 'multipart/form-data':
+        # Check for either 'video' or 'image' in request
+        if 'video' in request.files:
+            file = request.files['video']
+            file_type = 'video'
+        elif 'image' in request.files:
+            file = request.files['image']
+            file_type = 'image'
+        else:
+            return jsonify({'error': 'No file provided'}), 400
+        filename, stream = file.filename, file.stream
+    else:
+        file_type = request.args.get('type', 'video')
+        if file_type not in ('video', 'image'):
+            return jsonify({'error': "type must be 'video' or 'image'"}), 400
+        filename, stream = request.args.get('filename', ''), request.stream
+    
+    error = upload_error(filename, file_type)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Hash while writing
+    digest = hashlib.sha256()
+    temp_path = new_upload_path()
+    with open(temp_path, 'wb') as out:
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    
+    return jsonify(store_upload(temp_path, filename, digest.hexdigest(), file_type))
+
+
+def upload_error_response(error):
+    return jsonify({'error': str(error), **error.details}), error.status
+
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """
+    Start a resumable upload
+    
+    JSON body: filename, type ('video' or 'image', default video), and
+    optionally size (bytes) and sha256 (checked when the upload completes).
+    Chunks then go to PUT /api/uploads/<upload_id>.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    file_type = data.get('type', 'video')
+    if file_type not in ('video', 'image'):
+        return jsonify({'error': "type must be 'video' or 'image'"}), 400
+    
+    error = upload_error(filename, file_type)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        session = upload_sessions.create(filename, file_type, data.get('size'), data.get('sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size must be a number of bytes'}), 400
+    
+    return jsonify({'success': True, **session.status()}), 201
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Upload progress; 'offset' is where the next chunk has to start"""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(session.status())
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+def upload_chunk(upload_id):
+    """
+    Append a chunk (the raw request body) to an upload
+    
+    The chunk's start goes in ?offset= or the Upload-Offset header and must
+    equal the upload's current offset (409 with the current offset
+    otherwise). An optional X-Chunk-SHA256 header makes the chunk all or
+    nothing.
+    """
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    offset = request.args.get('offset', request.headers.get('Upload-Offset'))
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'offset is required', 'offset': session.bytes_done}), 400
+    
+    try:
+        new_offset = session.write(offset, request.stream, request.headers.get('X-Chunk-SHA256'),
+                                   upload_sessions.max_bytes)
+    except UploadError as e:
+        return upload_error_response(e)
+    
+    return jsonify({'upload_id': session.upload_id, 'offset': new_offset, 'progress': session.progress})
+
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """
+    Finish an upload and file it under uploads/ like POST /api/upload
+    
+    Optional JSON body: sha256 of the whole file.
+    """
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    def store(digest):
+        # Link rather than move: a job may still be reading the session file
+        link_path = new_upload_path()
+        os.link(session.path, link_path)
+        return store_upload(link_path, session.filename, digest, session.file_type)
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        result = session.complete(store, data.get('sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify(result)
+
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Abort an upload and delete what was received"""
+    if not upload_sessions.remove(upload_id):
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify({'success': True, 'message': 'Upload aborted'})
+
+
+def run_segmented_detection(job, job_detector, video_path, output_path, params):
+    """
+    Process a long video as parallel segments (see segments.process_video_segments)
+    
+    Progress in processing_status[job.job_id] is aggregated across segments.
+    Viewers get a SEGMENT_PREVIEW_FPS sample of the annotated frames of the
+    earliest segment still running, rather than every frame.
+    
+    Returns:
+        dict: Merged summary for the whole video
+    """
+    job_id = job.job_id
+    processing_status[job_id]['segmented'] = True
+    
+    def on_progress(progress, segment_frames):
+        processing_status[job_id]['progress'] = progress
+        processing_status[job_id]['segment_frames'] = segment_frames
+    
+    def on_frame(jpeg, meta):
+        meta['progress'] = processing_status[job_id]['progress']
+        meta['fps'] = SEGMENT_PREVIEW_FPS  # Viewers pace playback by this
+        frame_streams[job_id].publish(StreamFrame(jpeg, meta))
+    
+    summary = process_video_segments(
+        video_path, output_path,
+        detector_config={
+            'model_path': job_detector.model_path,
+            'profile': job_detector.profile,
+            'backend': job_detector.backend,
+            'precision': job_detector.precision
+        },
+        workers=params.get('segment_workers') or SEGMENT_WORKERS,
+        pipeline_options={
+            'frame_skip': params.get('frame_skip', 1),
+            'batch_size': params.get('batch_size'),
+            'track_every': params.get('track_every'),
+            'motion_threshold': params.get('motion_threshold'),
+            'max_staleness': params.get('max_staleness', MOTION_MAX_STALENESS),
+            'video_io': VIDEO_IO
+        },
+        progress_callback=on_progress,
+        check_cancelled=job.check_cancelled,
+        store_path=detection_store_path(job_id),
+        frame_callback=on_frame,
+        preview_fps=SEGMENT_PREVIEW_FPS
+    )
+    
+    processing_status[job_id]['detections'] = summary['detections']
+    processing_status[job_id]['pipeline'] = {'segments': summary['segments']}
+    return build_summary(summary['aggregates'], summary['detections'], segments=summary['segments'])
+
+
+def run_video_job(job):
+    """Job handler: detect objects in an uploaded video"""
+    params = job.params
+    job_id = job.job_id
+    video_path = params['video_path']
+    output_path = params['output_path']
+    
+    processing_status[job_id]['status'] = 'processing'
+    
+    try:
+        job_detector = get_detector(params.get('profile'))
+        
+        # An earlier output may be hard-linked into the result cache: write a new file, don't truncate it
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        
+        # Get video FPS for proper playback timing
+        cap = cv2.VideoCapture(video_path)
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / video_fps if video_fps else 0
+        cap.release()
+        
+        # Long archive videos are split across worker processes unless the request says otherwise
+        segmented = params.get('segmented')
+        if segmented is None:
+            segmented = SEGMENT_WORKERS > 1 and duration >= SEGMENT_MIN_DURATION
+        if segmented and params.get('track_every'):
+            # Each segment's tracker would restart its IDs, reusing them for different objects
+            print(f"Tracking needs one pipeline over the whole video; not segmenting {os.path.basename(video_path)}")
+            segmented = False
+        if segmented and not segmented_job_slot.acquire(blocking=False):
+            # Another job's segment workers have the cores; a second set would only oversubscribe them
+            print(f"Another segmented job is running; processing {os.path.basename(video_path)} as one pipeline")
+            segmented = False
+        
+        if segmented:
+            try:
+                summary = run_segmented_detection(job, job_detector, video_path, output_path, params)
+            finally:
+                segmented_job_slot.release()
+        else:
+            summary = run_video_detection(job, job_detector, video_path, output_path, video_fps,
+                                          params.get('frame_skip', 1), params.get('batch_size'),
+                                          params.get('track_every'), params.get('motion_threshold'),
+                                          params.get('max_staleness', MOTION_MAX_STALENESS))
+        summary['store'] = job_id
+        
+        # Save summary before reporting completion, so clients never read a partial file
+        summary_path = os.path.join(OUTPUT_FOLDER, f"summary_{job_id}.json")
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2, default=json_default)
+        if params.get('cache_key'):
+            result_cache.put(params['cache_key'], 'video', summary, output_path)
+        
+        # Mark as complete
+        processing_status[job_id]['status'] = 'completed'
+        processing_status[job_id]['progress'] = 100
+    
+    except JobCancelled:
+        processing_status[job_id]['status'] = 'cancelled'
+        raise
+    except Exception as e:
+        processing_status[job_id]['status'] = 'error'
+        processing_status[job_id]['error'] = str(e)
+        raise
+    finally:
+        # Send completion/error signal
+        if job_id in frame_streams:
+            frame_streams[job_id].close()
+
+
+def run_url_job(job):
+    """
+    Job handler: download a YouTube/URL video and detect objects in it
+    
+    Progressive sources are streamed: detection starts on the first frames
+    while the rest downloads, and processing_status[job_id]['download']
+    tracks the download next to the processing progress. Sources that can't
+    be decoded while downloading are fetched completely first.
+    """
+    params = job.params
+    job_id = job.job_id
+    url = params['url']
+    video_path = params['video_path']
+    output_path = params['output_path']
+    
+    processing_status[job_id]['status'] = 'downloading'
+    processing_status[job_id]['download'] = {'bytes': 0, 'total_bytes': None, 'progress': 0}
+    download = None
+    
+    def on_download_progress(current):
+        # Runs on the download thread: abort once the job is cancelled
+        job.check_cancelled()
+        processing_status[job_id]['download'] = {
+            'bytes': current.bytes_done,
+            'total_bytes': current.total_bytes,
+            'progress': current.progress
+        }
+    
+    def on_ytdlp_progress(progress):
+        # yt-dlp progress hook, same reporting for the full-download fallback
+        job.check_cancelled()
+        total = progress.get('total_bytes') or progress.get('total_bytes_estimate')
+        done = progress.get('downloaded_bytes', 0)
+        processing_status[job_id]['download'] = {
+            'bytes': done,
+            'total_bytes': total,
+            'progress': 100.0 * done / total if total else None
+        }
+    
+    try:
+        job_detector = get_detector(params.get('profile'))
+        
+        source = resolve_source(url)
+        print(f"Downloading video: {url} ({source['title']})")
+        print(f"Saving to: {video_path}")
+        
+        input_stream = None
+        if source['url'] is None:
+            # Only adaptive (HLS/DASH) formats: let yt-dlp fetch the whole file
+            download_with_ytdlp(url, video_path, on_ytdlp_progress)
+            processing_status[job_id]['download'] = {'bytes': os.path.getsize(video_path),
+                                                     'total_bytes': os.path.getsize(video_path), 'progress': 100.0}
+        else:
+            download = StreamingDownload(source['url'], video_path, source['headers'],
+                                         progress_callback=on_download_progress,
+                                         allow_private=ALLOW_PRIVATE_URLS).start()
+            if resolve_video_io(VIDEO_IO) == 'ffmpeg':
+                header = wait_for_header(download, check_cancelled=job.check_cancelled)
+                if header['streaming']:
+                    input_stream = download.iter_bytes()
+                    print(f"Streaming: detection starts after {download.bytes_done} bytes")
+            else:
+                # OpenCV can't decode a file that is still growing
+                while not download.wait(timeout=0.5):
+                    job.check_cancelled()
+            if input_stream is None and download.error is not None:
+                raise download.error
+        
+        job.check_cancelled()
+        
+        if not os.path.exists(video_path):
+            raise Exception(f"Downloaded video file not found at {video_path}")
+        
+        print(f"Processing video...")
+        processing_status[job_id]['status'] = 'processing'
+        
+        # Get video FPS for proper playback timing
+        cap = cv2.VideoCapture(video_path)
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        
+        # Process every frame of downloaded videos
+        frame_skip = 1
+        summary = run_video_detection(job, job_detector, video_path, output_path, video_fps, frame_skip,
+                                      track_every=params.get('track_every'),
+                                      motion_threshold=params.get('motion_threshold'),
+                                      max_staleness=params.get('max_staleness', MOTION_MAX_STALENESS),
+                                      input_stream=input_stream)
+        summary = {'url': url, **summary, 'store': job_id}
+        
+        if download is not None:
+            download.join()
+            if download.error is not None:
+                raise download.error
+            print(f"Download complete. File size: {download.bytes_done} bytes")
+        
+        summary_path = os.path.join(OUTPUT_FOLDER, f"summary_{job_id}.json")
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2, default=json_default)
+        if params.get('cache_key'):
+            result_cache.put(params['cache_key'], 'video', summary, output_path)
+        
+        processing_status[job_id]['status'] = 'completed'
+        processing_status[job_id]['progress'] = 100
+        
+        print(f"Video processing complete: {os.path.basename(output_path)}")
+    
+    except JobCancelled:
+        processing_status[job_id]['status'] = 'cancelled'
+        raise
+    except Exception as e:
+        # yt-dlp and the download thread wrap exceptions raised from progress hooks
+        if job.cancelled:
+            processing_status[job_id]['status'] = 'cancelled'
+            raise JobCancelled(f"Job {job_id} was cancelled")
+        
+        import traceback
+        error_details = traceback.format_exc()
+        print(f"Error processing video from {url}: {e}")
+        print(f"Full traceback:\n{error_details}")
+        processing_status[job_id]['status'] = 'error'
+        processing_status[job_id]['error'] = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        if download is not None:
+            download.cancel()
+        if job_id in frame_streams:
+            frame_streams[job_id].close()
+
+
+def run_upload_job(job):
+    """
+    Job handler: detect objects in a video that is still being uploaded
+    
+    Like streamed URL jobs, detection starts once the container header has
+    arrived and follows the upload as chunks come in;
+    processing_status[job_id]['upload'] tracks the upload next to the
+    processing progress. Videos that can't be decoded while incomplete (or
+    OpenCV video I/O) wait for the upload to finish first.
+    """
+    params = job.params
+    job_id = job.job_id
+    output_path = params['output_path']
+    
+    session = upload_sessions.get(params['upload_id'])
+    if session is None:
+        processing_status[job_id]['status'] = 'error'
+        processing_status[job_id]['error'] = 'Upload not found'
+        frame_streams[job_id].close()
+        raise Exception(f"Upload {params['upload_id']} not found")
+    
+    def on_upload_progress(current):
+        # Runs on the thread of the request writing the chunk
+        processing_status[job_id]['upload'] = {
+            'bytes': current.bytes_done,
+            'total_bytes': current.total_bytes,
+            'progress': current.progress
+        }
+    
+    processing_status[job_id]['status'] = 'uploading'
+    on_upload_progress(session)
+    session.progress_callback = on_upload_progress
+    
+    try:
+        job_detector = get_detector(params.get('profile'))
+        
+        # An earlier output may be hard-linked into the result cache: write a new file, don't truncate it
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        
+        input_stream = None
+        if resolve_video_io(VIDEO_IO) == 'ffmpeg':
+            header = wait_for_header(session, check_cancelled=job.check_cancelled)
+            if header['streaming']:
+                input_stream = session.iter_bytes(check_cancelled=job.check_cancelled)
+                print(f"Streaming: detection starts after {session.bytes_done} uploaded bytes")
+        else:
+            # OpenCV can't decode a file that is still growing
+            while not session.wait(timeout=0.5):
+                job.check_cancelled()
+        if input_stream is None and session.error is not None:
+            raise session.error
+        
+        processing_status[job_id]['status'] = 'processing'
+        
+        # Get video FPS for proper playback timing
+        cap = cv2.VideoCapture(session.path)
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        
+        summary = run_video_detection(job, job_detector, session.path, output_path, video_fps,
+                                      track_every=params.get('track_every'),
+                                      motion_threshold=params.get('motion_threshold'),
+                                      max_staleness=params.get('max_staleness', MOTION_MAX_STALENESS),
+                                      input_stream=input_stream)
+        
+        session.wait()
+        if session.error is not None:
+            raise session.error
+        summary = {'filename': (session.result or {}).get('filename', session.filename), **summary,
+                   'store': job_id}
+        
+        # Save summary before reporting completion, so clients never read a partial file
+        summary_path = os.path.join(OUTPUT_FOLDER, f"summary_{job_id}.json")
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2, default=json_default)
+        # The content hash is only known now; later submissions of the same file hit the cache
+        key = cache_key('video', session.digest(), video_settings(job_detector.profile, params))
+        result_cache.put(key, 'video', summary, output_path)
+        
+        processing_status[job_id]['status'] = 'completed'
+        processing_status[job_id]['progress'] = 100
+        
+        print(f"Video processing complete: {os.path.basename(output_path)}")
+    
+    except JobCancelled:
+        processing_status[job_id]['status'] = 'cancelled'
+        raise
+    except Exception as e:
+        processing_status[job_id]['status'] = 'error'
+        processing_status[job_id]['error'] = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        session.progress_callback = None
+        if job_id in frame_streams:
+            frame_streams[job_id].close()
+
+
+def serve_cached_job(job_id, entry, output_path, profile):
+    """
+    Answer a video/URL job from a result cache entry
+    
+    Restores the annotated output and summary file and registers the job as
+    completed, so /api/status and /api/stream behave as for a finished job.
+    """
+    summary = entry['payload']
+    result_cache.restore(entry, output_path)
+    # Share the original job's detection store (hard links) while it hasn't been cleaned up
+    source_store = detection_store_path(summary['store']) if summary.get('store') else None
+    if source_store and DetectionStore.exists(source_store) and source_store != detection_store_path(job_id):
+        shutil.rmtree(detection_store_path(job_id), ignore_errors=True)
+        try:
+            shutil.copytree(source_store, detection_store_path(job_id), copy_function=os.link)
+        except OSError:
+            shutil.copytree(source_store, detection_store_path(job_id), dirs_exist_ok=True)
+    with open(os.path.join(OUTPUT_FOLDER, f"summary_{job_id}.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    
+    processing_status[job_id] = {
+        'status': 'completed',
+        'progress': 100,
+        'detections': summary.get('detections', []),
+        'output_file': os.path.basename(output_path),
+        'profile': profile,
+        'cached': True
+    }
+    # Viewers connecting to the stream get the end signal straight away
+    broadcaster = FrameBroadcaster(buffer_size=STREAM_BUFFER_FRAMES)
+    broadcaster.close()
+    frame_streams[job_id] = broadcaster
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'cached': True,
+        'output_file': os.path.basename(output_path),
+        'summary': summary,
+        'message': 'Already processed with these settings; returning the cached result'
     })
 
 
+def queue_job(job_id, kind, params, output_filename, priority='normal'):
+    """Register status/stream state for a job and hand it to the scheduler"""
+    processing_status[job_id] = {
+        'status': 'queued',
+        'progress': 0,
+        'detections': [],
+        'output_file': output_filename,
+        'profile': params.get('profile') or DEFAULT_PROFILE
+    }
+    
+    # Create frame broadcaster with a per-viewer buffer
+    frame_streams[job_id] = FrameBroadcaster(buffer_size=STREAM_BUFFER_FRAMES)
+    
+    return scheduler.submit(job_id, kind, params, priority)
+
+
+def start_job_workers():
+    """Start the job workers, re-queueing jobs left over from the last run"""
+    scheduler.register('video', run_video_job)
+    scheduler.register('youtube', run_url_job)
+    scheduler.register('url', run_url_job)
+    scheduler.register('upload', run_upload_job)
+    
+    for job in scheduler.start():
+        processing_status[job.job_id] = {
+            'status': 'queued',
+            'progress': 0,
+            'detections': [],
+            'output_file': os.path.basename(job.params['output_path']),
+            'profile': job.params.get('profile') or DEFAULT_PROFILE
+        }
+        frame_streams[job.job_id] = FrameBroadcaster(buffer_size=STREAM_BUFFER_FRAMES)
+    
+    processing_status.start_sweeper(JOB_SWEEP_INTERVAL, tasks=[expire_upload_sessions])
+    print(f"Job workers: {scheduler.workers}")
+
+
 @app.route('/api/detect/video', methods=['POST'])
 def detect_video():
-    """Process video and detect objects"""
+    """Queue a video for object detection (an uploaded filename, or the upload_id of a resumable upload)"""
     if detector is None:
         return jsonify({'error': 'Model not loaded. Please check model file.'}), 500
     
     data = request.get_json()
+    
+    # A resumable upload is an ordinary uploaded file once complete; before that the job follows it
+    if data.get('upload_id'):
+        session = upload_sessions.get(data['upload_id'])
+        if session is None:
+            return jsonify({'error': 'Upload not found'}), 404
+        if session.file_type != 'video':
+            return jsonify({'error': 'Upload is not a video'}), 400
+        if session.result is None:
+            return queue_upload_job(session, data)
+        data = {**data, 'filename': session.result['filename']}
+    
     filename = data.get('filename')
     
     if not filename:
@@ -170,256 +1162,272 @@ def detect_video():
     if not os.path.exists(video_path):
         return jsonify({'error': 'Video file not found'}), 404
     
+    profile = data.get('profile') or DEFAULT_PROFILE
+    if profile not in INFERENCE_PROFILES:
+        return jsonify({'error': f"Unknown profile '{profile}'. Available: {', '.join(INFERENCE_PROFILES)}"}), 400
+    
+    priority = data.get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return jsonify({'error': f"Unknown priority '{priority}'. Available: {', '.join(PRIORITIES)}"}), 400
+    
     # Generate output filename
     output_filename = f"detected_{filename}"
     output_path = os.path.join(OUTPUT_FOLDER, output_filename)
     
-    # Start processing in background thread
     job_id = filename.replace('.', '_')
-    processing_status[job_id] = {
-        'status': 'processing',
-        'progress': 0,
-        'detections': [],
-        'output_file': output_filename
+    if scheduler.is_active(job_id):
+        return jsonify({'error': 'This video is already queued or processing', 'job_id': job_id}), 409
+    
+    params = {
+        'video_path': video_path,
+        'output_path': output_path,
+        'frame_skip': data.get('frame_skip', 1),
+        'batch_size': data.get('batch_size'),  # Optional, detector default otherwise
+        'track_every': data.get('track_every'),  # Optional: detect every N frames, track in between
+        'motion_threshold': data.get('motion_threshold', MOTION_THRESHOLD),  # Optional: skip near-static frames
+        'max_staleness': data.get('max_staleness', MOTION_MAX_STALENESS),
+        'segmented': data.get('segmented'),  # Optional: force (true) or disable (false) parallel segments
+        'segment_workers': data.get('segment_workers'),
+        'profile': profile
     }
     
-    # Create frame stream queue with larger buffer to prevent dropping frames
-    frame_streams[job_id] = queue.Queue(maxsize=60)
+    # Same content, model and settings processed before: return that result without inference
+    try:
+        params['cache_key'] = cache_key('video', content_hash(video_path), video_settings(profile, params))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'frame_skip, track_every, motion_threshold and max_staleness must be numbers'}), 400
+    if data.get('use_cache', True):
+        entry = result_cache.get(params['cache_key'])
+        if entry is not None:
+            return serve_cached_job(job_id, entry, output_path, profile)
     
-    # Get video FPS for proper playback timing
-    import cv2
-    cap = cv2.VideoCapture(video_path)
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    cap.release()
+    job = queue_job(job_id, 'video', params, output_filename, priority)
     
-    def process_video_thread():
-        try:
-            all_detections = []
-            frame_skip = data.get('frame_skip', 1)
-            
-            for result in detector.process_video(video_path, output_path, frame_skip):
-                # Update progress
-                processing_status[job_id]['progress'] = result['progress']
-                
-                # Convert frame to base64 with lower quality for faster transmission
-                frame_base64 = detector.frame_to_base64(result['frame'], quality=60)
-                
-                # Store detections
-                detection_summary = {
-                    'frame': result['frame_number'],
-                    'count': result['count'],
-                    'detections': result['detections'],
-                    'timestamp': result['timestamp']
-                }
-                all_detections.append(detection_summary)
-                
-                # Keep only last 100 frames in memory
-                if len(all_detections) > 100:
-                    all_detections.pop(0)
-                
-                processing_status[job_id]['detections'] = all_detections
-                
-                # Stream frame to client without rate limiting
-                try:
-                    stream_data = {
-                        'type': 'frame',
-                        'frame': frame_base64,
-                        'frame_number': result['frame_number'],
-                        'progress': result['progress'],
-                        'detections': result['detections'],
-                        'count': result['count'],
-                        'fps': video_fps
-                    }
-                    # Use put with timeout to avoid blocking
-                    frame_streams[job_id].put(stream_data, block=True, timeout=0.1)
-                except queue.Full:
-                    # Skip frame if queue is full (client is lagging)
-                    pass
-            
-            # Mark as complete
-            processing_status[job_id]['status'] = 'completed'
-            processing_status[job_id]['progress'] = 100
-            
-            # Send completion signal
-            if job_id in frame_streams:
-                frame_streams[job_id].put(None)
-            
-            # Save summary
-            summary_path = os.path.join(OUTPUT_FOLDER, f"summary_{job_id}.json")
-            with open(summary_path, 'w') as f:
-                json.dump({
-                    'total_detections': sum(d['count'] for d in all_detections),
-                    'frames_processed': len(all_detections),
-                    'detections': all_detections
-                }, f, indent=2)
-            
-        except Exception as e:
-            processing_status[job_id]['status'] = 'error'
-            processing_status[job_id]['error'] = str(e)
-            # Send error signal
-            if job_id in frame_streams:
-                frame_streams[job_id].put(None)
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'queue_position': scheduler.position(job.job_id),
+        'message': 'Video queued for processing'
+    })
+
+
+def queue_upload_job(session, data):
+    """Queue a detection job that starts on the received part of an upload in progress"""
+    profile = data.get('profile') or DEFAULT_PROFILE
+    if profile not in INFERENCE_PROFILES:
+        return jsonify({'error': f"Unknown profile '{profile}'. Available: {', '.join(INFERENCE_PROFILES)}"}), 400
+    
+    priority = data.get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return jsonify({'error': f"Unknown priority '{priority}'. Available: {', '.join(PRIORITIES)}"}), 400
     
-    # Start processing thread
-    thread = threading.Thread(target=process_video_thread)
-    thread.daemon = True
-    thread.start()
+    stem, ext = os.path.splitext(secure_filename(session.filename))
+    name = f"{stem}_{session.upload_id[:8]}{ext}"
+    output_filename = f"detected_{name}"
+    job_id = name.replace('.', '_')
+    if scheduler.is_active(job_id):
+        return jsonify({'error': 'This upload is already queued or processing', 'job_id': job_id}), 409
+    
+    job = queue_job(job_id, 'upload', {
+        'upload_id': session.upload_id,
+        'video_path': session.path,
+        'output_path': os.path.join(OUTPUT_FOLDER, output_filename),
+        'track_every': data.get('track_every'),
+        'motion_threshold': data.get('motion_threshold', MOTION_THRESHOLD),
+        'max_staleness': data.get('max_staleness', MOTION_MAX_STALENESS),
+        'profile': profile
+    }, output_filename, priority)
     
     return jsonify({
         'success': True,
         'job_id': job_id,
-        'message': 'Video processing started'
+        'queue_position': scheduler.position(job.job_id),
+        'message': 'Video queued for processing while it uploads'
     })
 
 
-@app.route('/api/detect/youtube', methods=['POST'])
-def detect_youtube():
-    """Download and process YouTube video"""
-    if detector is None:
-        return jsonify({'error': 'Model not loaded. Please check model file.'}), 500
+def queue_url_job(url, data, kind):
+    """Queue a download-and-detect job for a URL, or answer from a cached result"""
+    profile = data.get('profile') or DEFAULT_PROFILE
+    if profile not in INFERENCE_PROFILES:
+        return jsonify({'error': f"Unknown profile '{profile}'. Available: {', '.join(INFERENCE_PROFILES)}"}), 400
     
-    data = request.get_json()
-    youtube_url = data.get('url')
-    
-    if not youtube_url:
-        return jsonify({'error': 'No YouTube URL provided'}), 400
+    priority = data.get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return jsonify({'error': f"Unknown priority '{priority}'. Available: {', '.join(PRIORITIES)}"}), 400
     
-    # Validate YouTube URL
-    youtube_regex = r'^(https?://)?(www\.)?(youtube\.com/watch\?v=|youtu\.be/)[\w-]+'
-    if not re.match(youtube_regex, youtube_url):
-        return jsonify({'error': 'Invalid YouTube URL'}), 400
+    settings = {
+        'track_every': data.get('track_every'),
+        'motion_threshold': data.get('motion_threshold', MOTION_THRESHOLD),
+        'max_staleness': data.get('max_staleness', MOTION_MAX_STALENESS),
+        'profile': profile
+    }
     
     # Generate unique filename
-    import hashlib
-    url_hash = hashlib.md5(youtube_url.encode()).hexdigest()[:10]
+    url_hash = hashlib.md5(url.encode()).hexdigest()[:10]
     timestamp = int(time.time())
-    video_filename = f'youtube_{url_hash}_{timestamp}.mp4'
+    video_filename = f'{kind}_{url_hash}_{timestamp}.mp4'
     
     # Ensure upload folder exists and get absolute path
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     
     # Use absolute paths for reliability
     video_path = os.path.abspath(os.path.join(UPLOAD_FOLDER, video_filename))
-    output_filename = f'detected_youtube_{url_hash}_{timestamp}.mp4'
+    output_filename = f'detected_{kind}_{url_hash}_{timestamp}.mp4'
     output_path = os.path.abspath(os.path.join(OUTPUT_FOLDER, output_filename))
     
     # Create job ID
     job_id = video_filename.replace('.', '_')
-    processing_status[job_id] = {
-        'status': 'downloading',
-        'progress': 0,
-        'detections': [],
-        'output_file': output_filename
-    }
-    
-    # Create frame stream queue
-    frame_streams[job_id] = queue.Queue(maxsize=60)
+    if scheduler.is_active(job_id):
+        return jsonify({'error': 'This video is already queued or processing', 'job_id': job_id}), 409
     
-    def download_and_process():
-        try:
-            # Download YouTube video using yt-dlp Python module
-            print(f"Downloading YouTube video: {youtube_url}")
-            print(f"Saving to: {video_path}")
-            
-            ydl_opts = {
-                'format': 'best[height<=720][ext=mp4]/best[height<=720]/best',
-                'outtmpl': video_path,
-                'quiet': False,
-                'no_warnings': False,
-                'noplaylist': True,
-                'nocheckcertificate': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=True)
-                print(f"Downloaded: {info.get('title', 'Unknown')}")
-            
-            if not os.path.exists(video_path):
-                raise Exception(f"Downloaded video file not found at {video_path}")
-            
-            print(f"Download complete. File size: {os.path.getsize(video_path)} bytes")
-            print(f"Processing video...")
-            processing_status[job_id]['status'] = 'processing'
-            
-            # Get video FPS for proper playback timing
-            cap = cv2.VideoCapture(video_path)
-            video_fps = cap.get(cv2.CAP_PROP_FPS)
-            cap.release()
-            
-            # Process the downloaded video
-            all_detections = []
-            frame_skip = 1  # Process every frame for YouTube videos
-            
-            for result in detector.process_video(video_path, output_path, frame_skip):
-                processing_status[job_id]['progress'] = result['progress']
-                
-                frame_base64 = detector.frame_to_base64(result['frame'], quality=60)
-                
-                detection_summary = {
-                    'frame': result['frame_number'],
-                    'count': result['count'],
-                    'detections': result['detections'],
-                    'timestamp': result['timestamp']
-                }
-                all_detections.append(detection_summary)
-                
-                if len(all_detections) > 100:
-                    all_detections.pop(0)
-                
-                processing_status[job_id]['detections'] = all_detections
-                
-                try:
-                    stream_data = {
-                        'type': 'frame',
-                        'frame': frame_base64,
-                        'frame_number': result['frame_number'],
-                        'progress': result['progress'],
-                        'detections': result['detections'],
-                        'count': result['count'],
-                        'fps': video_fps
-                    }
-                    frame_streams[job_id].put(stream_data, block=True, timeout=0.1)
-                except queue.Full:
-                    pass
-            
-            processing_status[job_id]['status'] = 'completed'
-            processing_status[job_id]['progress'] = 100
-            
-            if job_id in frame_streams:
-                frame_streams[job_id].put(None)
-            
-            print(f"YouTube video processing complete: {output_filename}")
-            
-        except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"Error processing YouTube video: {e}")
-            print(f"Full traceback:\n{error_details}")
-            processing_status[job_id]['status'] = 'error'
-            processing_status[job_id]['error'] = f"{type(e).__name__}: {str(e)}"
-            
-            if job_id in frame_streams:
-                frame_streams[job_id].put(None)
+    # Same URL already processed with the same model and settings: skip the download entirely
+    try:
+        key = cache_key('url', url, video_settings(profile, settings))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'track_every, motion_threshold and max_staleness must be numbers'}), 400
+    if data.get('use_cache', True):
+        entry = result_cache.get(key)
+        if entry is not None:
+            return serve_cached_job(job_id, entry, output_path, profile)
     
-    # Start download and processing thread
-    thread = threading.Thread(target=download_and_process)
-    thread.daemon = True
-    thread.start()
+    job = queue_job(job_id, kind, {
+        'url': url,
+        'video_path': video_path,
+        'output_path': output_path,
+        'cache_key': key,
+        **settings
+    }, output_filename, priority)
     
     return jsonify({
         'success': True,
         'job_id': job_id,
-        'message': 'YouTube video download and processing started'
+        'queue_position': scheduler.position(job.job_id),
+        'message': 'Video queued for download and processing'
     })
 
 
+@app.route('/api/detect/youtube', methods=['POST'])
+def detect_youtube():
+    """Queue a YouTube video for download and object detection"""
+    if detector is None:
+        return jsonify({'error': 'Model not loaded. Please check model file.'}), 500
+    
+    data = request.get_json()
+    youtube_url = data.get('url')
+    
+    if not youtube_url:
+        return jsonify({'error': 'No YouTube URL provided'}), 400
+    
+    # Validate YouTube URL
+    if not is_youtube_url(youtube_url):
+        return jsonify({'error': 'Invalid YouTube URL'}), 400
+    
+    return queue_url_job(youtube_url, data, 'youtube')
+
+
+@app.route('/api/detect/url', methods=['POST'])
+def detect_url():
+    """Queue a video file served over HTTP(S) for download and object detection"""
+    if detector is None:
+        return jsonify({'error': 'Model not loaded. Please check model file.'}), 500
+    
+    data = request.get_json()
+    url = data.get('url')
+    
+    if not url:
+        return jsonify({'error': 'No URL provided'}), 400
+    
+    if not is_direct_url(url):
+        return jsonify({'error': 'Invalid URL. Only http(s) URLs are supported'}), 400
+    
+    if not ALLOW_PRIVATE_URLS and not is_public_url(url):
+        return jsonify({'error': 'URL host is not a public address'}), 400
+    
+    return queue_url_job(url, data, 'url')
+
+
+def job_status(job_id):
+    """/api/status response for a job, or None if it is unknown"""
+    if job_id not in processing_status:
+        return None
+    
+    status = dict(processing_status[job_id])
+    status['detections'] = list(status.get('detections', []))
+    status['queue_position'] = scheduler.position(job_id)
+    status['memory_bytes'] = processing_status.memory_usage(job_id)['total']
+    return status
+
+
 @app.route('/api/status/<job_id>', methods=['GET'])
 def get_status(job_id):
     """Get processing status for a job"""
-    if job_id not in processing_status:
+    status = job_status(job_id)
+    if status is None:
         return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+
+@app.route('/api/detections/<job_id>', methods=['GET'])
+def query_detections(job_id):
+    """
+    Detections of a video job by frame or time range and class
+    
+    Query parameters (all optional): start_frame/end_frame or start_time/end_time
+    (seconds), class (comma-separated names), min_conf, include_empty, limit.
+    Works while the job is still running. When limit cuts the range short,
+    next_frame is where the following page starts.
+    """
+    store_path = detection_store_path(job_id)
+    if not DetectionStore.exists(store_path):
+        return jsonify({'error': 'No detections stored for this job'}), 404
+    store = DetectionStore(store_path)
+    
+    try:
+        start_frame = request.args.get('start_frame', type=int)
+        end_frame = request.args.get('end_frame', type=int)
+        if request.args.get('start_time'):
+            start_frame = store.frame_at(float(request.args['start_time']))
+        if request.args.get('end_time'):
+            end_frame = store.frame_at(float(request.args['end_time']))
+        min_conf = float(request.args['min_conf']) if request.args.get('min_conf') else None
+        limit = int(request.args.get('limit', DETECTIONS_PAGE_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'Invalid query parameter'}), 400
+    limit = max(1, min(limit, DETECTIONS_PAGE_LIMIT))
+    classes = [name.strip() for name in request.args.get('class', '').split(',') if name.strip()] or None
+    include_empty = request.args.get('include_empty', 'false').lower() == 'true'
     
-    return jsonify(processing_status[job_id])
+    frames, next_frame = store.query(start_frame, end_frame, classes, min_conf, limit, skip_empty=not include_empty)
+    return jsonify({
+        'job_id': job_id,
+        'fps': store.fps,
+        'complete': store.complete,
+        'aggregates': store.aggregates,
+        'frames': [{'frame': frame, 'time': store.time_of(frame), 'count': len(detections),
+                    'detections': detections} for frame, detections in frames],
+        'next_frame': next_frame
+    })
+
+
+@app.route('/api/cancel/<job_id>', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    if not scheduler.cancel(job_id):
+        return jsonify({'error': 'Job not found or already finished'}), 404
+    
+    if job_id in processing_status and processing_status[job_id]['status'] == 'queued':
+        processing_status[job_id]['status'] = 'cancelled'
+        if job_id in frame_streams:
+            frame_streams[job_id].close()
+    
+    return jsonify({'success': True, 'job_id': job_id, 'message': 'Job cancelled'})
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Scheduler overview (worker count, queued/running jobs) and per-job memory held by the registry"""
+    return jsonify({**scheduler.stats(), 'registry': processing_status.stats()})
 
 
 @app.route('/api/detect/image', methods=['POST'])
@@ -439,6 +1447,23 @@ def detect_image():
     if not os.path.exists(image_path):
         return jsonify({'error': 'Image file not found'}), 404
     
+    try:
+        image_detector = get_detector(data.get('profile'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Generate output filename
+    output_filename = f"detected_{filename}"
+    output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+    
+    # Same image, model and settings processed before: return that result without inference
+    key = cache_key('image', content_hash(image_path), detection_settings(image_detector.profile))
+    if data.get('use_cache', True):
+        entry = result_cache.get(key)
+        if entry is not None:
+            result_cache.restore(entry, output_path)
+            return jsonify({**entry['payload'], 'output_file': output_filename, 'cached': True})
+    
     # Read image
     frame = cv2.imread(image_path)
     
@@ -446,21 +1471,22 @@ def detect_image():
         return jsonify({'error': 'Failed to read image'}), 400
     
     # Detect
-    result = detector.detect_frame(frame)
+    result = image_detector.detect_frame(frame)
     
     if result:
-        # Generate output filename
-        output_filename = f"detected_{filename}"
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+        result['profile'] = image_detector.profile
         
-        # Save annotated image
+        # Save annotated image (as a new file: the old one may be hard-linked into the result cache)
+        if os.path.exists(output_path):
+            os.remove(output_path)
         cv2.imwrite(output_path, result['frame'])
         
         # Convert frame to base64 for preview
-        result['frame_base64'] = detector.frame_to_base64(result['frame'])
+        result['frame_base64'] = image_detector.frame_to_base64(result['frame'])
         result['output_file'] = output_filename
         del result['frame']  # Remove numpy array
         
+        result_cache.put(key, 'image', result, output_path)
         return jsonify(result)
     else:
         return jsonify({'error': 'Detection failed'}), 500
@@ -477,6 +1503,11 @@ def detect_frame():
     
     file = request.files['frame']
     
+    try:
+        frame_detector = get_detector(request.form.get('profile', FRAME_PROFILE))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Read image
     import numpy as np
     from PIL import Image
@@ -484,12 +1515,22 @@ def detect_frame():
     image = Image.open(file.stream)
     frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
     
-    # Detect
-    result = detector.detect_frame(frame)
+    # Detect: frames from concurrent requests share one batched forward pass
+    try:
+        result = get_batcher(frame_detector.profile).detect(frame)
+    except Exception as e:
+        print(f"Frame detection error: {e}")
+        result = None
     
     if result:
+        result['profile'] = frame_detector.profile
+        
+        # Draw on this request's thread; the decoded frame is ours to draw into
+        result['frame'] = frame_detector.draw_detections(result['frame'], result['detections'],
+                                                         out=result['frame'])
+        
         # Convert frame to base64
-        result['frame_base64'] = detector.frame_to_base64(result['frame'])
+        result['frame_base64'] = frame_detector.frame_to_base64(result['frame'])
         del result['frame']  # Remove numpy array
         
         return jsonify(result)
@@ -511,47 +1552,123 @@ def download_file(filename):
     return send_file(filepath, as_attachment=True, download_name=filename)
 
 
-@app.route('/api/stream/<job_id>')
-def stream_frames(job_id):
-    """Stream processed frames in real-time using Server-Sent Events"""
-    def generate():
-        if job_id not in frame_streams:
-            frame_streams[job_id] = queue.Queue(maxsize=30)
-        
-        stream_queue = frame_streams[job_id]
-        
+def open_stream(job_id, subscriber=None):
+    """
+    Subscribe to the frames published for a job
+    
+    Args:
+        job_id: Job to watch
+        subscriber: Subscriber to attach (default: a new blocking Subscriber)
+    
+    Returns:
+        tuple: (broadcaster, subscriber); pass both to close_stream() when done
+    """
+    if job_id not in processing_status:
+        # Unknown job: an ended stream that isn't registered, so nothing waits on it or needs reaping
+        broadcaster = FrameBroadcaster(buffer_size=STREAM_BUFFER_FRAMES)
+        broadcaster.close()
+        return broadcaster, broadcaster.subscribe(subscriber)
+    
+    broadcaster = frame_streams.get(job_id)
+    if broadcaster is None:
+        broadcaster = FrameBroadcaster(buffer_size=STREAM_BUFFER_FRAMES)
+        # The stream of a finished job may already be reaped: end straight away instead of waiting
+        if job_id in processing_status and processing_status[job_id]['status'] in FINISHED_STATES:
+            broadcaster.close()
+        broadcaster = frame_streams.setdefault(job_id, broadcaster)
+    return broadcaster, broadcaster.subscribe(subscriber)
+
+
+def close_stream(job_id, broadcaster, subscriber):
+    """Unsubscribe a viewer, dropping the job's stream once it has ended and nobody watches it"""
+    broadcaster.unsubscribe(subscriber)
+    
+    # Cleanup once the job has finished and its last viewer has left
+    if broadcaster.closed and broadcaster.subscriber_count == 0:
+        if frame_streams.get(job_id) is broadcaster:
+            del frame_streams[job_id]
+
+
+def iter_stream(job_id):
+    """
+    Yield StreamFrames published for a job until it completes
+    
+    Each caller gets its own subscription, so several viewers can watch the
+    same job. The first frame is the job's latest one, if any.
+    Yields None after STREAM_KEEPALIVE_SECONDS without frames so transports
+    can send keepalives.
+    """
+    broadcaster, subscriber = open_stream(job_id)
+    
+    try:
         while True:
             try:
                 # Wait for frame data with timeout
-                frame_data = stream_queue.get(timeout=30)
-                
-                if frame_data is None:  # End signal
-                    yield f"data: {json.dumps({'type': 'complete'})}\n\n"
-                    break
-                
-                # Send frame data as SSE
-                yield f"data: {json.dumps(frame_data)}\n\n"
-                
+                frame_data = subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
             except queue.Empty:
-                # Send keepalive
-                yield f"data: {json.dumps({'type': 'keepalive'})}\n\n"
-            except Exception as e:
-                print(f"Stream error: {e}")
+                yield None
+                continue
+            
+            if frame_data is None:  # End signal
                 break
-        
-        # Cleanup
-        if job_id in frame_streams:
-            del frame_streams[job_id]
+            
+            yield frame_data
+    finally:
+        close_stream(job_id, broadcaster, subscriber)
+
+
+@app.route('/api/stream/<job_id>')
+def stream_frames(job_id):
+    """Stream processed frames in real-time using Server-Sent Events (fallback transport)"""
+    if job_id not in processing_status:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        try:
+            for frame_data in iter_stream(job_id):
+                if frame_data is None:
+                    # Send keepalive
+                    yield sse_event({'type': 'keepalive'})
+                    continue
+                
+                # Send frame data as SSE
+                yield frame_data.to_sse()
+            
+            yield sse_event({'type': 'complete'})
+        except Exception as e:
+            print(f"Stream error: {e}")
     
     return Response(generate(), mimetype='text/event-stream')
 
 
-if __name__ == '__main__':
-    print("=" * 60)
-    print("Aerial Object Detection API Server")
-    print("Powered by YOLO11s")
-    print("=" * 60)
+@app.route('/api/stream/<job_id>/mjpeg')
+def stream_frames_binary(job_id):
+    """
+    Stream processed frames as multipart/x-mixed-replace
     
+    Each part carries the raw JPEG bytes, with the frame's metadata
+    (frame_number, progress, detections, count, fps) as compact JSON in the
+    X-Frame-Meta part header. The stream ends with the closing boundary.
+    """
+    if job_id not in processing_status:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        try:
+            for frame_data in iter_stream(job_id):
+                if frame_data is not None:
+                    yield frame_data.to_multipart()
+            
+            yield multipart_close()
+        except Exception as e:
+            print(f"Stream error: {e}")
+    
+    return Response(generate(), mimetype=f'multipart/x-mixed-replace; boundary={MULTIPART_BOUNDARY}',
+                    headers={'Cache-Control': 'no-cache', 'Access-Control-Expose-Headers': 'X-Frame-Meta'})
+
+
+def prepare_server():
+    """Clean up old files and load and warm up the default model"""
     # Clean up old files on startup
     print("\n🧹 Cleaning up old files...")
     cleanup_old_files()
@@ -567,12 +1684,34 @@ if __name__ == '__main__':
                 model_loaded = True
                 break
     
-    if not model_loaded:
+    if model_loaded:
+        # Warm up the live-stream profile so the first webcam frame is fast
+        try:
+            get_detector(FRAME_PROFILE)
+        except Exception as e:
+            print(f"Error warming up '{FRAME_PROFILE}' profile: {e}")
+    else:
         print("\n⚠️  WARNING: No model file found!")
         print("Please place your model file in the models/ directory:")
         print("  - yolo11s.pt (YOLO11)")
         print("The server will start but detection will not work until a model is loaded.")
     
+    return model_loaded
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Aerial Object Detection API Server")
+    print("Powered by YOLO11s")
+    print("=" * 60)
+    
+    prepare_server()
+    
+    # With debug=True the reloader also runs this block in a watcher
+    # process; only the serving process should own the job workers
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_job_workers()
+    
     print("\n" + "=" * 60)
     print("Server starting on http://localhost:5000")
     print(f"Auto-cleanup enabled: Files older than {MAX_FILE_AGE_HOURS}h will be deleted")
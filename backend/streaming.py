@@ -0,0 +1,256 @@
+"""
+Frame Streaming
+Encoded frames shared by the SSE and binary (multipart) stream transports,
+and a per-job broadcaster that fans them out to every connected viewer
+"""
+
+import asyncio
+import base64
+import json
+import queue
+import threading
+from collections import deque
+
+from detections import json_default
+from metrics import STREAM_DROPPED_FRAMES
+
+# Boundary used by the multipart/x-mixed-replace transport
+MULTIPART_BOUNDARY = 'skyguard-frame'
+
+
+class StreamFrame:
+    """
+    One JPEG-encoded frame plus its metadata
+
+    The raw JPEG is kept as bytes; each transport's wire format is built on
+    first use and cached so it is only produced once per frame.
+    """
+
+    __slots__ = ('jpeg', 'meta', '_sse', '_part')
+
+    def __init__(self, jpeg, meta):
+        """
+        Args:
+            jpeg: Encoded JPEG bytes
+            meta: JSON-serializable dict (frame_number, progress, detections, ...)
+        """
+        self.jpeg = jpeg
+        self.meta = meta
+        self._sse = None
+        self._part = None
+
+    def to_sse(self):
+        """Server-Sent Event with the frame base64-encoded inside JSON (fallback transport)"""
+        if self._sse is None:
+            payload = {'type': 'frame', 'frame': base64.b64encode(self.jpeg).decode('utf-8')}
+            payload.update(self.meta)
+            self._sse = f"data: {json.dumps(payload, default=json_default)}\n\n"
+        return self._sse
+
+    def to_multipart(self):
+        """multipart/x-mixed-replace part: raw JPEG body, metadata in X-Frame-Meta"""
+        if self._part is None:
+            meta = json.dumps(self.meta, default=json_default, separators=(',', ':'))
+            header = (f"--{MULTIPART_BOUNDARY}\r\n"
+                      f"Content-Type: image/jpeg\r\n"
+                      f"Content-Length: {len(self.jpeg)}\r\n"
+                      f"X-Frame-Meta: {meta}\r\n\r\n")
+            self._part = header.encode('utf-8') + self.jpeg + b"\r\n"
+        return self._part
+
+
+def sse_event(payload):
+    """Format a small control message (complete, keepalive) as an SSE event"""
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def multipart_close():
+    """Closing delimiter of a multipart stream"""
+    return f"--{MULTIPART_BOUNDARY}--\r\n".encode('utf-8')
+
+
+class Subscriber:
+    """
+    One viewer's bounded ring buffer of frames
+
+    When the buffer is full the oldest frame is dropped, so a slow viewer
+    only ever loses its own frames.
+    """
+
+    def __init__(self, buffer_size):
+        self._frames = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def push(self, frame):
+        with self._cond:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+                STREAM_DROPPED_FRAMES.inc()
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Next frame for this viewer
+
+        Returns:
+            StreamFrame, or None once the stream has ended and is drained
+
+        Raises:
+            queue.Empty: If no frame arrived within timeout
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames or self._closed, timeout):
+                raise queue.Empty
+            if self._frames:
+                return self._frames.popleft()
+            return None
+
+    def pending(self):
+        with self._cond:
+            return len(self._frames)
+
+    def buffered(self):
+        """Frames currently waiting for this viewer"""
+        with self._cond:
+            return list(self._frames)
+
+
+class AsyncSubscriber(Subscriber):
+    """
+    Subscriber read from an asyncio event loop
+
+    Publishing threads wake the loop instead of a blocked reader thread, so
+    any number of viewers can wait on one loop.
+    """
+
+    def __init__(self, buffer_size, loop):
+        super().__init__(buffer_size)
+        self._loop = loop
+        self._ready = asyncio.Event()
+
+    def _wake(self):
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass  # Loop already closed: nobody is waiting
+
+    def push(self, frame):
+        super().push(frame)
+        self._wake()
+
+    def close(self):
+        super().close()
+        self._wake()
+
+    async def get_async(self, timeout=None):
+        """
+        Next frame for this viewer, awaited on the subscriber's loop
+
+        Returns:
+            StreamFrame, or None once the stream has ended and is drained
+
+        Raises:
+            queue.Empty: If no frame arrived within timeout
+        """
+        while True:
+            with self._cond:
+                if self._frames:
+                    return self._frames.popleft()
+                if self._closed:
+                    return None
+                self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise queue.Empty
+
+
+class FrameBroadcaster:
+    """
+    Per-job hub that shares each encoded frame with every subscriber
+
+    publish() never blocks: frames are appended by reference to each
+    subscriber's ring buffer. New subscribers immediately receive the most
+    recent frame so they don't wait for the next one to be produced.
+    """
+
+    def __init__(self, buffer_size=30):
+        """
+        Args:
+            buffer_size: Frames buffered per subscriber before dropping the oldest
+        """
+        self.buffer_size = buffer_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._latest = None
+        self.closed = False
+        self.published = 0
+
+    def publish(self, frame):
+        with self._lock:
+            self._latest = frame
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(frame)
+
+    def subscribe(self, subscriber=None):
+        """
+        Args:
+            subscriber: Subscriber to attach (default: a new blocking Subscriber)
+        """
+        if subscriber is None:
+            subscriber = Subscriber(self.buffer_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._latest is not None:
+                subscriber.push(self._latest)
+            if self.closed:
+                subscriber.close()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def close(self):
+        """Signal end of stream to current and future subscribers"""
+        with self._lock:
+            self.closed = True
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def buffered_bytes(self):
+        """Bytes of the frames held for viewers (each shared frame counted once)"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            frames = {id(self._latest): self._latest} if self._latest is not None else {}
+        for subscriber in subscribers:
+            frames.update((id(frame), frame) for frame in subscriber.buffered())
+        return sum(len(frame.jpeg) + len(frame._sse or '') + len(frame._part or b'') for frame in frames.values())
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            published = self.published
+        return {
+            'subscribers': len(subscribers),
+            'published': published,
+            'pending': [s.pending() for s in subscribers],
+            'dropped': [s.dropped for s in subscribers],
+            'closed': self.closed
+        }
@@ -0,0 +1,220 @@
+"""
+Sliced (Tiled) Inference
+Runs the model over overlapping tiles of large frames so small, distant
+targets keep their pixels, then merges the per-tile boxes
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+from detections import Detections, box_iou
+
+
+def tile_grid(width, height, tile_size, overlap):
+    """
+    Overlapping tiles covering a frame; edge tiles are shifted inwards so
+    every tile is full size (unless the frame itself is smaller)
+
+    Returns:
+        list: (x1, y1, x2, y2) per tile
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def merge_boxes(xyxy, class_id, confidence, threshold=0.5, metric='ios'):
+    """
+    Class-aware greedy NMS across tiles
+
+    'ios' (intersection over the smaller box) also removes the truncated
+    partial boxes an object leaves in a neighbouring tile, which plain IoU
+    keeps because the partial box is much smaller than the full one.
+
+    Returns:
+        numpy.ndarray: Indices of the kept boxes, highest confidence first
+    """
+    order = np.argsort(-confidence, kind='stable')
+    areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    keep = []
+
+    while len(order):
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        if not len(rest):
+            break
+
+        if metric == 'ios':
+            top_left = np.maximum(xyxy[best, :2], xyxy[rest, :2])
+            bottom_right = np.minimum(xyxy[best, 2:], xyxy[rest, 2:])
+            inter = np.clip(bottom_right - top_left, 0, None).prod(axis=1)
+            overlap = inter / (np.minimum(areas[best], areas[rest]) + 1e-9)
+        else:
+            overlap = box_iou(xyxy[best][None], xyxy[rest])[0]
+
+        suppressed = (overlap > threshold) & (class_id[rest] == class_id[best])
+        order = rest[~suppressed]
+
+    return np.array(keep, dtype=np.int64)
+
+
+class TiledInference:
+    """
+    Slice frames into overlapping tiles, run all tiles through the model and
+    map the boxes back into frame coordinates
+
+    An optional full-frame pass is added to the same model call so large
+    objects that span several tiles are still found whole; with it, tile
+    boxes cut off by an inner tile edge are dropped (the object is complete
+    in a neighbouring tile or in the full frame). Tiles with almost no
+    texture (sky, water, flat ground) can be skipped.
+    """
+
+    def __init__(self, tile_size=640, overlap=0.2, full_frame=True, skip_empty=True, empty_std=6.0,
+                 merge_threshold=0.5, match_metric='ios', max_tiles_per_call=32, edge_margin=2):
+        """
+        Args:
+            tile_size: Tile edge in source pixels (match the profile's imgsz to run tiles unscaled)
+            overlap: Fraction of a tile shared with its neighbour
+            full_frame: Also run the whole (downscaled) frame
+            skip_empty: Skip tiles whose grayscale standard deviation is below empty_std
+            empty_std: Texture threshold for skip_empty
+            merge_threshold: Overlap above which same-class boxes are merged
+            match_metric: 'ios' (intersection over smaller) or 'iou'
+            max_tiles_per_call: Images per model call, bounding peak memory
+            edge_margin: Pixels from an inner tile edge at which a box counts as cut off
+        """
+        if match_metric not in ('ios', 'iou'):
+            raise ValueError(f"Unknown match metric '{match_metric}'. Available: ios, iou")
+
+        self.tile_size = int(tile_size)
+        self.overlap = float(overlap)
+        self.full_frame = full_frame
+        self.skip_empty = skip_empty
+        self.empty_std = empty_std
+        self.merge_threshold = merge_threshold
+        self.match_metric = match_metric
+        self.max_tiles_per_call = max(1, int(max_tiles_per_call))
+        self.edge_margin = edge_margin
+
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.tiles_run = 0
+        self.tiles_skipped = 0
+
+    def _tiles(self, frame):
+        """Tiles worth running for one frame, and how many were skipped"""
+        height, width = frame.shape[:2]
+        tiles = tile_grid(width, height, self.tile_size, self.overlap)
+        if not self.skip_empty or len(tiles) == 1:
+            return tiles, 0
+
+        # Measure texture on a 1/8 scale grayscale copy
+        scale = 8
+        small = cv2.resize(frame, (max(1, width // scale), max(1, height // scale)), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        kept = []
+        for x1, y1, x2, y2 in tiles:
+            region = small[y1 // scale:max(y2 // scale, y1 // scale + 1), x1 // scale:max(x2 // scale, x1 // scale + 1)]
+            if region.std() >= self.empty_std:
+                kept.append((x1, y1, x2, y2))
+        return kept, len(tiles) - len(kept)
+
+    def infer(self, infer_batch, frames, names, max_det=300):
+        """
+        Args:
+            infer_batch: Callable running the model on a list of images
+                         (ObjectDetector.infer_batch)
+            frames: Frames to detect on
+            names: Mapping of class index -> class name
+            max_det: Detections kept per frame after merging
+
+        Returns:
+            list: One merged Detections per frame (None if no model)
+        """
+        images = []
+        owners = []  # (frame index, tile rectangle or None for the full frame) per image
+        skipped = 0
+
+        for index, frame in enumerate(frames):
+            tiles, tile_skipped = self._tiles(frame)
+            skipped += tile_skipped
+            for x1, y1, x2, y2 in tiles:
+                images.append(frame[y1:y2, x1:x2])
+                owners.append((index, (x1, y1, x2, y2)))
+            # A frame smaller than one tile is already covered whole
+            if self.full_frame and len(tiles) + tile_skipped > 1:
+                images.append(frame)
+                owners.append((index, None))
+
+        results = []
+        for start in range(0, len(images), self.max_tiles_per_call):
+            chunk = infer_batch(images[start:start + self.max_tiles_per_call])
+            if chunk is None:
+                return None
+            results.extend(chunk)
+
+        with self._lock:
+            self.frames += len(frames)
+            self.tiles_run += len(images)
+            self.tiles_skipped += skipped
+
+        # Shift boxes into frame coordinates and gather them per frame
+        per_frame = [([], [], []) for _ in frames]
+        for (index, tile), detections in zip(owners, results):
+            if tile is not None and len(detections):
+                detections = detections.filter(~self._cut_off(detections.xyxy, tile, frames[index].shape))
+                detections.xyxy += np.array([tile[0], tile[1], tile[0], tile[1]], dtype=np.float32)
+            if not len(detections):
+                continue
+            boxes, class_ids, confidences = per_frame[index]
+            boxes.append(detections.xyxy)
+            class_ids.append(detections.class_id)
+            confidences.append(detections.confidence)
+
+        merged = []
+        for boxes, class_ids, confidences in per_frame:
+            if not boxes:
+                merged.append(Detections.empty(names))
+                continue
+            xyxy = np.concatenate(boxes)
+            class_id = np.concatenate(class_ids)
+            confidence = np.concatenate(confidences)
+            keep = merge_boxes(xyxy, class_id, confidence, self.merge_threshold, self.match_metric)[:max_det]
+            merged.append(Detections(xyxy[keep], class_id[keep], confidence[keep], names))
+        return merged
+
+    def _cut_off(self, xyxy, tile, frame_shape):
+        """Boxes touching a tile edge that lies inside the frame (full-frame pass only)"""
+        if not self.full_frame:
+            return np.zeros(len(xyxy), dtype=bool)
+        x1, y1, x2, y2 = tile
+        height, width = frame_shape[:2]
+        margin = self.edge_margin
+        return (((x1 > 0) & (xyxy[:, 0] <= margin)) |
+                ((y1 > 0) & (xyxy[:, 1] <= margin)) |
+                ((x2 < width) & (xyxy[:, 2] >= x2 - x1 - margin)) |
+                ((y2 < height) & (xyxy[:, 3] >= y2 - y1 - margin)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tile_size': self.tile_size,
+                'overlap': self.overlap,
+                'full_frame': self.full_frame,
+                'frames': self.frames,
+                'tiles_run': self.tiles_run,
+                'tiles_skipped': self.tiles_skipped
+            }
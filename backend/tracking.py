@@ -0,0 +1,222 @@
+"""
+Detect-then-Track
+Propagates keyframe detections through the frames in between with sparse
+optical flow and keeps stable track IDs across keyframes
+"""
+
+import cv2
+import numpy as np
+
+from detections import Detections, box_iou
+
+
+class _Track:
+    __slots__ = ('track_id', 'box', 'class_id', 'confidence', 'points', 'misses')
+
+    def __init__(self, track_id, box, class_id, confidence):
+        self.track_id = track_id
+        self.box = box
+        self.class_id = class_id
+        self.confidence = confidence
+        self.points = None  # (K, 1, 2) float32 feature points inside the box
+        self.misses = 0  # Consecutive keyframes without a matching detection
+
+
+class OpticalFlowTracker:
+    """
+    IoU association on keyframes, Lucas-Kanade flow in between
+
+    On a keyframe, detections are matched to the existing tracks (greedy,
+    highest IoU first, same class only); unmatched detections start new
+    tracks. Between keyframes every track's box is moved by the median
+    motion of feature points inside it and scaled by their median spread.
+    A track whose points can't be followed (forward-backward check) is
+    dropped and counted as lost, which the caller uses to re-detect early.
+    """
+
+    def __init__(self, names, iou_threshold=0.3, max_misses=1, max_points=30, min_points=5,
+                 max_flow_error=1.5):
+        """
+        Args:
+            names: Mapping of class index -> class name
+            iou_threshold: Minimum IoU to continue a track on a keyframe
+            max_misses: Keyframes a track may go undetected before it is removed
+            max_points: Feature points followed per track
+            min_points: Tracks with fewer surviving points are lost
+            max_flow_error: Forward-backward error (pixels) above which a point is rejected
+        """
+        self.names = names
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.max_points = max_points
+        self.min_points = min_points
+        self.max_flow_error = max_flow_error
+
+        self.lk_params = dict(winSize=(21, 21), maxLevel=3,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+        self._tracks = []
+        self._next_id = 1
+        self._prev_gray = None
+
+        # Tracks lost by optical flow since the last keyframe
+        self.lost_since_keyframe = 0
+
+    @property
+    def active_tracks(self):
+        return len(self._tracks)
+
+    def update(self, gray, detections):
+        """
+        Keyframe: associate fresh detections with tracks
+
+        Args:
+            gray: Grayscale frame the detections came from
+            detections: Detections from the model
+
+        Returns:
+            Detections: The same boxes with track_id set
+        """
+        boxes = detections.xyxy
+        matched_tracks = set()
+        track_ids = np.zeros(len(detections), dtype=np.int64)
+        det_matched = np.zeros(len(detections), dtype=bool)
+
+        if self._tracks and len(detections):
+            ious = box_iou(boxes, np.array([track.box for track in self._tracks], dtype=np.float32))
+            same_class = detections.class_id[:, None] == np.array([t.class_id for t in self._tracks])[None, :]
+            ious[~same_class] = 0.0
+
+            # Greedy assignment, best overlaps first
+            for det_index, track_index in zip(*np.unravel_index(np.argsort(-ious, axis=None), ious.shape)):
+                if ious[det_index, track_index] < self.iou_threshold:
+                    break
+                if det_matched[det_index] or track_index in matched_tracks:
+                    continue
+                track = self._tracks[track_index]
+                track.box = boxes[det_index].copy()
+                track.confidence = float(detections.confidence[det_index])
+                track.misses = 0
+                det_matched[det_index] = True
+                matched_tracks.add(track_index)
+                track_ids[det_index] = track.track_id
+
+        # Tracks the model no longer sees age out
+        survivors = []
+        for index, track in enumerate(self._tracks):
+            if index not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        self._tracks = survivors
+
+        for det_index in np.where(~det_matched)[0]:
+            track = _Track(self._next_id, boxes[det_index].copy(), int(detections.class_id[det_index]),
+                           float(detections.confidence[det_index]))
+            self._next_id += 1
+            self._tracks.append(track)
+            track_ids[det_index] = track.track_id
+
+        # Re-seed feature points from the keyframe for every track
+        for track in self._tracks:
+            track.points = self._seed_points(gray, track.box)
+
+        self._prev_gray = gray
+        self.lost_since_keyframe = 0
+
+        return Detections(boxes, detections.class_id, detections.confidence, detections.names, track_ids)
+
+    def propagate(self, gray):
+        """
+        Move every track from the previous frame to this one
+
+        Args:
+            gray: Grayscale frame
+
+        Returns:
+            Detections: Propagated boxes of the tracks still followed
+        """
+        if self._prev_gray is None or not self._tracks:
+            self._prev_gray = gray
+            return self._detections([])
+
+        followed = [track for track in self._tracks if track.misses == 0 and track.points is not None]
+        if followed:
+            points = np.concatenate([track.points for track in followed])
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, points, None, **self.lk_params)
+            back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self._prev_gray, moved, None, **self.lk_params)
+            error = np.linalg.norm((points - back).reshape(-1, 2), axis=1)
+            good = (status.reshape(-1) == 1) & (back_status.reshape(-1) == 1) & (error < self.max_flow_error)
+
+        height, width = gray.shape[:2]
+        # Boxes too small to seed points on are held in place until the next keyframe
+        visible = [track for track in self._tracks if track.misses == 0 and track.points is None]
+        offset = 0
+        lost = set()
+        for track in followed:
+            count = len(track.points)
+            keep = good[offset:offset + count]
+            old = track.points[keep].reshape(-1, 2)
+            new = moved[offset:offset + count][keep].reshape(-1, 2)
+            offset += count
+
+            if len(new) < self.min_points:
+                lost.add(track.track_id)
+                continue
+
+            # Translation from the median displacement, scale from the spread around the centroid
+            shift = np.median(new - old, axis=0)
+            old_spread = np.linalg.norm(old - np.median(old, axis=0), axis=1)
+            new_spread = np.linalg.norm(new - np.median(new, axis=0), axis=1)
+            valid = old_spread > 1e-3
+            scale = float(np.median(new_spread[valid] / old_spread[valid])) if valid.any() else 1.0
+
+            center = (track.box[:2] + track.box[2:]) / 2 + shift
+            half = (track.box[2:] - track.box[:2]) / 2 * scale
+            box = np.concatenate([center - half, center + half])
+            box[[0, 2]] = box[[0, 2]].clip(0, width)
+            box[[1, 3]] = box[[1, 3]].clip(0, height)
+
+            if box[2] - box[0] < 2 or box[3] - box[1] < 2:
+                lost.add(track.track_id)  # Left the frame
+                continue
+
+            track.box = box.astype(np.float32)
+            track.points = new.reshape(-1, 1, 2).astype(np.float32)
+            visible.append(track)
+
+        if lost:
+            self.lost_since_keyframe += len(lost)
+            self._tracks = [track for track in self._tracks if track.track_id not in lost]
+
+        self._prev_gray = gray
+        return self._detections(visible)
+
+    def _seed_points(self, gray, box):
+        """Corner features inside a box, or a regular grid if it's textureless"""
+        x1, y1, x2, y2 = box.astype(int).tolist()
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, gray.shape[1]), min(y2, gray.shape[0])
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return None
+
+        corners = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], maxCorners=self.max_points,
+                                          qualityLevel=0.01, minDistance=3)
+        if corners is None or len(corners) < self.min_points:
+            steps = int(np.ceil(np.sqrt(self.max_points)))
+            xs, ys = np.meshgrid(np.linspace(0, x2 - x1 - 1, steps + 2)[1:-1],
+                                 np.linspace(0, y2 - y1 - 1, steps + 2)[1:-1])
+            corners = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+
+        return (corners.reshape(-1, 1, 2) + np.array([x1, y1])).astype(np.float32)
+
+    def _detections(self, tracks):
+        if not tracks:
+            return Detections(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int32),
+                              np.zeros(0, dtype=np.float32), self.names, np.zeros(0, dtype=np.int64))
+        return Detections(np.array([track.box for track in tracks]),
+                          np.array([track.class_id for track in tracks]),
+                          np.array([track.confidence for track in tracks]),
+                          self.names,
+                          np.array([track.track_id for track in tracks]))
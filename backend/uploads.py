@@ -0,0 +1,412 @@
+"""
+Resumable Uploads
+Chunked upload sessions written straight to disk with an incremental SHA-256,
+resumable from the last acknowledged offset, and readable by the detection
+pipeline while they are still arriving
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+CHUNK_SIZE = 1 << 20
+
+
+class UploadError(Exception):
+    """Rejected upload request; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class UploadSession:
+    """
+    One file being uploaded in chunks
+
+    Chunks must arrive in order: each write() names the offset it starts at,
+    which has to be the number of bytes received so far. After a dropped
+    connection the client asks for that offset and carries on from there.
+    Bytes are hashed as they are written, so completing the upload doesn't
+    read the file again.
+
+    Readers can follow the file while it grows, with the same interface as
+    ingest.StreamingDownload (wait, iter_bytes, bytes_done, finished, error).
+    """
+
+    def __init__(self, directory, upload_id, filename, file_type, total_bytes=None, sha256=None, bytes_done=0,
+                 created=None):
+        """
+        Args:
+            directory: Folder holding the session's data and state files
+            upload_id: Session id
+            filename: Client-supplied file name
+            file_type: 'video' or 'image'
+            total_bytes: Declared size, if the client knows it
+            sha256: Expected hex digest of the whole file, checked on completion
+            bytes_done: Bytes already on disk (restored sessions)
+            created: Creation time (restored sessions)
+        """
+        self.upload_id = upload_id
+        self.url = f"upload {upload_id}"  # Source name in ingest.wait_for_header errors
+        self.path = os.path.join(directory, f"{upload_id}.part")
+        self.state_path = os.path.join(directory, f"{upload_id}.json")
+        self.filename = filename
+        self.file_type = file_type
+        self.total_bytes = total_bytes
+        self.expected_sha256 = sha256
+        self.created = created or time.time()
+        self.updated = time.time()
+
+        self.bytes_done = bytes_done
+        self.finished = False
+        self.error = None
+        self.result = None  # server.store_upload() response once complete
+        self.progress_callback = None  # Called with this session after every write
+
+        self._digest = hashlib.sha256()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+
+        if bytes_done:
+            # Restored after a restart: truncate anything past the acknowledged offset, re-hash the rest
+            with open(self.path, 'r+b') as f:
+                f.truncate(bytes_done)
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    self._digest.update(chunk)
+        else:
+            open(self.path, 'wb').close()
+
+    @property
+    def progress(self):
+        """Percent received, or None while the size is unknown"""
+        if self.finished and self.error is None:
+            return 100.0
+        if not self.total_bytes:
+            return None
+        return 100.0 * self.bytes_done / self.total_bytes
+
+    def status(self):
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'file_type': self.file_type,
+            'offset': self.bytes_done,
+            'total_bytes': self.total_bytes,
+            'progress': self.progress,
+            'complete': self.finished and self.error is None,
+            'error': str(self.error) if self.error is not None else None,
+            **(self.result or {})
+        }
+
+    def save_state(self):
+        state = {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'file_type': self.file_type,
+            'total_bytes': self.total_bytes,
+            'sha256': self.expected_sha256,
+            'bytes_done': self.bytes_done,
+            'created': self.created,
+            'result': self.result
+        }
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def write(self, offset, stream, chunk_sha256=None, max_bytes=None):
+        """
+        Append a chunk read from a file-like stream
+
+        Without chunk_sha256 every byte that arrives is kept, so a chunk cut
+        short by a dropped connection still moves the offset forward. With
+        chunk_sha256 the chunk is all or nothing: on a mismatch (or a short
+        read) the file and hash are rolled back to offset.
+
+        Args:
+            offset: Byte position the chunk starts at
+            stream: Request body with a read(size) method
+            chunk_sha256: Optional hex digest of the chunk
+            max_bytes: Largest file size allowed
+
+        Returns:
+            int: New offset (bytes acknowledged)
+
+        Raises:
+            UploadError: Offset mismatch (409), write in progress (409), size
+                         exceeded (413), checksum mismatch (400) or finished session (409)
+        """
+        if not self._write_lock.acquire(blocking=False):
+            raise UploadError('Another chunk of this upload is being written', 409, offset=self.bytes_done)
+        try:
+            if self.error is not None:
+                raise UploadError(f"Upload failed: {self.error}", 409, offset=self.bytes_done)
+            if self.finished:
+                raise UploadError('Upload is already finished', 409, offset=self.bytes_done)
+            if offset != self.bytes_done:
+                raise UploadError(f"Chunk starts at {offset}, expected {self.bytes_done}", 409,
+                                  offset=self.bytes_done)
+
+            limit = min(size for size in (self.total_bytes, max_bytes, float('inf')) if size is not None)
+            rollback = self._digest.copy() if chunk_sha256 else None
+            chunk_digest = hashlib.sha256() if chunk_sha256 else None
+            written = 0
+            try:
+                with open(self.path, 'r+b') as out:
+                    out.seek(offset)
+                    for data in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                        if offset + written + len(data) > limit:
+                            raise UploadError(f"Upload exceeds {int(limit)} bytes", 413)
+                        out.write(data)
+                        out.flush()
+                        self._digest.update(data)
+                        if chunk_digest is not None:
+                            chunk_digest.update(data)
+                        written += len(data)
+                        if chunk_digest is None:
+                            # Unchecked bytes are acknowledged as they land, so followers see them right away
+                            self._advance(offset + written)
+                    if chunk_digest is not None and chunk_digest.hexdigest() != chunk_sha256.lower():
+                        raise UploadError('Chunk checksum mismatch', 400)
+                    os.fsync(out.fileno())
+            except Exception:
+                if chunk_digest is not None:
+                    with open(self.path, 'r+b') as out:
+                        out.truncate(offset)
+                    self._digest = rollback
+                    written = 0
+                raise
+            finally:
+                self._advance(offset + written)
+                self.save_state()
+            return self.bytes_done
+        finally:
+            self._write_lock.release()
+
+    def _advance(self, bytes_done):
+        with self._cond:
+            self.bytes_done = bytes_done
+            self.updated = time.time()
+            self._cond.notify_all()
+        if self.progress_callback is not None:
+            self.progress_callback(self)
+
+    def digest(self):
+        """SHA-256 hex digest of the bytes received so far"""
+        return self._digest.hexdigest()
+
+    def complete(self, store, sha256=None):
+        """
+        Finish the upload once every byte has arrived and file it, exactly once
+
+        Runs under the write lock, so concurrent calls (a client retrying a
+        request that timed out) don't file the upload twice: later calls get
+        the result of the first.
+
+        Args:
+            store: Called with the content digest; its return value becomes result
+            sha256: Expected hex digest (overrides the one given at creation)
+
+        Returns:
+            dict: result
+
+        Raises:
+            UploadError: Missing bytes (409), digest mismatch (400) or aborted upload (409)
+        """
+        with self._write_lock:
+            if self.result is not None:
+                return self.result
+            if self.error is not None:
+                raise UploadError(f"Upload failed: {self.error}", 409, offset=self.bytes_done)
+            if self.total_bytes is not None and self.bytes_done != self.total_bytes:
+                raise UploadError(f"Received {self.bytes_done} of {self.total_bytes} bytes", 409,
+                                  offset=self.bytes_done)
+            digest = self.digest()
+            expected = sha256 or self.expected_sha256
+            if expected and expected.lower() != digest:
+                raise UploadError('Upload checksum mismatch', 400, content_hash=digest)
+            with self._cond:
+                if self.error is not None:  # Aborted since the check above
+                    raise UploadError(f"Upload failed: {self.error}", 409, offset=self.bytes_done)
+                self.total_bytes = self.bytes_done
+                self.finished = True
+                self._cond.notify_all()
+            self.result = store(digest)
+            self.save_state()
+            return self.result
+
+    def abort(self, reason='Upload aborted'):
+        """Fail the upload; readers following it stop with the error"""
+        with self._cond:
+            if self.finished:
+                return
+            self.error = IOError(reason)
+            self.finished = True
+            self._cond.notify_all()
+
+    def wait(self, min_bytes=None, timeout=None):
+        """
+        Block until min_bytes have arrived (or the upload is finished, if None)
+
+        Returns:
+            bool: False if the timeout expired first
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.finished or (min_bytes is not None and self.bytes_done >= min_bytes), timeout)
+
+    def iter_bytes(self, check_cancelled=None):
+        """
+        Yield the file's content as it is uploaded
+
+        Args:
+            check_cancelled: Called while waiting for the client; raise to stop
+
+        Raises the session's error once the data received before it has
+        been yielded.
+        """
+        position = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                while not self.wait(position + 1, timeout=0.5):
+                    if check_cancelled is not None:
+                        check_cancelled()
+                with self._cond:
+                    available, finished = self.bytes_done, self.finished
+
+                while position < available:
+                    chunk = f.read(min(CHUNK_SIZE, available - position))
+                    if not chunk:
+                        break
+                    position += len(chunk)
+                    yield chunk
+
+                if finished and position >= self.bytes_done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+
+
+class UploadSessions:
+    """
+    upload_id -> UploadSession, persisted in a directory
+
+    Sessions survive a restart: each one's state file records the last
+    acknowledged offset, and lookups of unknown ids restore from it.
+    """
+
+    def __init__(self, directory, max_bytes=None, ttl_seconds=24 * 3600, stall_seconds=None):
+        """
+        Args:
+            directory: Folder for session data and state files
+            max_bytes: Largest upload accepted (None = unlimited)
+            ttl_seconds: Idle time after which cleanup() drops a session
+            stall_seconds: Idle time after which abort_stalled() fails a session a job
+                           is following (None = never, the job waits for the ttl)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stall_seconds = stall_seconds
+        os.makedirs(directory, exist_ok=True)
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, filename, file_type, total_bytes=None, sha256=None):
+        if total_bytes is not None:
+            total_bytes = int(total_bytes)
+            if total_bytes < 0:
+                raise UploadError('size must not be negative')
+            if self.max_bytes is not None and total_bytes > self.max_bytes:
+                raise UploadError(f"Upload exceeds the {self.max_bytes} byte limit", 413)
+        session = UploadSession(self.directory, uuid.uuid4().hex, filename, file_type, total_bytes, sha256)
+        session.save_state()
+        with self._lock:
+            self._sessions[session.upload_id] = session
+        return session
+
+    def get(self, upload_id):
+        """Session by id, restored from disk if needed (None if unknown)"""
+        upload_id = os.path.basename(upload_id)
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                session = self._restore(upload_id)
+                if session is not None:
+                    self._sessions[upload_id] = session
+            return session
+
+    def _restore(self, upload_id):
+        try:
+            with open(os.path.join(self.directory, f"{upload_id}.json")) as f:
+                state = json.load(f)
+            session = UploadSession(self.directory, upload_id, state['filename'], state['file_type'],
+                                    state['total_bytes'], state['sha256'], state['bytes_done'], state['created'])
+        except (OSError, ValueError, KeyError):
+            return None
+        if state.get('result'):
+            session.result = state['result']
+            session.finished = True
+        return session
+
+    def remove(self, upload_id, reason='Upload aborted'):
+        """Abort a session (readers following it fail with reason) and delete its files"""
+        session = self.get(upload_id)
+        if session is None:
+            return False
+        session.abort(reason)
+        with self._lock:
+            self._sessions.pop(session.upload_id, None)
+        for path in (session.path, session.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return True
+
+    def cleanup(self):
+        """Delete sessions idle for longer than ttl_seconds"""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            with self._lock:
+                session = self._sessions.get(upload_id)
+            updated = session.updated if session is not None else os.path.getmtime(os.path.join(self.directory, name))
+            if updated < cutoff and self.remove(upload_id, 'Upload expired'):
+                removed += 1
+        return removed
+
+    def abort_stalled(self):
+        """
+        Fail unfinished sessions a job is following that got no data for stall_seconds
+
+        The job stops with the error instead of holding its worker until the
+        session expires. The files stay until cleanup() drops the session.
+        """
+        if self.stall_seconds is None:
+            return 0
+        cutoff = time.time() - self.stall_seconds
+        with self._lock:
+            sessions = list(self._sessions.values())
+        aborted = 0
+        for session in sessions:
+            if session.progress_callback is not None and not session.finished and session.updated < cutoff:
+                session.abort(f"No data received for {self.stall_seconds:.0f}s")
+                aborted += 1
+        return aborted
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            'active': sum(1 for s in sessions if not s.finished),
+            'bytes': sum(s.bytes_done for s in sessions if not s.finished),
+            'max_bytes': self.max_bytes
+        }
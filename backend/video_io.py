@@ -0,0 +1,219 @@
+"""
+FFmpeg Video I/O
+Decodes through an ffmpeg pipe into preallocated frame buffers and encodes
+annotated frames to H.264 (faststart MP4) on a separate ffmpeg process
+"""
+
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from metrics import observe_stage
+
+# 'auto' picks ffmpeg when the binary is on PATH
+VIDEO_IO_BACKENDS = ('auto', 'ffmpeg', 'opencv')
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None
+
+
+def resolve_video_io(video_io):
+    """Turn 'auto' into the backend that will actually be used"""
+    if video_io not in VIDEO_IO_BACKENDS:
+        raise ValueError(f"Unknown video I/O backend '{video_io}'. Available: {', '.join(VIDEO_IO_BACKENDS)}")
+    if video_io == 'auto':
+        return 'ffmpeg' if ffmpeg_available() else 'opencv'
+    if video_io == 'ffmpeg' and not ffmpeg_available():
+        raise RuntimeError("video_io='ffmpeg' requested but ffmpeg is not on PATH")
+    return video_io
+
+
+class FFmpegReader:
+    """
+    Raw BGR frames from an ffmpeg subprocess, read straight into a fixed pool
+    of preallocated buffers
+
+    read() mirrors cv2.VideoCapture.read(). A frame's buffer goes back to the
+    pool once recycle(frame) is called, so at most `buffers` frames are alive
+    at a time and no per-frame allocation happens.
+
+    With frame_step=K only every Kth frame (by global frame number) leaves
+    ffmpeg, so skipped frames never cross the pipe. With input_stream the
+    container bytes are fed to ffmpeg's stdin from a thread instead of being
+    read from video_path, e.g. while the file is still downloading.
+    """
+
+    def __init__(self, video_path, width, height, fps, start_frame=0, frame_step=1, buffers=16,
+                 input_stream=None):
+        """
+        Args:
+            video_path: Input video
+            width: Frame width (from the container metadata)
+            height: Frame height
+            fps: Source frame rate, used to turn start_frame into a seek time
+            start_frame: First frame (0-based) to decode; the seek is frame-accurate
+            frame_step: Keep frames whose 1-based number is a multiple of this
+                        (the pipeline's frame_skip rule)
+            buffers: Preallocated frames in the pool
+            input_stream: Iterator of container bytes to decode instead of video_path
+                          (sequential, so start_frame must be 0)
+        """
+        if input_stream is not None and start_frame:
+            raise ValueError('Cannot seek in an input stream; start_frame must be 0')
+
+        self.shape = (height, width, 3)
+        self.frame_bytes = height * width * 3
+        self.frame_step = max(1, int(frame_step))
+
+        self._free = queue.Queue()
+        for _ in range(max(2, int(buffers))):
+            self._free.put(np.empty(self.shape, dtype=np.uint8))
+
+        command = ['ffmpeg', '-v', 'error', '-nostdin']
+        if start_frame > 0:
+            command += ['-ss', f"{start_frame / fps:.6f}"]
+        command += ['-i', 'pipe:0' if input_stream is not None else video_path, '-map', '0:v:0']
+        if self.frame_step > 1:
+            command += ['-vf', f"select='not(mod(n+{start_frame + 1},{self.frame_step}))'"]
+        command += ['-vsync', '0', '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                         stdin=subprocess.PIPE if input_stream is not None else subprocess.DEVNULL,
+                                         bufsize=self.frame_bytes)
+        self._closed = False
+
+        self.stream_error = None  # Exception raised by input_stream, if any
+        if input_stream is not None:
+            threading.Thread(target=self._feed_loop, args=(input_stream,), name='ffmpeg-reader-feed',
+                             daemon=True).start()
+
+    def _feed_loop(self, input_stream):
+        try:
+            for chunk in input_stream:
+                if self._closed:
+                    break
+                self._process.stdin.write(chunk)
+        except (BrokenPipeError, OSError):
+            pass  # ffmpeg exited (end of the pipeline or release())
+        except Exception as e:
+            self.stream_error = e
+        finally:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+
+    def read(self):
+        """
+        Returns:
+            tuple: (True, frame) or (False, None) at end of stream
+        """
+        buffer = None
+        while buffer is None:
+            if self._closed:
+                return False, None
+            try:
+                buffer = self._free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+        view = memoryview(buffer.reshape(-1))
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self._process.stdout.readinto(view[filled:])
+            if not count:
+                self._free.put(buffer)
+                return False, None
+            filled += count
+        return True, buffer
+
+    def recycle(self, frame):
+        """Return a frame's buffer to the pool once nothing references it anymore"""
+        if frame is not None and frame.shape == self.shape:
+            self._free.put(frame)
+
+    def release(self):
+        self._closed = True
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.stdout.close()
+        self._process.wait()
+
+
+class FFmpegWriter:
+    """
+    Encode BGR frames to H.264 MP4 with an ffmpeg subprocess
+
+    write() only enqueues the frame; a feeder thread pushes it into ffmpeg's
+    stdin, so encoding never blocks the caller. The file is written with
+    +faststart so browsers can start playback before it is fully downloaded.
+    """
+
+    def __init__(self, output_path, width, height, fps, crf=23, preset='veryfast', queue_size=32,
+                 on_written=None):
+        """
+        Args:
+            output_path: .mp4 file to write
+            width: Frame width
+            height: Frame height
+            fps: Output frame rate
+            crf: x264 constant rate factor (lower = better quality, larger file)
+            preset: x264 speed/size trade-off
+            queue_size: Frames buffered ahead of the encoder
+            on_written: Called with each frame once ffmpeg has consumed it
+                        (e.g. FFmpegReader.recycle)
+        """
+        self.output_path = output_path
+        self.on_written = on_written
+        self.frames = 0
+        self.busy_seconds = 0.0
+
+        command = ['ffmpeg', '-y', '-v', 'error', '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+                   '-s', f"{width}x{height}", '-r', f"{fps:.6f}", '-i', 'pipe:0',
+                   '-c:v', 'libx264', '-preset', preset, '-crf', str(crf),
+                   '-pix_fmt', 'yuv420p', '-movflags', '+faststart', output_path]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._feed_loop, name='ffmpeg-writer', daemon=True)
+        self._thread.start()
+
+    def _feed_loop(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            try:
+                if self._error is None:
+                    start = time.perf_counter()
+                    self._process.stdin.write(memoryview(np.ascontiguousarray(frame).reshape(-1)))
+                    elapsed = time.perf_counter() - start
+                    self.busy_seconds += elapsed
+                    observe_stage('write', elapsed)
+                    self.frames += 1
+            except (BrokenPipeError, OSError) as e:
+                self._error = e
+            finally:
+                if self.on_written is not None:
+                    self.on_written(frame)
+
+    def write(self, frame):
+        """Queue a frame for encoding (blocks only if the encoder is queue_size frames behind)"""
+        self._queue.put(frame)
+
+    def release(self):
+        """Flush queued frames and finalize the file"""
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        stderr = self._process.stderr.read().decode('utf-8', 'replace').strip()
+        self._process.wait()
+        if self._process.returncode != 0:
+            raise RuntimeError(f"ffmpeg encoder failed ({self._process.returncode}): {stderr or self._error}")